@@ -6,14 +6,21 @@ Endpoints:
 - GET /api/accidents/predict/count - Predict accident count for a specific month and barangay
 - POST /api/accidents/predict/batch - Predict accident counts for multiple barangays
 - GET /api/accidents/predict/all - Predict for all barangays for a given month
+- GET /api/accidents/predict/horizon - Recursive multi-month forecast for all barangays
+- POST /api/accidents/retrain - Queue a retraining job for the training worker
+- GET /api/accidents/training-jobs[/<job_id>[/log]] - Training job status and logs
+- POST /api/accidents/training-jobs/<job_id>/cancel - Cancel a training job
+- POST /api/accidents/rollback-model - Serve the previously loaded model again
 - GET /api/accidents/health - Health check
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
 from datetime import datetime
+import time
+import threading
 import traceback
 import pandas as pd
 import numpy as np
@@ -24,9 +31,17 @@ import logging
 # Add parent directories to path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
+sys.path.append(os.path.dirname(current_dir))
 
-from data_loader import AccidentDataLoader
+from data_loader import AccidentDataLoader, AccidentHistoryIndex
+from common import mongo_pool
 from progress_tracker import ProgressTracker
+from prediction_cache import PredictionCache
+from compiled_forest import CompiledForest
+from model_bundle import ModelBundle, ModelRegistry, ModelLoadError
+from training_jobs import TrainingJobStore, JobConflictError
+from training_worker import spawn_worker
+from hyperparameter_search import SEARCH_MODES
 
 # Set up logging
 logging.basicConfig(
@@ -51,16 +66,29 @@ CORS(app,
      },
      supports_credentials=False)
 
-# Global variables
-rf_regressor_model = None
-rf_classifier_model = None
-municipality_encoder = None
-barangay_encoder = None
-feature_columns = None
-model_metadata = None
-model_loaded = False
+# Loaded models; each request captures model_registry.current once and reads only that bundle
+model_registry = ModelRegistry()
 data_loader = None
-high_risk_threshold = None
+# Serving processes (gunicorn.conf.py exports its worker count; 1 for the Flask server)
+SERVING_WORKERS = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Array-backed forests beat sklearn on small batches; sklearn's Cython wins on large ones
+USE_COMPILED_FOREST = os.getenv('ACCIDENT_COMPILED_FOREST', '1') == '1'
+COMPILED_FOREST_MAX_ROWS = int(os.getenv('ACCIDENT_COMPILED_FOREST_MAX_ROWS', '1000'))
+
+# Longest forecast served by /predict/horizon
+MAX_HORIZON_MONTHS = 12
+prediction_cache = PredictionCache()
+
+# Retraining runs in the training worker process; serving processes only queue jobs
+job_store = TrainingJobStore()
+# Start a worker on demand when none is running (disable when training_worker.py runs as a service)
+TRAINING_WORKER_AUTOSTART = os.getenv('ACCIDENT_TRAINING_WORKER_AUTOSTART', '1') == '1'
+# How often each serving process checks for a newly trained model
+MODEL_RELOAD_CHECK_SECONDS = float(os.getenv('ACCIDENT_MODEL_RELOAD_CHECK_SECONDS', '15'))
+loaded_training_job_id = None
+last_reload_check = 0.0
+reload_lock = threading.Lock()
 
 
 def convert_to_native_types(obj):
@@ -88,221 +116,479 @@ def convert_to_native_types(obj):
 
 
 def initialize_model():
-    """Initialize the accident prediction models (regressor + classifier)"""
-    global rf_regressor_model, rf_classifier_model, municipality_encoder, barangay_encoder, feature_columns, model_metadata, model_loaded, data_loader, high_risk_threshold
+    """
+    Load the accident prediction models (regressor + classifier) and publish them
+    
+    The new bundle is loaded and validated while the current one keeps serving,
+    then swapped in with one reference assignment. If loading fails the current
+    bundle stays in place.
+    """
+    global data_loader, loaded_training_job_id
+    
+    # Training job that produced the files about to be loaded; recorded once they
+    # are published so a failed load is retried by reload_after_training. A job
+    # database error must not keep the model from loading.
+    try:
+        latest_job = job_store.latest_succeeded()
+    except Exception as e:
+        logger.warning(f"Could not read training jobs: {str(e)}")
+        latest_job = None
+    job_id = latest_job['id'] if latest_job else None
     
     try:
         # Get paths
         base_dir = os.path.dirname(os.path.abspath(__file__))
         model_dir = os.path.join(base_dir, '../trained')
         
-        # Check if model directory exists
-        if not os.path.exists(model_dir):
-            logger.error(f"Model directory not found: {model_dir}")
-            return False
-        
-        # Load Random Forest Regressor model
-        regressor_path = os.path.join(model_dir, 'accident_rf_regression_model.pkl')
-        if not os.path.exists(regressor_path):
-            logger.error(f"Regressor model not found: {regressor_path}")
-            logger.error("Please train the model first using train_rf_model.py")
-            return False
-        
-        rf_regressor_model = joblib.load(regressor_path)
-        logger.info(f"Loaded Random Forest Regressor from: {regressor_path}")
-        
-        # Load Random Forest Classifier model (optional - may not exist for backward compatibility)
-        classifier_path = os.path.join(model_dir, 'accident_rf_classification_model.pkl')
-        if os.path.exists(classifier_path):
-            rf_classifier_model = joblib.load(classifier_path)
-            logger.info(f"Loaded Random Forest Classifier from: {classifier_path}")
-        else:
-            rf_classifier_model = None
-            logger.warning("Classifier model not found - will only provide regression predictions")
-        
-        # Load encoders
-        municipality_encoder_path = os.path.join(model_dir, 'municipality_encoder.pkl')
-        if os.path.exists(municipality_encoder_path):
-            municipality_encoder = joblib.load(municipality_encoder_path)
-            logger.info("Loaded municipality encoder")
-        else:
-            municipality_encoder = None
-            logger.warning("Municipality encoder not found")
+        bundle = ModelBundle.load(model_dir, load_compiled_forest, job_id)
+        if bundle.high_risk_threshold:
+            logger.info(f"High-risk threshold: {bundle.high_risk_threshold}")
         
-        barangay_encoder_path = os.path.join(model_dir, 'barangay_encoder.pkl')
-        if os.path.exists(barangay_encoder_path):
-            barangay_encoder = joblib.load(barangay_encoder_path)
-            logger.info("Loaded barangay encoder")
-        else:
-            barangay_encoder = None
-            logger.warning("Barangay encoder not found")
-        
-        # Load feature columns
-        feature_path = os.path.join(model_dir, 'accident_rf_feature_columns.pkl')
-        if os.path.exists(feature_path):
-            feature_columns = joblib.load(feature_path)
-            logger.info(f"Loaded feature columns: {feature_columns}")
+        # Initialize data loader (or drop its cached aggregates on reload)
+        if data_loader is None:
+            data_loader = AccidentDataLoader()
         else:
-            logger.error("Feature columns not found")
-            return False
-        
-        # Load metadata
-        metadata_path = os.path.join(model_dir, 'accident_rf_regression_metadata.json')
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r') as f:
-                model_metadata = json.load(f)
-            logger.info("Loaded model metadata")
-            
-            # Extract high-risk threshold from metadata
-            high_risk_threshold = model_metadata.get('high_risk_threshold')
-            if high_risk_threshold:
-                logger.info(f"High-risk threshold: {high_risk_threshold}")
-        else:
-            model_metadata = {}
-            high_risk_threshold = None
+            data_loader.invalidate_cache()
         
-        # Initialize data loader
-        data_loader = AccidentDataLoader()
+        model_registry.publish(bundle)
+        loaded_training_job_id = job_id
+        # Cached predictions belong to the previous model
+        prediction_cache.clear()
         
-        model_loaded = True
-        logger.info("Model initialization complete!")
+        logger.info(f"Model initialization complete! (generation {bundle.generation})")
         return True
         
+    except ModelLoadError as e:
+        logger.error(f"Failed to initialize model: {str(e)}")
+        return False
     except Exception as e:
         logger.error(f"Failed to initialize model: {str(e)}")
         traceback.print_exc()
         return False
 
 
-def prepare_features(year, month, municipality, barangay, historical_data=None):
+def load_compiled_forest(model, compiled_path):
     """
-    Prepare features for prediction
+    Load the array-backed export of a forest, compiling it in memory if the
+    export is missing or was made from a different model
+    
+    Returns:
+        CompiledForest, or None to use the sklearn model directly
+    """
+    if model is None or not USE_COMPILED_FOREST:
+        return None
+    try:
+        if os.path.exists(compiled_path):
+            compiled = CompiledForest.load(compiled_path)
+            if compiled.matches(model):
+                logger.info(f"Loaded compiled forest from: {compiled_path}")
+                return compiled
+            logger.warning(f"Compiled forest {compiled_path} does not match the loaded model, recompiling")
+        compiled = CompiledForest.from_sklearn(model)
+        logger.info(f"Compiled forest in memory ({compiled.n_estimators} trees, {compiled.node_count} nodes)")
+        return compiled
+    except Exception as e:
+        logger.warning(f"Compiled forest unavailable, using sklearn inference: {str(e)}")
+        return None
+
+
+def select_forest(model, compiled, n_rows):
+    """Compiled forest for batches up to COMPILED_FOREST_MAX_ROWS rows, else the sklearn model"""
+    if compiled is not None and n_rows <= COMPILED_FOREST_MAX_ROWS:
+        return compiled
+    return model
+
+
+def prediction_cache_version(bundle, snapshot):
+    """
+    Version that cached predictions computed from a model bundle and snapshot belong to
+    
+    Returns None (do not cache) when there is no snapshot fingerprint to tell data changes apart.
+    """
+    if snapshot is None or snapshot.fingerprint is None:
+        return None
+    training_date = bundle.metadata.get('training_date')
+    return (bundle.generation, training_date, tuple(sorted(snapshot.fingerprint.items())))
+
+
+def encode_labels(encoder, values):
+    """
+    Encode a list of labels with a fitted LabelEncoder in one pass
+    
+    Labels that were not seen during training are encoded as 0.
+    """
+    if not encoder:
+        return [0] * len(values)
+    mapping = {label: index for index, label in enumerate(encoder.classes_)}
+    return [mapping.get(value, 0) for value in values]
+
+
+def prepare_features_batch(bundle, year, month, locations, history_index=None):
+    """
+    Prepare one feature matrix for many locations in the same month
     
     Args:
+        bundle: ModelBundle whose encoders, metadata and feature columns to use
         year: Year for prediction
         month: Month for prediction (1-12)
-        municipality: Municipality name
-        barangay: Barangay name
-        historical_data: Optional DataFrame with historical data for lag features
+        locations: List of (municipality, barangay) tuples
+        history_index: Optional AccidentHistoryIndex for lag/rolling features
         
     Returns:
-        DataFrame with features ready for prediction
+        DataFrame with one row per location, columns ordered as in training
     """
+    n = len(locations)
+    municipalities = [municipality for municipality, _ in locations]
+    barangays = [barangay for _, barangay in locations]
+    
     # Create base features
     features = {
-        'year': [year],
-        'month': [month],
-        'month_sin': [np.sin(2 * np.pi * month / 12)],
-        'month_cos': [np.cos(2 * np.pi * month / 12)],
+        'year': [year] * n,
+        'month': [month] * n,
+        'month_sin': [np.sin(2 * np.pi * month / 12)] * n,
+        'month_cos': [np.cos(2 * np.pi * month / 12)] * n,
     }
     
     # Normalize year (need to know min/max from training)
-    if model_metadata and 'year_range' in model_metadata:
-        year_min, year_max = model_metadata['year_range']
-        features['year_normalized'] = [(year - year_min) / (year_max - year_min + 1)]
+    if 'year_range' in bundle.metadata:
+        year_min, year_max = bundle.metadata['year_range']
+        features['year_normalized'] = [(year - year_min) / (year_max - year_min + 1)] * n
     else:
         # Fallback: use current year range
         current_year = datetime.now().year
-        features['year_normalized'] = [(year - 2020) / (current_year - 2020 + 1)]
+        features['year_normalized'] = [(year - 2020) / (current_year - 2020 + 1)] * n
     
-    # Encode municipality and barangay
-    if municipality_encoder:
-        try:
-            municipality_encoded = municipality_encoder.transform([municipality])[0]
-        except (ValueError, KeyError):
-            # If municipality not in training data, use 0 or most common
-            municipality_encoded = 0
-        features['municipality_encoded'] = [municipality_encoded]
-    else:
-        features['municipality_encoded'] = [0]
+    # Encode municipality and barangay (unknown labels fall back to 0)
+    features['municipality_encoded'] = encode_labels(bundle.municipality_encoder, municipalities)
+    features['barangay_encoded'] = encode_labels(bundle.barangay_encoder, barangays)
     
-    if barangay_encoder:
-        try:
-            barangay_encoded = barangay_encoder.transform([barangay])[0]
-        except (ValueError, KeyError):
-            # If barangay not in training data, use 0
-            barangay_encoded = 0
-        features['barangay_encoded'] = [barangay_encoded]
-    else:
-        features['barangay_encoded'] = [0]
-    
-    # Add lag features if historical data available
-    if historical_data is not None and not historical_data.empty:
-        # Get previous month's count
-        prev_month = month - 1
-        prev_year = year
-        if prev_month == 0:
-            prev_month = 12
-            prev_year = year - 1
-        
-        prev_data = historical_data[
-            (historical_data['year'] == prev_year) &
-            (historical_data['month'] == prev_month) &
-            (historical_data['barangay'] == barangay)
-        ]
-        
-        if not prev_data.empty:
-            features['accident_count_lag1'] = [prev_data['accident_count'].iloc[0]]
-            # Calculate rolling statistics
-            recent_data = historical_data[
-                (historical_data['barangay'] == barangay) &
-                ((historical_data['year'] < year) | ((historical_data['year'] == year) & (historical_data['month'] < month)))
-            ].tail(3)
-            
-            if not recent_data.empty:
-                features['accident_count_rolling_mean_3'] = [recent_data['accident_count'].mean()]
-                features['accident_count_rolling_std_3'] = [recent_data['accident_count'].std() if len(recent_data) > 1 else 0]
-            else:
-                features['accident_count_rolling_mean_3'] = [0]
-                features['accident_count_rolling_std_3'] = [0]
-        else:
-            features['accident_count_lag1'] = [0]
-            features['accident_count_rolling_mean_3'] = [0]
-            features['accident_count_rolling_std_3'] = [0]
-    else:
-        # No historical data, use defaults
-        features['accident_count_lag1'] = [0]
-        features['accident_count_rolling_mean_3'] = [0]
-        features['accident_count_rolling_std_3'] = [0]
+    # Add lag/rolling features from the indexed history
+    if history_index is not None:
+        features.update(history_index.history_features(year, month, barangays))
     
     # Create DataFrame
     df = pd.DataFrame(features)
     
     # Ensure all feature columns are present
-    for col in feature_columns:
+    for col in bundle.feature_columns:
         if col not in df.columns:
             df[col] = 0
     
     # Reorder columns to match training
-    df = df[feature_columns]
+    df = df[bundle.feature_columns]
     
     return df
 
 
+def prepare_features(bundle, year, month, municipality, barangay, historical_data=None):
+    """
+    Prepare features for prediction
+    
+    Args:
+        bundle: ModelBundle to prepare features for
+        year: Year for prediction
+        month: Month for prediction (1-12)
+        municipality: Municipality name
+        barangay: Barangay name
+        historical_data: Optional DataFrame with historical data for lag features
+        
+    Returns:
+        DataFrame with features ready for prediction
+    """
+    history_index = AccidentHistoryIndex(historical_data) if historical_data is not None else None
+    return prepare_features_batch(bundle, year, month, [(municipality, barangay)], history_index)
+
+
+def predict_blended(bundle, year, month, locations, history_index=None):
+    """
+    Run the regressor and classifier once over all requested locations
+    
+    Builds a single feature matrix, traverses each forest once, derives
+    is_high_risk from the same predict_proba output used for risk_probability,
+    and applies the 60/40 baseline blend with array math.
+    
+    Args:
+        bundle: ModelBundle to predict with
+        year: Year for prediction
+        month: Month for prediction (1-12)
+        locations: List of (municipality, barangay) tuples (non-empty)
+        history_index: Optional AccidentHistoryIndex built from the monthly counts
+        
+    Returns:
+        (blended counts, high-risk flags or None, risk probabilities or None) arrays
+    """
+    features_df = prepare_features_batch(bundle, year, month, locations, history_index)
+    
+    # Model is trained on log-transformed target, so we need to inverse transform
+    regressor = select_forest(bundle.regressor, bundle.compiled_regressor, len(locations))
+    prediction_log = np.asarray(regressor.predict(features_df), dtype=float)
+    prediction_count = np.expm1(prediction_log) if bundle.use_log_target else prediction_log
+    prediction_count = np.maximum(prediction_count, 0.0)
+    
+    # Compute historical baseline and blend to add locality differentiation
+    baselines = np.zeros(len(locations))
+    if history_index is not None:
+        baselines = history_index.baseline_counts(year, month, locations)
+    
+    # Blend: 60% baseline, 40% model prediction (non-negative)
+    blended = np.maximum(0.6 * baselines + 0.4 * prediction_count, 0.0)
+    
+    # Make classification prediction (high-risk) if classifier is available
+    risk_probabilities = None
+    high_risk_flags = None
+    if bundle.classifier is not None:
+        classifier = select_forest(bundle.classifier, bundle.compiled_classifier, len(locations))
+        probabilities = np.asarray(classifier.predict_proba(features_df))
+        # Same decision rule as RandomForestClassifier.predict, without a second traversal
+        classes = np.asarray(classifier.classes_)
+        risk_probabilities = probabilities[:, 1]
+        high_risk_flags = classes[np.argmax(probabilities, axis=1)]
+    
+    return blended, high_risk_flags, risk_probabilities
+
+
+def prediction_record(location, blended_prediction, high_risk_flag=None, risk_probability=None):
+    """Prediction dict for the API for one location"""
+    municipality, barangay = location
+    blended_prediction = float(blended_prediction)
+    return {
+        'municipality': municipality,
+        'barangay': barangay,
+        # Rounded count for reporting and rule thresholds
+        'predicted_count': int(round(blended_prediction)),
+        'predicted_count_raw': round(blended_prediction, 2),
+        'is_high_risk': bool(high_risk_flag) if high_risk_flag is not None else None,
+        'risk_probability': float(risk_probability) if risk_probability is not None else None
+    }
+
+
+def format_predictions(locations, blended, high_risk_flags=None, risk_probabilities=None):
+    """Prediction dicts for the API from predict_blended output"""
+    return [
+        prediction_record(
+            location,
+            blended[i],
+            high_risk_flags[i] if high_risk_flags is not None else None,
+            risk_probabilities[i] if risk_probabilities is not None else None
+        )
+        for i, location in enumerate(locations)
+    ]
+
+
+def wants_stream():
+    """Whether the client asked for NDJSON streaming (?stream=1)"""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def ndjson_line(record):
+    """One NDJSON line (JSON object plus newline)"""
+    return json.dumps(convert_to_native_types(record), ensure_ascii=False) + '\n'
+
+
+def predict_locations(bundle, year, month, locations, history_index=None):
+    """
+    Predict all requested locations for one month
+    
+    Args:
+        bundle: ModelBundle to predict with
+        year: Year for prediction
+        month: Month for prediction (1-12)
+        locations: List of (municipality, barangay) tuples
+        history_index: Optional AccidentHistoryIndex built from the monthly counts
+        
+    Returns:
+        List of prediction dicts in the same order as locations
+    """
+    if not locations:
+        return []
+    return format_predictions(locations, *predict_blended(bundle, year, month, locations, history_index))
+
+
+def forecast_horizon(bundle, historical_data, start_year, start_month, months, locations):
+    """
+    Roll predictions forward month by month for all locations
+    
+    Each month is predicted for every location in one batch. Its blended counts
+    are then added to the history as if they had been observed (locations
+    predicted at zero get no row, as months without accidents have none), so the
+    next month's lag, rolling and baseline features build on them. History from
+    the start month onwards is ignored. Months between the last observed month
+    and the start are rolled through first but not returned.
+    
+    Args:
+        bundle: ModelBundle to predict with (the same one for every month)
+        historical_data: DataFrame from aggregate_monthly_counts
+        start_year, start_month: First month to return
+        months: Number of months to return
+        locations: List of (municipality, barangay) tuples
+        
+    Returns:
+        (list of step dicts with year, month, predictions, total_predicted and
+         timing_ms, number of warm-up months)
+    """
+    columns = ['year', 'month', 'municipality', 'barangay', 'accident_count']
+    start = start_year * 12 + start_month - 1
+    history = pd.DataFrame(columns=columns)
+    last_observed = start - 1
+    if not historical_data.empty:
+        offsets = historical_data['year'] * 12 + historical_data['month'] - 1
+        history = historical_data.loc[offsets < start, columns]
+        if not history.empty:
+            last_observed = int(offsets[offsets < start].max())
+    
+    municipalities = [municipality for municipality, _ in locations]
+    barangays = [barangay for _, barangay in locations]
+    steps = []
+    for offset in range(last_observed + 1, start + months):
+        year, month = offset // 12, offset % 12 + 1
+        
+        step_start = time.perf_counter()
+        history_index = AccidentHistoryIndex(history)
+        index_time = time.perf_counter() - step_start
+        blended, high_risk_flags, risk_probabilities = predict_blended(bundle, year, month, locations, history_index)
+        predict_time = time.perf_counter() - step_start - index_time
+        
+        # Feed this month's predictions into the next month's features
+        observed = blended > 0
+        predicted_rows = pd.DataFrame({
+            'year': year,
+            'month': month,
+            'municipality': np.asarray(municipalities, dtype=object)[observed],
+            'barangay': np.asarray(barangays, dtype=object)[observed],
+            'accident_count': blended[observed]
+        })
+        history = predicted_rows if history.empty else pd.concat([history, predicted_rows], ignore_index=True)
+        
+        if offset < start:
+            continue
+        predictions = format_predictions(locations, blended, high_risk_flags, risk_probabilities)
+        predictions.sort(key=lambda x: x['predicted_count'], reverse=True)
+        steps.append({
+            'year': year,
+            'month': month,
+            'predictions': predictions,
+            'total_predicted': sum(p['predicted_count'] for p in predictions),
+            'timing_ms': {
+                'features_index': round(index_time * 1000, 2),
+                'predict': round(predict_time * 1000, 2)
+            }
+        })
+    
+    return steps, start - last_observed - 1
+
+
+@app.before_request
+def reload_after_training():
+    """
+    Load a newly trained model once the training worker reports a successful job.
+    Checked at most every MODEL_RELOAD_CHECK_SECONDS per process, so every gunicorn
+    worker picks up the new model without a restart.
+    """
+    global last_reload_check
+    now = time.monotonic()
+    if now - last_reload_check < MODEL_RELOAD_CHECK_SECONDS:
+        return
+    last_reload_check = now
+    try:
+        latest_job = job_store.latest_succeeded()
+    except Exception as e:
+        logger.warning(f"Could not check training jobs: {str(e)}")
+        return
+    if latest_job is None or latest_job['id'] == loaded_training_job_id:
+        return
+    # One reload per process; other requests keep serving the current model meanwhile
+    if reload_lock.acquire(blocking=False):
+        try:
+            logger.info(f"Training job {latest_job['id']} finished; reloading model...")
+            initialize_model()
+        finally:
+            reload_lock.release()
+
+
+def job_response(job):
+    """Job record for the API (with the training progress while it runs)"""
+    if job is None:
+        return None
+    job = dict(job)
+    job.pop('log_path', None)
+    if job['status'] == 'running':
+        job['progress'] = ProgressTracker().get()
+    return convert_to_native_types(job)
+
+
 @app.route('/api/accidents/retrain', methods=['POST'])
 def retrain_model():
     """
-    Start retraining the accident prediction models (runs asynchronously)
+    Queue retraining of the accident prediction models
+    
+    The job is stored in the training job database and run by the training worker
+    process (training_worker.py), never inside a serving process.
     
     Optional JSON Body:
     - force (bool): Force retrain even if model exists (default: false)
+    - search_mode (str): Hyperparameter search, 'random' or 'halving' (default: random)
+    - time_budget (number): Wall-clock seconds for the hyperparameter searches (default: no limit)
+    - refresh (bool): Refit with the previous best hyperparameters; search only if metrics degrade (default: false)
+    - refresh_tolerance (number): Allowed drop in test R² / accuracy before a refresh searches (default: 0.02)
+    - execution (str): 'sequential' or 'concurrent' (both searches in one worker pool) (default: sequential)
     
     Returns:
-    - success: Boolean indicating training was started
+    - success: Boolean indicating training was queued
+    - job_id: ID for /api/accidents/training-jobs/<job_id>
     - message: Status message
     """
-    import subprocess
-    import threading
-    
     try:
         # Get request body
-        data = request.get_json() or {}
+        data = request.get_json(silent=True) or {}
         force = data.get('force', False)
+        search_mode = data.get('search_mode', 'random')
+        time_budget = data.get('time_budget')
+        refresh = bool(data.get('refresh', False))
+        refresh_tolerance = data.get('refresh_tolerance')
+        execution = data.get('execution', 'sequential')
         
-        # Get the path to the training script
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        train_script = os.path.join(current_dir, 'train_rf_model.py')
+        if search_mode not in SEARCH_MODES:
+            return jsonify({
+                'success': False,
+                'error': f"search_mode must be one of: {', '.join(SEARCH_MODES)}",
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if time_budget is not None and (isinstance(time_budget, bool) or
+                                        not isinstance(time_budget, (int, float)) or time_budget <= 0):
+            return jsonify({
+                'success': False,
+                'error': 'time_budget must be a positive number of seconds',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if refresh_tolerance is not None and (isinstance(refresh_tolerance, bool) or
+                                              not isinstance(refresh_tolerance, (int, float)) or refresh_tolerance < 0):
+            return jsonify({
+                'success': False,
+                'error': 'refresh_tolerance must be a non-negative number',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if execution not in ('sequential', 'concurrent'):
+            return jsonify({
+                'success': False,
+                'error': 'execution must be one of: sequential, concurrent',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        # Passed to train_rf_model.py by the training worker
+        args = ['--search-mode', search_mode]
+        if time_budget is not None:
+            args += ['--time-budget', str(time_budget)]
+        if refresh:
+            args.append('--refresh')
+            if refresh_tolerance is not None:
+                args += ['--refresh-tolerance', str(refresh_tolerance)]
+        if execution != 'sequential':
+            args += ['--execution', execution]
         
+        train_script = os.path.join(current_dir, 'train_rf_model.py')
         if not os.path.exists(train_script):
             return jsonify({
                 'success': False,
@@ -310,85 +596,34 @@ def retrain_model():
                 'timestamp': datetime.now().isoformat()
             }), 500
         
-        # Initialize progress tracker
-        progress_tracker = ProgressTracker()
+        try:
+            job = job_store.submit(params={'force': bool(force), 'source': 'api', 'args': args})
+        except JobConflictError as e:
+            return jsonify({
+                'success': False,
+                'error': 'Training is already in progress',
+                'job_id': e.job['id'],
+                'job': job_response(e.job),
+                'timestamp': datetime.now().isoformat()
+            }), 409  # Conflict status
         
-        # Check if training is already in progress (not cancelled or completed)
-        current_progress = progress_tracker.get()
-        if current_progress:
-            is_training = current_progress.get('is_training', False)
-            is_cancelled = current_progress.get('cancelled', False)
-            is_completed = current_progress.get('completed', False)
-            
-            # Only block if training is actively in progress (not cancelled or completed)
-            if is_training and not is_cancelled and not is_completed:
-                return jsonify({
-                    'success': False,
-                    'error': 'Training is already in progress',
-                    'timestamp': datetime.now().isoformat()
-                }), 409  # Conflict status
-        
-        # Reset progress tracker
-        progress_tracker.reset()
-        
-        # Run training in a separate thread to avoid blocking
-        def run_retrain():
-            try:
-                logger.info("Starting model retraining in background thread...")
-                progress_tracker.update(0, "Starting", 0, "Initializing training process...")
-                
-                result = subprocess.run(
-                    [sys.executable, train_script],
-                    cwd=current_dir,
-                    capture_output=True,
-                    text=True,
-                    timeout=3600  # 1 hour timeout
-                )
-                
-                if result.returncode != 0:
-                    logger.error(f"Retraining failed: {result.stderr}")
-                    progress_tracker.complete(
-                        success=False,
-                        message="Training failed",
-                        details={'error': result.stderr or 'Training failed'}
-                    )
-                    return
-                
-                # Reload model after successful training
-                logger.info("Reloading model after retraining...")
-                progress_tracker.update(8, "Reloading Model", 95, "Reloading trained models into memory...")
-                initialize_model()
-                
-                progress_tracker.complete(
-                    success=True,
-                    message="Model retrained and reloaded successfully",
-                    details={'stdout': result.stdout}
-                )
-                logger.info("Training completed successfully!")
-                
-            except subprocess.TimeoutExpired:
-                logger.error("Retraining timed out after 1 hour")
-                progress_tracker.complete(
-                    success=False,
-                    message="Training timed out after 1 hour",
-                    details={'error': 'Training process timed out'}
-                )
-            except Exception as e:
-                logger.error(f"Error during retraining: {str(e)}")
-                traceback.print_exc()
-                progress_tracker.complete(
-                    success=False,
-                    message=f"Training failed: {str(e)}",
-                    details={'error': str(e)}
-                )
-        
-        # Start training in background thread
-        thread = threading.Thread(target=run_retrain, daemon=True)
-        thread.start()
+        # Reset progress so pollers do not see the previous run
+        ProgressTracker().reset()
+        
+        worker = job_store.worker_status()
+        if TRAINING_WORKER_AUTOSTART:
+            # Spawn even if a worker looks alive: its heartbeat may be stale (killed) or
+            # it may be exiting; the worker lock makes a redundant one exit at once
+            if not worker['alive']:
+                logger.info("No training worker running; starting one")
+            spawn_worker()
         
         return jsonify({
             'success': True,
-            'message': 'Training started successfully. Use /api/accidents/training-progress to track progress.',
+            'message': 'Training queued successfully. Use /api/accidents/training-progress to track progress.',
+            'job_id': job['id'],
+            'job': job_response(job),
+            'worker_alive': worker['alive'],
             'timestamp': datetime.now().isoformat()
         }), 202  # Accepted status
         
@@ -402,6 +637,115 @@ def retrain_model():
         }), 500
 
 
+@app.route('/api/accidents/training-jobs', methods=['GET'])
+def list_training_jobs():
+    """
+    Recent training jobs, newest first
+    
+    Query Parameters:
+    - limit: Number of jobs (default: 20, max: 100)
+    - status: Optional filter (queued, running, succeeded, failed, cancelled)
+    """
+    try:
+        limit = min(max(request.args.get('limit', default=20, type=int), 1), 100)
+        status = request.args.get('status')
+        return jsonify({
+            'success': True,
+            'jobs': [job_response(job) for job in job_store.list(limit=limit, status=status)],
+            'worker': job_store.worker_status(),
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        logger.error(f"Error listing training jobs: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
+@app.route('/api/accidents/training-jobs/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    """Status of one training job"""
+    try:
+        job = job_store.get(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': f'Training job not found: {job_id}',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+        return jsonify({
+            'success': True,
+            'job': job_response(job),
+            'worker': job_store.worker_status(),
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        logger.error(f"Error getting training job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
+@app.route('/api/accidents/training-jobs/<job_id>/log', methods=['GET'])
+def get_training_job_log(job_id):
+    """
+    Output of a training job (streamed to a log file while it runs)
+    
+    Query Parameters:
+    - tail: Only the last N lines (default: 200, 0 for the whole log)
+    """
+    try:
+        tail = request.args.get('tail', default=200, type=int)
+        log = job_store.read_log(job_id, tail=tail or None)
+        if log is None:
+            return jsonify({
+                'success': False,
+                'error': f'No log for training job: {job_id}',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+        return Response(log, mimetype='text/plain')
+    except Exception as e:
+        logger.error(f"Error reading training job log: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
+@app.route('/api/accidents/training-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_training_job(job_id):
+    """
+    Cancel a training job. A queued job is cancelled at once; for a running job the
+    training worker stops the training process group within a poll interval.
+    """
+    try:
+        job = job_store.request_cancel(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': f'Training job not found: {job_id}',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+        return jsonify({
+            'success': True,
+            'message': 'Cancellation requested' if job['status'] == 'running' else f"Job is {job['status']}",
+            'job': job_response(job),
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        logger.error(f"Error cancelling training job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
 @app.route('/api/accidents/training-progress', methods=['GET'])
 def get_training_progress():
     """
@@ -416,16 +760,20 @@ def get_training_progress():
     - completed: Whether training is completed
     - success: Whether training completed successfully (if completed)
     - elapsed_time: Time elapsed since start (in seconds)
+    - job: Active (or most recent) training job record
     """
     try:
+        job = job_store.active() or next(iter(job_store.list(limit=1)), None)
         progress_tracker = ProgressTracker()
         progress_data = progress_tracker.get()
         
         if progress_data is None:
+            queued = job is not None and job['status'] == 'queued'
             return jsonify({
-                'is_training': False,
+                'is_training': queued,
                 'completed': False,
-                'message': 'No training in progress'
+                'message': 'Training queued, waiting for the training worker' if queued else 'No training in progress',
+                'job': job_response(job)
             }), 200
         
         # Calculate elapsed time
@@ -445,7 +793,8 @@ def get_training_progress():
             'success': progress_data.get('success', None),
             'elapsed_time': elapsed_time,
             'timestamp': progress_data.get('timestamp', datetime.now().isoformat()),
-            'details': progress_data.get('details', {})
+            'details': progress_data.get('details', {}),
+            'job': job_response(job)
         }), 200
         
     except Exception as e:
@@ -460,7 +809,7 @@ def get_training_progress():
 @app.route('/api/accidents/cancel-training', methods=['POST'])
 def cancel_training():
     """
-    Cancel ongoing training
+    Cancel ongoing training (the active training job, if any)
     
     Returns:
     - success: Boolean indicating if cancellation was successful
@@ -468,38 +817,28 @@ def cancel_training():
     """
     try:
         progress_tracker = ProgressTracker()
-        current_progress = progress_tracker.get()
-        
-        # If no progress file exists or training is not in progress, still mark as cancelled
-        # This handles edge cases where training just started or already completed
-        if not current_progress:
-            # No training was ever started, just return success
-            return jsonify({
-                'success': True,
-                'message': 'No training in progress',
-                'timestamp': datetime.now().isoformat()
-            }), 200
+        job = job_store.active()
         
-        # If already completed or cancelled, reset it so new training can start
-        if current_progress.get('completed', False) or current_progress.get('cancelled', False):
-            # Reset the progress file so new training can start
+        if job is None:
+            # Nothing queued or running; clear stale progress so new training can start
             progress_tracker.reset()
             return jsonify({
                 'success': True,
-                'message': 'Training was already stopped. Progress has been reset.',
+                'message': 'No training in progress',
                 'timestamp': datetime.now().isoformat()
             }), 200
         
-        # Mark as cancelled first (so training script can detect it between steps)
+        # The worker stops the training process group; the flag also stops the script between steps
+        job = job_store.request_cancel(job['id'])
         progress_tracker.cancel()
         
-        # Reset immediately so new training can start right away
-        # The training script will check for cancellation between steps anyway
-        progress_tracker.reset()
-        
         return jsonify({
             'success': True,
-            'message': 'Training cancelled successfully. You can start a new training now.',
+            'message': 'Training cancelled successfully. You can start a new training now.'
+                       if job['status'] == 'cancelled' else
+                       'Cancellation requested. Training stops within a few seconds.',
+            'job_id': job['id'],
+            'job': job_response(job),
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -542,10 +881,48 @@ def reload_model():
         }), 500
 
 
+@app.route('/api/accidents/rollback-model', methods=['POST'])
+def rollback_model():
+    """
+    Serve the previously loaded model again (internal endpoint)
+
+    Swaps the current and previous bundles of this process; calling it again
+    switches back. The previous bundle only exists in this process's memory, so
+    with several serving workers the rollback is refused (409) instead of leaving
+    the workers on different models. A newly trained model replaces it as usual.
+    """
+    if SERVING_WORKERS > 1:
+        return jsonify({
+            'success': False,
+            'error': f'Rollback only affects the worker that receives it; run a single worker '
+                     f'(WEB_CONCURRENCY=1) to roll back ({SERVING_WORKERS} workers are serving)',
+            'timestamp': datetime.now().isoformat()
+        }), 409
+    try:
+        bundle = model_registry.rollback()
+        prediction_cache.clear()
+        logger.info(f"Rolled back to model generation {bundle.generation}")
+        return jsonify({
+            'success': True,
+            'message': 'Rolled back to the previous model',
+            'model_bundle': bundle.info(),
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except ModelLoadError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 409
+
+
 @app.route('/api/accidents/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
+        bundle = model_registry.current
+        model_loaded = bundle is not None
+        model_metadata = bundle.metadata if model_loaded else {}
         model_info = {}
         if model_metadata:
             model_info = {
@@ -554,7 +931,8 @@ def health_check():
                 'feature_count': model_metadata.get('feature_count', 0),
                 'training_samples': model_metadata.get('training_samples', 0),
                 'test_samples': model_metadata.get('test_samples', 0),
-                'classifier_available': rf_classifier_model is not None
+                'classifier_available': bundle.classifier is not None,
+                'compiled_inference': bundle.compiled_regressor is not None
             }
             
             # Add regressor metrics if available
@@ -636,7 +1014,19 @@ def health_check():
             'status': 'ok' if model_loaded else 'error',
             'model_loaded': model_loaded,
             'timestamp': datetime.now().isoformat(),
-            'model_info': model_info
+            'model_info': model_info,
+            'model_bundle': {
+                'current': bundle.info() if model_loaded else None,
+                'rollback_available': model_registry.previous is not None
+            },
+            'data_cache': convert_to_native_types(data_loader.get_cache_info()) if data_loader else None,
+            'mongo_pool': mongo_pool.pool_stats(),
+            'prediction_cache': prediction_cache.stats(),
+            'training': {
+                'worker': job_store.worker_status(),
+                'active_job': job_response(job_store.active()),
+                'loaded_job_id': bundle.training_job_id if model_loaded else None
+            }
         }), 200 if model_loaded else 503
     except Exception as e:
         return jsonify({
@@ -646,36 +1036,6 @@ def health_check():
         }), 500
 
 
-def compute_baseline_count(historical_df, year, month, municipality, barangay):
-    """
-    Compute a simple baseline: average of last up to 3 months for this barangay.
-    """
-    try:
-        # Build previous months list (year, month)
-        prev = []
-        py, pm = year, month
-        for _ in range(3):
-            pm -= 1
-            if pm == 0:
-                pm = 12
-                py -= 1
-            prev.append((py, pm))
-        # Filter historical df for these months
-        subset = historical_df[
-            (historical_df['municipality'] == municipality) &
-            (historical_df['barangay'] == barangay) &
-            (
-                (historical_df['year'] == prev[0][0]) & (historical_df['month'] == prev[0][1]) |
-                (historical_df['year'] == prev[1][0]) & (historical_df['month'] == prev[1][1]) |
-                (historical_df['year'] == prev[2][0]) & (historical_df['month'] == prev[2][1])
-            )
-        ]
-        if subset.empty:
-            return 0.0
-        return float(subset['accident_count'].mean())
-    except Exception:
-        return 0.0
-
 @app.route('/api/accidents/predict/count', methods=['GET'])
 def predict_accident_count():
     """
@@ -688,7 +1048,9 @@ def predict_accident_count():
     - barangay: Barangay name (required)
     """
     try:
-        if not model_loaded:
+        # One bundle for the whole request, even if a reload publishes a new one meanwhile
+        bundle = model_registry.current
+        if bundle is None:
             return jsonify({
                 'success': False,
                 'error': 'Model not loaded. Please check server logs.',
@@ -717,55 +1079,29 @@ def predict_accident_count():
             }), 400
         
         # Load historical data for lag features (optional)
-        historical_data = None
+        snapshot = None
         try:
             if data_loader:
-                data_loader.connect()
-                accidents = data_loader.load_raw_data()
-                historical_data = data_loader.aggregate_monthly_counts(accidents)
-                data_loader.disconnect()
+                snapshot = data_loader.get_snapshot()
         except Exception as e:
             logger.warning(f"Could not load historical data: {str(e)}")
         
-        # Prepare features
-        features_df = prepare_features(year, month, municipality, barangay, historical_data)
-        
-        # Make regression prediction (accident count)
-        # Model is trained on log-transformed target, so we need to inverse transform
-        use_log_target = model_metadata.get('use_log_target', True) if model_metadata else True
-        prediction_log = rf_regressor_model.predict(features_df)[0]
-        if use_log_target:
-            prediction_count = np.expm1(prediction_log)  # Inverse log1p transform
-        else:
-            prediction_count = prediction_log
-        prediction_count = max(0, float(prediction_count))
-        
-        # Compute historical baseline and blend to add locality differentiation
-        baseline = 0.0
-        if historical_data is not None and not historical_data.empty:
-            baseline = compute_baseline_count(historical_data, year, month, municipality, barangay)
-        
-        # Blend: 60% baseline, 40% model prediction
-        blended_prediction = 0.6 * baseline + 0.4 * prediction_count
-        # Ensure non-negative and reasonable precision
-        blended_prediction = max(0.0, float(blended_prediction))
-        # Rounded count for reporting and rule thresholds
-        rounded_prediction = int(round(blended_prediction))
-        
-        # Make classification prediction (high-risk) if classifier is available
-        is_high_risk = None
-        risk_probability = None
-        if rf_classifier_model is not None:
-            risk_probability = float(rf_classifier_model.predict_proba(features_df)[0][1])
-            is_high_risk = bool(rf_classifier_model.predict(features_df)[0])
+        cache_version = prediction_cache_version(bundle, snapshot)
+        cache_key = ('count', year, month, municipality, barangay)
+        prediction = prediction_cache.get(cache_version, cache_key) if cache_version else None
+        if prediction is None:
+            history_index = snapshot.history_index if snapshot is not None else None
+            prediction = predict_locations(bundle, year, month, [(municipality, barangay)], history_index)[0]
+            if cache_version:
+                prediction_cache.put(cache_version, cache_key, prediction)
         
         response = {
             'success': True,
             'prediction': {
-                'predicted_count': convert_to_native_types(rounded_prediction),
-                'predicted_count_raw': convert_to_native_types(round(blended_prediction, 2)),
-                'is_high_risk': is_high_risk,
-                'risk_probability': convert_to_native_types(risk_probability) if risk_probability is not None else None
+                'predicted_count': prediction['predicted_count'],
+                'predicted_count_raw': prediction['predicted_count_raw'],
+                'is_high_risk': prediction['is_high_risk'],
+                'risk_probability': prediction['risk_probability']
             },
             'year': year,
             'month': month,
@@ -795,6 +1131,8 @@ def predict_all_barangays():
     - year: Year (required)
     - month: Month (1-12, required)
     - limit: Optional - Number of top barangays to predict (default: all, recommended: 10-20 for faster response)
+    - stream: Optional - 1 to stream application/x-ndjson: one {"type": "prediction", ...} object
+      per line in descending predicted_count order, then a {"type": "summary", ...} line
     """
     def prescribe_actions(predicted_count):
         """
@@ -842,46 +1180,15 @@ def predict_all_barangays():
                 'Coordination: Daily SITREP and escalation to provincial task force.'
             ]
         return {'level': level, 'actions': actions}
-    def extract_hour(rec):
-        """Extract hour (0-23) from record using timeCommited if available, else from dateCommited"""
-        try:
-            t = rec.get('timeCommited')
-            if isinstance(t, str) and len(t) >= 2 and t[0:2].isdigit():
-                h = int(t[0:2])
-                if 0 <= h <= 23:
-                    return h
-        except Exception:
-            pass
-        try:
-            dc = rec.get('dateCommited')
-            if isinstance(dc, str):
-                # ISO string
-                dt = datetime.fromisoformat(dc.replace('Z', '+00:00'))
-                return dt.hour
-            elif isinstance(dc, datetime):
-                return dc.hour
-        except Exception:
-            return None
-        return None
-
-    def compute_high_risk_hours(accidents_raw, municipality, barangay):
+    def compute_high_risk_hours(hourly_index, municipality, barangay):
         """
         Compute high-risk hours for a barangay based on historical hourly distribution.
+        Reads the precomputed 24-bucket histogram from the snapshot's hourly index.
         Returns a dict with: hours (list[int]), ranges (str), threshold (float).
         """
         try:
-            # Filter accidents for this barangay (case sensitive match as stored)
-            relevant = [a for a in accidents_raw
-                        if a.get('municipality') == municipality and a.get('barangay') == barangay]
-            # Build 24-bucket histogram
-            counts = [0] * 24
-            total = 0
-            for rec in relevant:
-                h = extract_hour(rec)
-                if h is None or h < 0 or h > 23:
-                    continue
-                counts[h] += 1
-                total += 1
+            counts = hourly_index.get(municipality, barangay).tolist()
+            total = sum(counts)
             if total == 0:
                 return {'hours': [], 'ranges': '', 'threshold': 0.0}
             # Compute statistics
@@ -933,8 +1240,45 @@ def predict_all_barangays():
             logger.warning(f'compute_high_risk_hours error for {municipality}/{barangay}: {e}')
             return {'hours': [], 'ranges': '', 'threshold': 0.0}
 
+    def annotate(prediction, hourly_index):
+        """Add high-risk hours and prescriptions to a prediction dict"""
+        # Compute predicted high-risk hours based on historical hourly distribution
+        high_risk = compute_high_risk_hours(hourly_index, prediction['municipality'], prediction['barangay'])
+        prediction['predicted_high_risk_hours'] = high_risk.get('hours', [])
+        prediction['predicted_high_risk_ranges'] = high_risk.get('ranges', '')
+        
+        # Build prescriptions based on predicted count
+        prediction['prescription'] = prescribe_actions(prediction['predicted_count'])
+        return prediction
+
+    def stream_response(predictions, limit_applied):
+        """NDJSON response: each prediction as it is produced, then a summary record"""
+        def generate():
+            total = 0
+            try:
+                for prediction in predictions:
+                    total += 1
+                    yield ndjson_line(dict(prediction, type='prediction'))
+            except Exception as e:
+                logger.error(f"Streaming prediction error: {str(e)}")
+                yield ndjson_line({'type': 'error', 'success': False, 'error': str(e),
+                                   'timestamp': datetime.now().isoformat()})
+                return
+            yield ndjson_line({
+                'type': 'summary',
+                'success': True,
+                'year': year,
+                'month': month,
+                'total_barangays': total,
+                'limit_applied': limit_applied,
+                'timestamp': datetime.now().isoformat()
+            })
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     try:
-        if not model_loaded:
+        # One bundle for the whole request, even if a reload publishes a new one meanwhile
+        bundle = model_registry.current
+        if bundle is None:
             return jsonify({
                 'success': False,
                 'error': 'Model not loaded. Please check server logs.',
@@ -970,10 +1314,18 @@ def predict_all_barangays():
                 'timestamp': datetime.now().isoformat()
             }), 500
         
-        data_loader.connect()
-        accidents = data_loader.load_raw_data()
-        historical_data = data_loader.aggregate_monthly_counts(accidents)
-        data_loader.disconnect()
+        snapshot = data_loader.get_snapshot()
+        historical_data = snapshot.historical_data
+        
+        stream = wants_stream()
+        limit_applied = limit if limit and limit > 0 else None
+        cache_version = prediction_cache_version(bundle, snapshot)
+        cache_key = ('all', year, month, limit_applied)
+        cached = prediction_cache.get(cache_version, cache_key) if cache_version else None
+        if cached is not None:
+            if stream:
+                return stream_response(cached['predictions'], limit_applied)
+            return jsonify(dict(cached, timestamp=datetime.now().isoformat())), 200
         
         if historical_data.empty:
             return jsonify({
@@ -997,70 +1349,44 @@ def predict_all_barangays():
             
             logger.info(f"Limiting predictions to top {limit} barangays by historical accident counts")
         
-        predictions = []
-        for _, row in unique_locations.iterrows():
-            municipality = row['municipality']
-            barangay = row['barangay']
-            
-            # Prepare features
-            features_df = prepare_features(year, month, municipality, barangay, historical_data)
-            
-            # Make regression prediction (accident count)
-            # Model is trained on log-transformed target, so we need to inverse transform
-            use_log_target = model_metadata.get('use_log_target', True) if model_metadata else True
-            prediction_log = rf_regressor_model.predict(features_df)[0]
-            if use_log_target:
-                prediction_count = np.expm1(prediction_log)  # Inverse log1p transform
-            else:
-                prediction_count = prediction_log
-            prediction_count = max(0, float(prediction_count))
-            
-            # Compute historical baseline and blend to add locality differentiation
-            baseline = compute_baseline_count(historical_data, year, month, municipality, barangay)
-            # Blend: 60% baseline, 40% model prediction
-            blended_prediction = 0.6 * baseline + 0.4 * prediction_count
-            # Ensure non-negative and reasonable precision
-            blended_prediction = max(0.0, float(blended_prediction))
-            # Rounded count for reporting and rule thresholds
-            rounded_prediction = int(round(blended_prediction))
-            
-            # Make classification prediction (high-risk) if classifier is available
-            is_high_risk = None
-            risk_probability = None
-            if rf_classifier_model is not None:
-                risk_probability = float(rf_classifier_model.predict_proba(features_df)[0][1])
-                is_high_risk = bool(rf_classifier_model.predict(features_df)[0])
-            
-            # Compute predicted high-risk hours based on historical hourly distribution
-            high_risk = compute_high_risk_hours(accidents, municipality, barangay)
-
-            # Build prescriptions based on predicted count
-            prescription = prescribe_actions(rounded_prediction)
-
-            predictions.append({
-                'municipality': municipality,
-                'barangay': barangay,
-                'predicted_count': convert_to_native_types(rounded_prediction),
-                'predicted_count_raw': convert_to_native_types(round(blended_prediction, 2)),
-                'is_high_risk': is_high_risk,
-                'risk_probability': convert_to_native_types(risk_probability) if risk_probability is not None else None,
-                'predicted_high_risk_hours': high_risk.get('hours', []),
-                'predicted_high_risk_ranges': high_risk.get('ranges', ''),
-                'prescription': prescription
-            })
+        locations = list(unique_locations[['municipality', 'barangay']].itertuples(index=False, name=None))
+        
+        if stream:
+            # Model inference is one batch; rows are annotated and sent one at a time
+            blended, high_risk_flags, risk_probabilities = predict_blended(
+                bundle, year, month, locations, snapshot.history_index
+            )
+            # Same order as the non-streamed sort (stable, by rounded count)
+            order = sorted(range(len(locations)), key=lambda i: int(round(blended[i])), reverse=True)
+            return stream_response((
+                annotate(prediction_record(
+                    locations[i],
+                    blended[i],
+                    high_risk_flags[i] if high_risk_flags is not None else None,
+                    risk_probabilities[i] if risk_probabilities is not None else None
+                ), snapshot.hourly_index)
+                for i in order
+            ), limit_applied)
+        
+        predictions = predict_locations(bundle, year, month, locations, snapshot.history_index)
+        for prediction in predictions:
+            annotate(prediction, snapshot.hourly_index)
         
         # Sort by predicted count (descending)
         predictions.sort(key=lambda x: x['predicted_count'], reverse=True)
         
-        return jsonify({
+        result = {
             'success': True,
             'year': year,
             'month': month,
             'predictions': convert_to_native_types(predictions),
             'total_barangays': len(predictions),
-            'limit_applied': limit if limit and limit > 0 else None,
-            'timestamp': datetime.now().isoformat()
-        }), 200
+            'limit_applied': limit_applied
+        }
+        if cache_version:
+            prediction_cache.put(cache_version, cache_key, result)
+        
+        return jsonify(dict(result, timestamp=datetime.now().isoformat())), 200
         
     except Exception as e:
         logger.error(f"Batch prediction error: {str(e)}")
@@ -1088,7 +1414,9 @@ def predict_batch():
     }
     """
     try:
-        if not model_loaded:
+        # One bundle for the whole request, even if a reload publishes a new one meanwhile
+        bundle = model_registry.current
+        if bundle is None:
             return jsonify({
                 'success': False,
                 'error': 'Model not loaded. Please check server logs.',
@@ -1122,64 +1450,20 @@ def predict_batch():
             }), 400
         
         # Load historical data
-        historical_data = None
+        history_index = None
         try:
             if data_loader:
-                data_loader.connect()
-                accidents = data_loader.load_raw_data()
-                historical_data = data_loader.aggregate_monthly_counts(accidents)
-                data_loader.disconnect()
+                history_index = data_loader.get_snapshot().history_index
         except Exception as e:
             logger.warning(f"Could not load historical data: {str(e)}")
         
-        predictions = []
-        for location in locations:
-            municipality = location.get('municipality')
-            barangay = location.get('barangay')
-            
-            if not municipality or not barangay:
-                continue
-            
-            # Prepare features
-            features_df = prepare_features(year, month, municipality, barangay, historical_data)
-            
-            # Make regression prediction (accident count)
-            # Model is trained on log-transformed target, so we need to inverse transform
-            use_log_target = model_metadata.get('use_log_target', True) if model_metadata else True
-            prediction_log = rf_regressor_model.predict(features_df)[0]
-            if use_log_target:
-                prediction_count = np.expm1(prediction_log)  # Inverse log1p transform
-            else:
-                prediction_count = prediction_log
-            prediction_count = max(0, float(prediction_count))
-            
-            # Compute historical baseline and blend to add locality differentiation
-            baseline = 0.0
-            if historical_data is not None and not historical_data.empty:
-                baseline = compute_baseline_count(historical_data, year, month, municipality, barangay)
-            
-            # Blend: 60% baseline, 40% model prediction
-            blended_prediction = 0.6 * baseline + 0.4 * prediction_count
-            # Ensure non-negative and reasonable precision
-            blended_prediction = max(0.0, float(blended_prediction))
-            # Rounded count for reporting and rule thresholds
-            rounded_prediction = int(round(blended_prediction))
-            
-            # Make classification prediction (high-risk) if classifier is available
-            is_high_risk = None
-            risk_probability = None
-            if rf_classifier_model is not None:
-                risk_probability = float(rf_classifier_model.predict_proba(features_df)[0][1])
-                is_high_risk = bool(rf_classifier_model.predict(features_df)[0])
-            
-            predictions.append({
-                'municipality': municipality,
-                'barangay': barangay,
-                'predicted_count': convert_to_native_types(rounded_prediction),
-                'predicted_count_raw': convert_to_native_types(round(blended_prediction, 2)),
-                'is_high_risk': is_high_risk,
-                'risk_probability': convert_to_native_types(risk_probability) if risk_probability is not None else None
-            })
+        # Skip locations without municipality or barangay
+        valid_locations = [
+            (location.get('municipality'), location.get('barangay'))
+            for location in locations
+            if location.get('municipality') and location.get('barangay')
+        ]
+        predictions = predict_locations(bundle, year, month, valid_locations, history_index)
         
         return jsonify({
             'success': True,
@@ -1199,6 +1483,130 @@ def predict_batch():
         }), 500
 
 
+@app.route('/api/accidents/predict/horizon', methods=['GET'])
+def predict_horizon():
+    """
+    Forecast all barangays for several consecutive months in one response
+    
+    Each month's predictions feed the next month's lag/rolling features
+    (see forecast_horizon).
+    
+    Query Parameters:
+    - months: Number of months to forecast (1-12, default: 3)
+    - year, month: First forecast month (default: the month after the latest accident data;
+      at most MAX_HORIZON_MONTHS months after it)
+    """
+    try:
+        # One bundle for the whole request, even if a reload publishes a new one meanwhile
+        bundle = model_registry.current
+        if bundle is None:
+            return jsonify({
+                'success': False,
+                'error': 'Model not loaded. Please check server logs.',
+                'timestamp': datetime.now().isoformat()
+            }), 503
+        
+        months = request.args.get('months', default=3, type=int)
+        year = request.args.get('year', type=int)
+        month = request.args.get('month', type=int)
+        
+        if months is None or months < 1 or months > MAX_HORIZON_MONTHS:
+            return jsonify({
+                'success': False,
+                'error': f'months must be between 1 and {MAX_HORIZON_MONTHS}',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if (year is None) != (month is None):
+            return jsonify({
+                'success': False,
+                'error': 'Provide both year and month, or neither',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if month is not None and (month < 1 or month > 12):
+            return jsonify({
+                'success': False,
+                'error': 'Month must be between 1 and 12',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if not data_loader:
+            return jsonify({
+                'success': False,
+                'error': 'Data loader not initialized',
+                'timestamp': datetime.now().isoformat()
+            }), 500
+        
+        request_start = time.perf_counter()
+        snapshot = data_loader.get_snapshot()
+        historical_data = snapshot.historical_data
+        snapshot_time = time.perf_counter() - request_start
+        
+        if historical_data.empty:
+            return jsonify({
+                'success': False,
+                'error': 'No historical data available',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+        
+        # First month without data
+        latest = int((historical_data['year'] * 12 + historical_data['month'] - 1).max()) + 1
+        if year is None:
+            year, month = latest // 12, latest % 12 + 1
+        elif year * 12 + month - 1 - latest >= MAX_HORIZON_MONTHS:
+            # Every month between the data and the start is predicted first (warm-up)
+            last_year, last_month = (latest - 1) // 12, (latest - 1) % 12 + 1
+            return jsonify({
+                'success': False,
+                'error': f'Start month must be at most {MAX_HORIZON_MONTHS} months after the latest '
+                         f'accident data ({last_year}-{last_month:02d})',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        def request_timing():
+            # Timings of this request; never cached, so a cache hit reports its own
+            return {
+                'snapshot': round(snapshot_time * 1000, 2),
+                'total': round((time.perf_counter() - request_start) * 1000, 2)
+            }
+        
+        cache_version = prediction_cache_version(bundle, snapshot)
+        cache_key = ('horizon', year, month, months)
+        cached = prediction_cache.get(cache_version, cache_key) if cache_version else None
+        if cached is not None:
+            return jsonify(dict(cached, timing_ms=request_timing(), timestamp=datetime.now().isoformat())), 200
+        
+        unique_locations = historical_data[['municipality', 'barangay']].drop_duplicates()
+        locations = list(unique_locations.itertuples(index=False, name=None))
+        steps, warmup_months = forecast_horizon(bundle, historical_data, year, month, months, locations)
+        
+        result = convert_to_native_types({
+            'success': True,
+            'start': {'year': year, 'month': month},
+            'months': months,
+            'warmup_months': warmup_months,
+            'total_barangays': len(locations),
+            'steps': steps
+        })
+        if cache_version:
+            # Per-month timings describe this computation, not later cache hits
+            prediction_cache.put(cache_version, cache_key, dict(result, steps=[
+                {key: value for key, value in step.items() if key != 'timing_ms'} for step in result['steps']
+            ]))
+        
+        return jsonify(dict(result, timing_ms=request_timing(), timestamp=datetime.now().isoformat())), 200
+        
+    except Exception as e:
+        logger.error(f"Horizon prediction error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
 # Initialize model on startup
 if __name__ == '__main__':
     logger.info("Initializing accident prediction API...")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: training lag/rolling feature construction
+Compares the old groupby().transform(lambda ...) chain of prepare_training_data
+with the vectorized build_history_features
+
+Usage:
+    python benchmark_feature_builder.py [--sizes 1000 10000 100000] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from data_loader import build_history_features
+
+
+def synthetic_months(n_rows, n_municipalities=11, months_per_barangay=72, seed=42):
+    """n_rows barangay-months in the aggregate_monthly_counts layout (shuffled, with gaps)"""
+    rng = np.random.default_rng(seed)
+    n_barangays = max(1, int(np.ceil(n_rows / (months_per_barangay * 0.8))))
+    barangay_id = np.repeat(np.arange(n_barangays), months_per_barangay)
+    month_index = np.tile(np.arange(months_per_barangay), n_barangays)
+    keep = rng.permutation(len(barangay_id))[:n_rows]
+    barangay_id, month_index = barangay_id[keep], month_index[keep]
+    return pd.DataFrame({
+        'year': 2020 + month_index // 12,
+        'month': month_index % 12 + 1,
+        'municipality': np.array([f'MUNICIPALITY {i}' for i in range(n_municipalities)])[barangay_id % n_municipalities],
+        'barangay': np.array([f'BARANGAY {i}' for i in range(n_barangays)])[barangay_id],
+        'accident_count': rng.poisson(2.0, n_rows) + 1
+    })
+
+
+def legacy_history_features(df):
+    """Sort/groupby/transform chain as previously done in prepare_training_data"""
+    df = df.sort_values(['barangay', 'year', 'month'])
+    for lag in (1, 3, 6, 12):
+        df[f'accident_count_lag{lag}'] = df.groupby('barangay')['accident_count'].shift(lag).fillna(0)
+    for window in (3, 6, 12):
+        df[f'accident_count_rolling_mean_{window}'] = df.groupby('barangay')['accident_count'].transform(
+            lambda x: x.rolling(window=window, min_periods=1).mean()
+        )
+        df[f'accident_count_rolling_std_{window}'] = df.groupby('barangay')['accident_count'].transform(
+            lambda x: x.rolling(window=window, min_periods=1).std().fillna(0)
+        )
+    df = df.sort_values(['municipality', 'year', 'month'])
+    df['muni_count_lag1'] = df.groupby('municipality')['accident_count'].shift(1).fillna(0)
+    df['muni_count_rolling_mean_3'] = df.groupby('municipality')['accident_count'].transform(
+        lambda x: x.rolling(window=3, min_periods=1).mean()
+    )
+    df['muni_count_rolling_std_3'] = df.groupby('municipality')['accident_count'].transform(
+        lambda x: x.rolling(window=3, min_periods=1).std().fillna(0)
+    )
+    return df
+
+
+def best_time(func, df, repeat):
+    """Fastest of repeat runs (seconds) and the last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df.copy())
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(n_rows, repeat):
+    df = synthetic_months(n_rows)
+
+    legacy_time, expected = best_time(legacy_history_features, df, repeat)
+    vectorized_time, result = best_time(build_history_features, df, repeat)
+
+    identical = result.index.equals(expected.index) and all(
+        np.array_equal(result[column].to_numpy(), expected[column].to_numpy())
+        for column in expected.columns
+    )
+    print(f"{n_rows:>8,} barangay-months | {df['barangay'].nunique():>5} barangays | "
+          f"transform {legacy_time * 1e3:>8.1f} ms | vectorized {vectorized_time * 1e3:>6.1f} ms | "
+          f"speedup {legacy_time / vectorized_time:>5.1f}x | identical {identical}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='Numbers of barangay-month rows to simulate')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per implementation (fastest is reported)')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.repeat)
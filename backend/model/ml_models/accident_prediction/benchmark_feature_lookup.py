@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-location lag/rolling/baseline feature cost
+Compares the old DataFrame boolean-mask lookups with AccidentHistoryIndex
+
+Usage:
+    python benchmark_feature_lookup.py [--sizes 10000 1000000] [--sample 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from data_loader import AccidentHistoryIndex
+
+
+def synthetic_history(n_accidents, n_municipalities=11, barangays_per_municipality=45, years=(2020, 2025), seed=42):
+    """Aggregate n_accidents random accidents into the aggregate_monthly_counts layout"""
+    rng = np.random.default_rng(seed)
+    n_barangays = n_municipalities * barangays_per_municipality
+    municipality_names = np.array([f'MUNICIPALITY {i}' for i in range(n_municipalities)])
+    barangay_names = np.array([f'BARANGAY {i}' for i in range(n_barangays)])
+    barangay_id = rng.integers(0, n_barangays, n_accidents)
+    df = pd.DataFrame({
+        'year': rng.integers(years[0], years[1] + 1, n_accidents),
+        'month': rng.integers(1, 13, n_accidents),
+        'municipality': municipality_names[barangay_id // barangays_per_municipality],
+        'barangay': barangay_names[barangay_id],
+        'accident_count': 1
+    })
+    return df.groupby(['year', 'month', 'municipality', 'barangay']).agg({'accident_count': 'sum'}).reset_index()
+
+
+def legacy_features(historical_data, year, month, municipality, barangay):
+    """Boolean-mask lookups as previously done in prepare_features/compute_baseline_count"""
+    prev_month, prev_year = (12, year - 1) if month == 1 else (month - 1, year)
+    prev_data = historical_data[
+        (historical_data['year'] == prev_year) &
+        (historical_data['month'] == prev_month) &
+        (historical_data['barangay'] == barangay)
+    ]
+    features = {'lag1': 0, 'mean3': 0, 'std3': 0}
+    if not prev_data.empty:
+        features['lag1'] = prev_data['accident_count'].iloc[0]
+        recent = historical_data[
+            (historical_data['barangay'] == barangay) &
+            ((historical_data['year'] < year) | ((historical_data['year'] == year) & (historical_data['month'] < month)))
+        ].tail(3)
+        features['mean3'] = recent['accident_count'].mean()
+        features['std3'] = recent['accident_count'].std() if len(recent) > 1 else 0
+
+    prev = []
+    py, pm = year, month
+    for _ in range(3):
+        pm -= 1
+        if pm == 0:
+            pm, py = 12, py - 1
+        prev.append((py, pm))
+    subset = historical_data[
+        (historical_data['municipality'] == municipality) &
+        (historical_data['barangay'] == barangay) &
+        (
+            (historical_data['year'] == prev[0][0]) & (historical_data['month'] == prev[0][1]) |
+            (historical_data['year'] == prev[1][0]) & (historical_data['month'] == prev[1][1]) |
+            (historical_data['year'] == prev[2][0]) & (historical_data['month'] == prev[2][1])
+        )
+    ]
+    features['baseline'] = float(subset['accident_count'].mean()) if not subset.empty else 0.0
+    return features
+
+
+def run(n_accidents, sample, year=2026, month=1):
+    historical_data = synthetic_history(n_accidents)
+    locations = list(historical_data[['municipality', 'barangay']].drop_duplicates().itertuples(index=False, name=None))
+
+    start = time.perf_counter()
+    for municipality, barangay in locations[:sample]:
+        legacy_features(historical_data, year, month, municipality, barangay)
+    legacy_per_location = (time.perf_counter() - start) / min(sample, len(locations))
+
+    start = time.perf_counter()
+    index = AccidentHistoryIndex(historical_data)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.history_features(year, month, [barangay for _, barangay in locations])
+    index.baseline_counts(year, month, locations)
+    indexed_per_location = (time.perf_counter() - start) / len(locations)
+
+    print(f"{n_accidents:>10,} accidents | {len(historical_data):>7,} rows | {len(locations):>4} barangays | "
+          f"masks {legacy_per_location * 1e6:>9.1f} us/location | "
+          f"index {indexed_per_location * 1e6:>6.2f} us/location (build {build_time * 1e3:.1f} ms) | "
+          f"speedup {legacy_per_location / indexed_per_location:,.0f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000],
+                        help='Numbers of historical accidents to simulate')
+    parser.add_argument('--sample', type=int, default=50,
+                        help='Locations timed with the boolean-mask path (it is slow)')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.sample)
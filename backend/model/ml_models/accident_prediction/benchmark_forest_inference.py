@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: sklearn forest predict vs CompiledForest
+Reports single-row and batch latency and the largest prediction difference
+
+Usage:
+    python benchmark_forest_inference.py [--model ../trained/accident_rf_regression_model.pkl] [--rows 1 300 1000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from compiled_forest import CompiledForest
+
+DEFAULT_MODEL = os.path.join(current_dir, '../trained/accident_rf_regression_model.pkl')
+
+
+def synthetic_forest(n_estimators=450, n_features=23, seed=42):
+    """Forest of roughly the trained model's size, for machines without the artifact"""
+    from sklearn.ensemble import RandomForestRegressor
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(2000, n_features))
+    y = np.log1p(np.abs(X[:, :3].sum(axis=1)) * 2)
+    return RandomForestRegressor(n_estimators=n_estimators, max_depth=15, min_samples_leaf=2,
+                                 random_state=seed, n_jobs=-1).fit(X, y)
+
+
+def time_call(func, X, min_seconds=0.5):
+    """Median seconds per call over enough repeats to fill min_seconds"""
+    func(X)
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < 5 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def run(model, rows):
+    start = time.perf_counter()
+    compiled = CompiledForest.from_sklearn(model)
+    compile_time = time.perf_counter() - start
+    print(f"{compiled.n_estimators} trees, {compiled.node_count:,} nodes, depth {compiled.max_depth} "
+          f"(compiled in {compile_time * 1e3:.0f} ms)")
+
+    rng = np.random.default_rng(0)
+    for n_rows in rows:
+        X = rng.normal(size=(n_rows, model.n_features_in_)) * 5
+        if hasattr(model, 'feature_names_in_'):
+            X = pd.DataFrame(X, columns=model.feature_names_in_)
+        sklearn_time = time_call(model.predict, X)
+        compiled_time = time_call(compiled.predict, X)
+        max_diff = np.abs(model.predict(X) - compiled.predict(X)).max()
+        print(f"{n_rows:>6} rows | sklearn {sklearn_time * 1e3:>8.2f} ms | compiled {compiled_time * 1e3:>8.2f} ms | "
+              f"speedup {sklearn_time / compiled_time:>6.1f}x | max |diff| {max_diff:.1e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=DEFAULT_MODEL,
+                        help='Pickled RandomForestRegressor/Classifier (synthetic forest if missing)')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 300, 1000],
+                        help='Batch sizes to time')
+    args = parser.parse_args()
+
+    if os.path.exists(args.model):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            forest = joblib.load(args.model)
+        print(f"Model: {args.model}")
+    else:
+        print(f"Model not found ({args.model}), using a synthetic forest")
+        forest = synthetic_forest()
+
+    run(forest, args.rows)
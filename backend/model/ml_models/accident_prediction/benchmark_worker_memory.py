@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: memory held by each gunicorn-style worker for the model artifacts
+Compares every worker loading its own copy (old layout, no preload) with the
+artifacts loaded once before fork (preload) from the mmap-friendly layout
+
+Each worker runs one prediction per model so touched pages are counted, then
+reports its USS (memory no other process shares) and PSS from /proc (Linux only).
+
+Usage:
+    python benchmark_worker_memory.py [--service accident sarima] [--workers 4]
+"""
+
+import argparse
+import gc
+import glob
+import logging
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from compiled_forest import CompiledForest
+from model_bundle import ModelBundle
+
+TRAINED_DIR = os.path.join(current_dir, '../trained')
+
+
+def memory_kb():
+    """USS, PSS and RSS of this process in KB"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[key] = int(value.split()[0])
+    return {
+        'uss': fields['Private_Clean'] + fields['Private_Dirty'],
+        'pss': fields['Pss'],
+        'rss': fields['Rss']
+    }
+
+
+# Accident count service: forests, compiled forests, encoders
+
+def accident_files(workdir):
+    """Copy of the trained accident artifacts with compiled exports (new layout)"""
+    for path in glob.glob(os.path.join(TRAINED_DIR, 'accident_rf_*')) + \
+            glob.glob(os.path.join(TRAINED_DIR, '*_encoder.pkl')):
+        shutil.copy(path, workdir)
+    bundle = ModelBundle.load(workdir)
+    CompiledForest.from_sklearn(bundle.regressor).save(os.path.join(workdir, 'accident_rf_regression_compiled.joblib'))
+    if bundle.classifier is not None:
+        CompiledForest.from_sklearn(bundle.classifier).save(
+            os.path.join(workdir, 'accident_rf_classification_compiled.joblib'))
+    return workdir
+
+
+def load_accident(workdir, mmap):
+    if mmap:
+        return ModelBundle.load(workdir, lambda model, path: CompiledForest.load(path) if model is not None else None)
+    # Old layout: every worker compiles/reads the node arrays into its own memory
+    return ModelBundle.load(workdir, lambda model, path: CompiledForest.from_sklearn(model) if model is not None else None)
+
+
+def use_accident(bundle):
+    X = np.random.default_rng(0).normal(size=(500, len(bundle.feature_columns)))
+    bundle.compiled_regressor.predict(X)
+    bundle.regressor.predict(X)
+
+
+# Vehicle registration service: SARIMA results per municipality
+
+def sarima_files(workdir):
+    """joblib re-dumps of the pickled SARIMA results (the layout save_model now writes)"""
+    for path in sorted(glob.glob(os.path.join(TRAINED_DIR, 'optimized_sarima_model*.pkl'))):
+        with open(path, 'rb') as f:
+            joblib.dump(pickle.load(f), os.path.join(workdir, os.path.basename(path)))
+    return workdir
+
+
+def load_sarima(workdir, mmap):
+    models = []
+    for path in sorted(glob.glob(os.path.join(TRAINED_DIR if not mmap else workdir, 'optimized_sarima_model*.pkl'))):
+        if mmap:
+            models.append(joblib.load(path, mmap_mode='c'))
+        else:
+            with open(path, 'rb') as f:
+                models.append(pickle.load(f))
+    return models
+
+
+def use_sarima(models):
+    for model in models:
+        k_exog = model.model.k_exog
+        model.get_forecast(steps=30, exog=np.zeros((30, k_exog)) if k_exog else None)
+
+
+SERVICES = {
+    'accident': (accident_files, load_accident, use_accident),
+    'sarima': (sarima_files, load_sarima, use_sarima)
+}
+
+
+def run_workers(n_workers, work):
+    """Fork n_workers children running work(); returns their (memory, seconds) reports"""
+    reports = []
+    for _ in range(n_workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            start = time.perf_counter()
+            work()
+            report = dict(memory_kb(), seconds=time.perf_counter() - start)
+            os.write(write_fd, pickle.dumps(report))
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as f:
+            reports.append(pickle.loads(f.read()))
+        os.waitpid(pid, 0)
+    return reports
+
+
+def run(service, n_workers):
+    prepare, load, use = SERVICES[service]
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare(workdir)
+        gc.collect()
+
+        # Before: each worker loads its own copy after fork
+        before = run_workers(n_workers, lambda: use(load(workdir, mmap=False)))
+
+        # After: loaded once in the parent (gunicorn master with preload_app), then forked
+        start = time.perf_counter()
+        artifacts = load(workdir, mmap=True)
+        preload_time = time.perf_counter() - start
+        gc.freeze()
+        after = run_workers(n_workers, lambda: use(artifacts))
+
+    def summary(reports):
+        return (np.mean([r['uss'] for r in reports]) / 1024, np.mean([r['pss'] for r in reports]) / 1024,
+                np.mean([r['rss'] for r in reports]) / 1024, np.mean([r['seconds'] for r in reports]))
+
+    uss, pss, rss, seconds = summary(before)
+    print(f"{service:>8} | per-worker load  | USS {uss:>6.1f} MB | PSS {pss:>6.1f} MB | RSS {rss:>6.1f} MB | "
+          f"worker start {seconds * 1e3:>6.0f} ms")
+    uss, pss, rss, seconds = summary(after)
+    print(f"{service:>8} | preload + mmap   | USS {uss:>6.1f} MB | PSS {pss:>6.1f} MB | RSS {rss:>6.1f} MB | "
+          f"worker start {seconds * 1e3:>6.0f} ms (master load {preload_time * 1e3:.0f} ms)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--service', nargs='+', choices=sorted(SERVICES), default=sorted(SERVICES),
+                        help='Artifacts to measure')
+    parser.add_argument('--workers', type=int, default=4, help='Forked workers per mode')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.WARNING)
+    for service in args.service:
+        # Import the heavy libraries before any fork, as the app module does
+        if service == 'sarima':
+            import statsmodels.tsa.statespace.sarimax  # noqa: F401
+        run(service, args.workers)
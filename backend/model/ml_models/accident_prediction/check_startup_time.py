@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Startup-time report for the ML Flask services
+Cold-starts a fresh interpreter that imports the service module with
+`python -X importtime`, prints the packages the import time goes to and fails
+when the startup exceeds the budget, so a heavy top-level import is caught
+before it slows down every service restart.
+
+- accident: import accident_prediction/app.py (loads the trained models on import)
+- mv: import mv_registration_flask/app.py and load the aggregated SARIMA model
+  (wsgi.py would also export from MongoDB and train missing models, so it is not run)
+
+Usage:
+    python check_startup_time.py [--service accident mv] [--budget SECONDS] [--repeat 3] [--top 10]
+
+Exits with status 1 if any service is over its budget.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ml_models_dir = os.path.dirname(current_dir)
+
+MV_LOAD_MODEL = (
+    "import os, app; from sarima_model_optimized import OptimizedSARIMAModel; "
+    "model = OptimizedSARIMAModel(os.path.join(os.path.dirname(app.__file__), '../trained')); "
+    "model.model_exists() and model.load_model()"
+)
+
+# Service: (directory, startup statement, default budget in seconds); override with STARTUP_BUDGET_<SERVICE>
+SERVICES = {
+    'accident': (current_dir, 'import app', 3.0),
+    'mv': (os.path.join(ml_models_dir, 'mv_registration_flask'), MV_LOAD_MODEL, 3.0)
+}
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+\d+ \| +(\S+)')
+
+
+def cold_start(directory, statement):
+    """Run statement in a fresh interpreter; returns (wall seconds, importtime lines)"""
+    env = dict(os.environ, PYTHONPATH=directory)
+    # Run outside the service directory so log files written on import land in a scratch dir
+    with tempfile.TemporaryDirectory() as scratch:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                                cwd=scratch, env=env, capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{result.stderr[-2000:]}")
+    return seconds, result.stderr.splitlines()
+
+
+def package_times(lines):
+    """Self import time per top-level package, in seconds"""
+    per_package = defaultdict(float)
+    for line in lines:
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, name = match.groups()
+            per_package[name.split('.')[0]] += int(self_us) / 1e6
+    return per_package
+
+
+def check(service, budget, repeat, top):
+    """Print the startup report for one service; returns True if within budget"""
+    directory, statement, default_budget = SERVICES[service]
+    if budget is None:
+        budget = float(os.getenv(f'STARTUP_BUDGET_{service.upper()}', default_budget))
+
+    # Fastest run: the first one also pays for cold disk caches and .pyc compilation
+    runs = [cold_start(directory, statement) for _ in range(repeat)]
+    seconds, lines = min(runs, key=lambda run: run[0])
+    per_package = package_times(lines)
+
+    within = seconds <= budget
+    print(f"{service}: startup {seconds:.2f} s (imports {sum(per_package.values()):.2f} s), "
+          f"budget {budget:.2f} s -> {'OK' if within else 'OVER BUDGET'}")
+    for package, package_seconds in sorted(per_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {package:<28} {package_seconds * 1e3:>7.0f} ms")
+    return within
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--service', nargs='+', choices=sorted(SERVICES), default=sorted(SERVICES),
+                        help='Services to start')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='Startup budget in seconds (default: per service, or STARTUP_BUDGET_<SERVICE>)')
+    parser.add_argument('--repeat', type=int, default=3, help='Cold starts per service (fastest is reported)')
+    parser.add_argument('--top', type=int, default=10, help='Packages to list per service')
+    args = parser.parse_args()
+
+    results = [check(service, args.budget, args.repeat, args.top) for service in args.service]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,250 @@
+"""
+Array-backed random forest inference
+Flattens a fitted sklearn RandomForestRegressor/RandomForestClassifier into
+contiguous NumPy node arrays and evaluates every tree over a batch at once
+"""
+
+import os
+import joblib
+import numpy as np
+
+FORMAT_VERSION = 2
+
+# Rows traversed together; keeps the working set of node indices cache-sized
+ROW_CHUNK_SIZE = 256
+
+
+class CompiledForest:
+    """
+    Random forest stored as flat node arrays
+
+    All trees are concatenated into one set of arrays, with roots[t] the first
+    node of tree t. Nodes are renumbered breadth-first so the two children of a
+    split are adjacent: a step is child[node] + (x > threshold[node]). Leaves
+    point to themselves with an infinite threshold. A batch is traversed level
+    by level for all trees at once, dropping (tree, row) pairs as they reach a
+    leaf, with no per-tree Python loop.
+
+    Storage:
+    - feature: int16 (int32 for very wide inputs)
+    - child: int32
+    - threshold: float32, rounded down to the largest float32 <= the sklearn
+      threshold. sklearn casts inputs to float32, and for a float32 x,
+      x <= t exactly when x <= that float32, so splits are unchanged
+    - value: float64 leaf values (regressor) or class probabilities (classifier)
+    """
+
+    def __init__(self, kind, roots, feature, threshold, child, is_leaf, value, missing_left,
+                 max_depth, n_features, classes=None, source=None):
+        self.kind = kind
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.child = child
+        self.is_leaf = is_leaf
+        self.value = value
+        self.missing_left = missing_left
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.classes_ = classes
+        self.source = source or {}
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Flatten a fitted RandomForestRegressor or RandomForestClassifier
+
+        Args:
+            model: Fitted single-output sklearn forest
+
+        Returns:
+            CompiledForest
+        """
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be compiled")
+        kind = 'classifier' if hasattr(model, 'classes_') else 'regressor'
+
+        features, thresholds, children, leaves, values, missing, roots = [], [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            left, right = tree.children_left, tree.children_right
+
+            # Breadth-first order puts the children of every split next to each other
+            order = [0]
+            for node in order:
+                if left[node] != -1:
+                    order.extend((left[node], right[node]))
+            order = np.asarray(order, dtype=np.int64)
+            position = np.empty(len(order), dtype=np.int64)
+            position[order] = np.arange(len(order))
+
+            is_leaf = left[order] == -1
+            features.append(np.where(is_leaf, 0, tree.feature[order]))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+            children.append(np.where(is_leaf, np.arange(len(order)), position[np.maximum(left[order], 0)]) + offset)
+            leaves.append(is_leaf)
+
+            tree_missing = getattr(tree, 'missing_go_to_left', None)
+            tree_missing = (np.zeros(len(order), dtype=bool) if tree_missing is None
+                            else np.asarray(tree_missing, dtype=bool)[order])
+            # NaN at a leaf must stay on the leaf (offset 0)
+            missing.append(tree_missing | is_leaf)
+
+            if kind == 'classifier':
+                # Same normalization as DecisionTreeClassifier.predict_proba
+                proba = tree.value[order, 0, :].astype(np.float64)
+                normalizer = proba.sum(axis=1, keepdims=True)
+                normalizer[normalizer == 0.0] = 1.0
+                values.append(proba / normalizer)
+            else:
+                values.append(tree.value[order, 0, 0].astype(np.float64))
+
+            roots.append(offset)
+            offset += len(order)
+
+        threshold = np.concatenate(thresholds)
+        threshold32 = threshold.astype(np.float32)
+        rounded_up = threshold32.astype(np.float64) > threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+
+        feature_dtype = np.int16 if model.n_features_in_ <= np.iinfo(np.int16).max else np.int32
+        return cls(
+            kind=kind,
+            roots=np.asarray(roots, dtype=np.int32),
+            feature=np.concatenate(features).astype(feature_dtype),
+            threshold=threshold32,
+            child=np.concatenate(children).astype(np.int32),
+            is_leaf=np.concatenate(leaves),
+            value=np.concatenate(values),
+            missing_left=np.concatenate(missing),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+            n_features=model.n_features_in_,
+            classes=np.asarray(model.classes_) if kind == 'classifier' else None,
+            source={'n_estimators': len(model.estimators_), 'node_count': offset}
+        )
+
+    def matches(self, model):
+        """Whether this compiled forest was exported from the given sklearn model"""
+        return (
+            model is not None and
+            self.n_estimators == len(model.estimators_) and
+            self.node_count == sum(estimator.tree_.node_count for estimator in model.estimators_) and
+            self.n_features == model.n_features_in_
+        )
+
+    def save(self, path):
+        """
+        Write the node arrays uncompressed with joblib
+
+        Arrays are stored raw and aligned, so load() can memory-map them and
+        every process serving the same file shares one copy in the page cache.
+        """
+        arrays = {
+            'format_version': FORMAT_VERSION,
+            'kind': self.kind,
+            'max_depth': self.max_depth,
+            'n_features': self.n_features,
+            'source': self.source,
+            'roots': self.roots,
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'child': self.child,
+            'is_leaf': self.is_leaf,
+            'value': self.value,
+            'missing_left': self.missing_left,
+            'classes': self.classes_
+        }
+        # Write next to the target and rename so readers never see a partial file
+        tmp_path = f"{path}.tmp"
+        joblib.dump(arrays, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a forest written by save()
+
+        Args:
+            path: File written by save()
+            mmap_mode: numpy memmap mode for the node arrays (None reads them into memory)
+        """
+        data = joblib.load(path, mmap_mode=mmap_mode)
+        if not isinstance(data, dict) or data.get('format_version') != FORMAT_VERSION:
+            version = data.get('format_version') if isinstance(data, dict) else None
+            raise ValueError(f"Unsupported compiled forest format: {version}")
+        return cls(
+            kind=data['kind'],
+            roots=data['roots'],
+            feature=data['feature'],
+            threshold=data['threshold'],
+            child=data['child'],
+            is_leaf=data['is_leaf'],
+            value=data['value'],
+            missing_left=data['missing_left'],
+            max_depth=data['max_depth'],
+            n_features=data['n_features'],
+            classes=data['classes'],
+            source=data['source']
+        )
+
+    def _leaves(self, X):
+        """Leaf node of every (tree, row) pair, flattened tree-major"""
+        n_rows = X.shape[0]
+        flat_x = X.ravel()
+        has_nan = np.isnan(flat_x).any()
+
+        leaves = np.repeat(self.roots, n_rows)
+        active = np.arange(len(leaves))
+        nodes = leaves.copy()
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.int64) * self.n_features, self.n_estimators)
+
+        for _ in range(self.max_depth):
+            x = np.take(flat_x, np.take(self.feature, nodes) + row_offsets)
+            go_right = x > np.take(self.threshold, nodes)
+            if has_nan:
+                go_right |= np.isnan(x) & ~np.take(self.missing_left, nodes)
+            nodes = np.take(self.child, nodes) + go_right
+
+            done = np.take(self.is_leaf, nodes)
+            if done.any():
+                leaves[active[done]] = nodes[done]
+                keep = ~done
+                active, nodes, row_offsets = active[keep], nodes[keep], row_offsets[keep]
+                if not len(active):
+                    break
+        return leaves
+
+    def _tree_mean(self, X):
+        """Average leaf value over all trees, evaluated in row chunks"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {X.shape}")
+
+        result = np.empty((X.shape[0],) + self.value.shape[1:], dtype=np.float64)
+        for start in range(0, X.shape[0], ROW_CHUNK_SIZE):
+            chunk = X[start:start + ROW_CHUNK_SIZE]
+            leaf_values = np.take(self.value, self._leaves(chunk), axis=0)
+            leaf_values = leaf_values.reshape((self.n_estimators, chunk.shape[0]) + self.value.shape[1:])
+            result[start:start + chunk.shape[0]] = leaf_values.sum(axis=0) / self.n_estimators
+        return result
+
+    def predict(self, X):
+        """Regressor: mean prediction. Classifier: most probable class."""
+        if self.kind == 'classifier':
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        return self._tree_mean(X)
+
+    def predict_proba(self, X):
+        """Class probabilities (classifier only)"""
+        if self.kind != 'classifier':
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._tree_mean(X)
@@ -5,20 +5,460 @@ Connects to MongoDB and aggregates monthly accident counts per barangay
 
 import os
 import sys
-from pymongo import MongoClient
+import threading
+import time
+from pymongo.errors import OperationFailure
 import pandas as pd
 import numpy as np
+from pandas.api.indexers import BaseIndexer
 from datetime import datetime
 import logging
 
+# Add parent directory to path for the shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.mongo_pool import get_client
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds a cached snapshot is served without touching MongoDB. After this the
+# cache runs a cheap change probe and only reloads if the collection changed.
+DEFAULT_CACHE_TTL_SECONDS = int(os.getenv('ACCIDENT_CACHE_TTL_SECONDS', '300'))
+
+# Incremental refreshes are replaced by a full rebuild at least this often
+DEFAULT_FULL_RESYNC_SECONDS = int(os.getenv('ACCIDENT_FULL_RESYNC_SECONDS', '21600'))
+
+# Fields needed for monthly aggregation and hourly risk windows
+SNAPSHOT_FIELDS = ['dateCommited', 'timeCommited', 'municipality', 'barangay']
+
+# 'python' pulls records and aggregates in pandas; 'pipeline' groups inside MongoDB
+DEFAULT_AGGREGATION_MODE = os.getenv('ACCIDENT_AGGREGATION_MODE', 'python')
+AGGREGATION_MODES = ('python', 'pipeline')
+
+# Training lag/rolling features (prepare_training_data): lags and windows in rows per group
+HISTORY_LAGS = (1, 3, 6, 12)
+HISTORY_WINDOWS = (3, 6, 12)
+MUNICIPALITY_WINDOW = 3
+
+
+class GroupWindowIndexer(BaseIndexer):
+    """
+    Trailing windows of window_size rows that never cross a group boundary
+    
+    One rolling() call over rows sorted by group then gives the same windows (and
+    the same Cython kernel, so bit-identical values) as
+    groupby(group).transform(lambda x: x.rolling(window_size, min_periods=1)...).
+    """
+    
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.group_start)
+        return start, end
+
+
+def _grouped_history(values, group, lags, windows):
+    """
+    Lag and trailing-window features over rows already sorted by group
+    
+    Same as groupby(group).shift(lag).fillna(0) and
+    groupby(group).rolling(window, min_periods=1).mean()/.std().fillna(0),
+    without a Python call per group.
+    
+    Returns:
+        ({lag: values}, {window: (mean, std)})
+    """
+    n = len(values)
+    new_group = np.r_[True, group[1:] != group[:-1]] if n else np.zeros(0, dtype=bool)
+    starts = np.flatnonzero(new_group)
+    group_start = np.repeat(starts, np.diff(np.r_[starts, n]))
+    position = np.arange(n) - group_start
+    
+    lagged = {}
+    for lag in lags:
+        out = np.zeros(n)
+        ok = position >= lag
+        out[ok] = values[np.flatnonzero(ok) - lag]
+        lagged[lag] = out
+    
+    series = pd.Series(values)
+    rolling = {}
+    for window in windows:
+        windowed = series.rolling(GroupWindowIndexer(window_size=window, group_start=group_start), min_periods=1)
+        rolling[window] = (windowed.mean().to_numpy(), windowed.std().fillna(0).to_numpy())
+    return lagged, rolling
+
+
+def build_history_features(df):
+    """
+    Lag/rolling feature columns of prepare_training_data in one vectorized pass
+    
+    Barangay features look back over the barangay's rows in (year, month) order,
+    municipality features over the municipality's rows; windows include the
+    current row. Row order of the result is (municipality, year, month) with ties
+    in (barangay, year, month) order, exactly as the two stable sorts did before.
+    
+    Args:
+        df: Monthly counts with year, month, municipality, barangay, accident_count
+        
+    Returns:
+        Copy of df with the lag/rolling columns, sorted by (municipality, year, month)
+    """
+    counts = df['accident_count'].to_numpy(dtype=float)
+    year = df['year'].to_numpy()
+    month = df['month'].to_numpy()
+    barangay_code = pd.factorize(df['barangay'], sort=True)[0]
+    municipality_code = pd.factorize(df['municipality'], sort=True)[0]
+    
+    # np.lexsort is stable, like sort_values on several columns
+    by_barangay = np.lexsort((month, year, barangay_code))
+    by_municipality = by_barangay[np.lexsort((month[by_barangay], year[by_barangay],
+                                              municipality_code[by_barangay]))]
+    
+    columns = {}
+    lagged, rolling = _grouped_history(counts[by_barangay], barangay_code[by_barangay], HISTORY_LAGS, HISTORY_WINDOWS)
+    for lag in HISTORY_LAGS:
+        columns[f'accident_count_lag{lag}'] = (by_barangay, lagged[lag])
+    for window in HISTORY_WINDOWS:
+        columns[f'accident_count_rolling_mean_{window}'] = (by_barangay, rolling[window][0])
+        columns[f'accident_count_rolling_std_{window}'] = (by_barangay, rolling[window][1])
+    
+    lagged, rolling = _grouped_history(counts[by_municipality], municipality_code[by_municipality],
+                                       (1,), (MUNICIPALITY_WINDOW,))
+    columns['muni_count_lag1'] = (by_municipality, lagged[1])
+    columns[f'muni_count_rolling_mean_{MUNICIPALITY_WINDOW}'] = (by_municipality, rolling[MUNICIPALITY_WINDOW][0])
+    columns[f'muni_count_rolling_std_{MUNICIPALITY_WINDOW}'] = (by_municipality, rolling[MUNICIPALITY_WINDOW][1])
+    
+    result = df.copy()
+    for name, (order, values) in columns.items():
+        column = np.empty(len(df))
+        column[order] = values
+        result[name] = column
+    return result.take(by_municipality)
+
+
+class AccidentHistoryIndex:
+    """
+    Time-indexed monthly counts for constant-time lag/rolling/baseline lookups
+    
+    Built once per aggregate refresh from the aggregate_monthly_counts DataFrame.
+    Rows are grouped per barangay name in (year, month, municipality) order, with
+    dense (barangay x month) matrices pointing into them, so a lookup never scans
+    the history:
+    - rows_before[b, k]: number of rows of barangay b before month origin + k
+    - first_row[b, k]: first row of barangay b in month origin + k (-1 if none)
+    - pair_counts[p, k]: count for (municipality, barangay) pair p in month origin + k
+    """
+    
+    LAG_PERIODS = (3, 6, 12)
+    ROLLING_WINDOWS = (3, 6, 12)
+    BASELINE_MONTHS = 3
+    
+    def __init__(self, df_aggregated):
+        """
+        Args:
+            df_aggregated: DataFrame with year, month, municipality, barangay, accident_count
+        """
+        self.barangay_codes = {}
+        self.pair_codes = {}
+        self.n_rows = 0
+        
+        if df_aggregated is None or df_aggregated.empty:
+            self.origin = 0
+            self.n_months = 0
+            return
+        
+        df = df_aggregated.sort_values(['year', 'month', 'municipality', 'barangay'], kind='mergesort')
+        offsets = (df['year'].to_numpy(dtype=np.int64) * 12 + df['month'].to_numpy(dtype=np.int64) - 1)
+        self.origin = int(offsets.min())
+        self.n_months = int(offsets.max()) - self.origin + 1
+        month_idx = offsets - self.origin
+        counts = df['accident_count'].to_numpy(dtype=float)
+        
+        # Per-barangay row blocks, keeping (year, month, municipality) order inside each block
+        barangay_code, barangay_labels = pd.factorize(df['barangay'])
+        self.barangay_codes = {label: code for code, label in enumerate(barangay_labels)}
+        order = np.argsort(barangay_code, kind='stable')
+        self.counts = counts[order]
+        self.cumsum = np.concatenate([[0.0], np.cumsum(self.counts)])
+        block_sizes = np.bincount(barangay_code, minlength=len(barangay_labels))
+        self.block_start = np.concatenate([[0], np.cumsum(block_sizes)[:-1]])
+        self.n_rows = len(self.counts)
+        
+        n_barangays = len(barangay_labels)
+        rows_per_month = np.zeros((n_barangays, self.n_months), dtype=np.int32)
+        np.add.at(rows_per_month, (barangay_code, month_idx), 1)
+        self.rows_before = np.zeros((n_barangays, self.n_months + 1), dtype=np.int32)
+        np.cumsum(rows_per_month, axis=1, out=self.rows_before[:, 1:])
+        
+        sorted_barangay = barangay_code[order]
+        sorted_month = month_idx[order]
+        self.first_row = np.full((n_barangays, self.n_months), -1, dtype=np.int64)
+        _, first_positions = np.unique(sorted_barangay * self.n_months + sorted_month, return_index=True)
+        self.first_row[sorted_barangay[first_positions], sorted_month[first_positions]] = first_positions
+        
+        # Dense (municipality, barangay) x month count matrix for the baseline
+        pair_code, pair_labels = pd.factorize(pd.MultiIndex.from_arrays([df['municipality'], df['barangay']]))
+        self.pair_codes = {label: code for code, label in enumerate(pair_labels)}
+        self.pair_counts = np.zeros((len(pair_labels), self.n_months))
+        np.add.at(self.pair_counts, (pair_code, month_idx), counts)
+    
+    def _month_index(self, year, month):
+        return int(year) * 12 + int(month) - 1 - self.origin
+    
+    def history_features(self, year, month, barangays):
+        """
+        Lag/rolling features for many barangays at a target month
+        
+        Matches the serving definitions used so far: lag1 is the count in the
+        previous calendar month, the other lags and the rolling windows look at the
+        most recent rows before the target month, and rolling windows are only
+        filled when the barangay had accidents in the previous month.
+        
+        Args:
+            year: Target year
+            month: Target month (1-12)
+            barangays: List of barangay names
+            
+        Returns:
+            dict of feature column -> numpy array (one value per barangay)
+        """
+        n = len(barangays)
+        features = {'accident_count_lag1': np.zeros(n)}
+        for lag in self.LAG_PERIODS:
+            features[f'accident_count_lag{lag}'] = np.zeros(n)
+        for window in self.ROLLING_WINDOWS:
+            features[f'accident_count_rolling_mean_{window}'] = np.zeros(n)
+            features[f'accident_count_rolling_std_{window}'] = np.zeros(n)
+        
+        codes = np.array([self.barangay_codes.get(b, -1) for b in barangays], dtype=np.int64)
+        known = codes >= 0
+        if self.n_rows == 0 or not known.any():
+            return features
+        
+        rows = np.flatnonzero(known)
+        codes = codes[rows]
+        k = self._month_index(year, month)
+        start = self.block_start[codes]
+        available = self.rows_before[codes, min(max(k, 0), self.n_months)]
+        end = start + available
+        
+        # Previous calendar month
+        has_prev = np.zeros(len(rows), dtype=bool)
+        if 0 < k <= self.n_months:
+            first = self.first_row[codes, k - 1]
+            has_prev = first >= 0
+            features['accident_count_lag1'][rows[has_prev]] = self.counts[first[has_prev]]
+        
+        for lag in self.LAG_PERIODS:
+            ok = available >= lag
+            features[f'accident_count_lag{lag}'][rows[ok]] = self.counts[end[ok] - lag]
+        
+        for window in self.ROLLING_WINDOWS:
+            size = np.minimum(available, window)
+            ok = has_prev & (size > 0)
+            if not ok.any():
+                continue
+            size, win_end = size[ok], end[ok]
+            mean = (self.cumsum[win_end] - self.cumsum[win_end - size]) / size
+            # Deviations over a fixed-width window, zero-padded at the front
+            positions = win_end[:, None] - window + np.arange(window)
+            in_window = positions >= (win_end - size)[:, None]
+            values = self.counts[np.clip(positions, 0, self.n_rows - 1)]
+            deviations = np.where(in_window, (mean[:, None] - values) ** 2, 0.0).sum(axis=1)
+            std = np.where(size > 1, np.sqrt(deviations / np.maximum(size - 1, 1)), 0.0)
+            features[f'accident_count_rolling_mean_{window}'][rows[ok]] = mean
+            features[f'accident_count_rolling_std_{window}'][rows[ok]] = std
+        
+        return features
+    
+    def baseline_counts(self, year, month, locations):
+        """
+        Average count over the last BASELINE_MONTHS calendar months per location
+        
+        Months without accidents for the location are left out of the average,
+        and locations with no accidents in the window get 0.
+        
+        Args:
+            year: Target year
+            month: Target month (1-12)
+            locations: List of (municipality, barangay) tuples
+            
+        Returns:
+            numpy array of baselines
+        """
+        baselines = np.zeros(len(locations))
+        codes = np.array([self.pair_codes.get(tuple(loc), -1) for loc in locations], dtype=np.int64)
+        k = self._month_index(year, month)
+        lo, hi = max(k - self.BASELINE_MONTHS, 0), min(k, self.n_months)
+        known = codes >= 0
+        if self.n_rows == 0 or lo >= hi or not known.any():
+            return baselines
+        
+        window = self.pair_counts[codes[known], lo:hi]
+        totals = window.sum(axis=1)
+        months_present = (window > 0).sum(axis=1)
+        averaged = np.divide(totals, months_present, out=np.zeros_like(totals), where=months_present > 0)
+        baselines[known] = averaged
+        return baselines
+
+
+def extract_hours(accidents):
+    """
+    Hour of day (0-23) for each accident record in one vectorized pass
+    
+    Uses timeCommited ("HH:MM") when it starts with a valid hour, otherwise the
+    hour of dateCommited (as written, no timezone conversion).
+    
+    Args:
+        accidents: List of accident records
+        
+    Returns:
+        Float numpy array of hours, NaN where no hour could be extracted
+    """
+    if not accidents:
+        return np.array([], dtype=float)
+    
+    df = pd.DataFrame(accidents, columns=['timeCommited', 'dateCommited'])
+    raw_times = df['timeCommited'].to_numpy(dtype=object)
+    is_str = np.fromiter((isinstance(t, str) for t in raw_times), dtype=bool, count=len(raw_times))
+    times = pd.Series(np.where(is_str, raw_times, ''), dtype=object)
+    prefix = times.str[0:2]
+    usable = is_str & (times.str.len() >= 2).to_numpy() & prefix.str.isdigit().to_numpy(dtype=bool)
+    hours = pd.to_numeric(prefix.where(usable), errors='coerce')
+    hours = hours.where((hours >= 0) & (hours <= 23)).to_numpy(dtype=float, copy=True)
+    
+    # Fall back to dateCommited only for records without a usable timeCommited
+    missing = np.flatnonzero(np.isnan(hours))
+    if len(missing):
+        dates = df['dateCommited'].to_numpy(dtype=object)[missing]
+        is_datetime = np.array([isinstance(d, datetime) for d in dates], dtype=bool)
+        if is_datetime.any():
+            hours[missing[is_datetime]] = [d.hour for d in dates[is_datetime]]
+        for i in np.flatnonzero(~is_datetime):
+            if isinstance(dates[i], str):
+                try:
+                    hours[missing[i]] = datetime.fromisoformat(dates[i].replace('Z', '+00:00')).hour
+                except ValueError:
+                    pass
+    return hours
+
+
+def hourly_counts_from_records(accidents):
+    """
+    Count raw accident records per (municipality, barangay, hour)
+    
+    Args:
+        accidents: List of raw accident records
+        
+    Returns:
+        DataFrame with columns: municipality, barangay, hour, count
+    """
+    columns = ['municipality', 'barangay', 'hour', 'count']
+    if not accidents:
+        return pd.DataFrame(columns=columns)
+    
+    df = pd.DataFrame(accidents, columns=['municipality', 'barangay'])
+    df['hour'] = extract_hours(accidents)
+    df = df.dropna(subset=['municipality', 'barangay', 'hour'])
+    df['hour'] = df['hour'].astype(np.int64)
+    return df.groupby(['municipality', 'barangay', 'hour']).size().reset_index(name='count')[columns]
+
+
+class AccidentHourlyIndex:
+    """
+    24-bin hourly accident histogram per (municipality, barangay)
+    
+    Built in a single pass when the snapshot refreshes and stored as one compact
+    (locations x 24) integer matrix. Locations are matched on the municipality/
+    barangay values exactly as stored on the records.
+    """
+    
+    def __init__(self, hourly_counts=None):
+        """
+        Args:
+            hourly_counts: DataFrame with municipality, barangay, hour, count
+                           (see hourly_counts_from_records)
+        """
+        self.location_codes = {}
+        self.counts = np.zeros((0, 24), dtype=np.int32)
+        if hourly_counts is None or hourly_counts.empty:
+            return
+        
+        codes, labels = pd.factorize(pd.MultiIndex.from_arrays([
+            hourly_counts['municipality'].to_numpy(),
+            hourly_counts['barangay'].to_numpy()
+        ]))
+        self.location_codes = {label: code for code, label in enumerate(labels)}
+        self.counts = np.zeros((len(labels), 24), dtype=np.int32)
+        np.add.at(self.counts, (codes, hourly_counts['hour'].to_numpy(dtype=np.int64)),
+                  hourly_counts['count'].to_numpy(dtype=np.int32))
+    
+    @classmethod
+    def from_records(cls, accidents):
+        """Build the histogram directly from raw accident records"""
+        return cls(hourly_counts_from_records(accidents))
+    
+    def to_counts(self):
+        """Long-format histogram (municipality, barangay, hour, count), non-zero bins only"""
+        codes, hours = np.nonzero(self.counts)
+        labels = list(self.location_codes)
+        return pd.DataFrame({
+            'municipality': [labels[c][0] for c in codes],
+            'barangay': [labels[c][1] for c in codes],
+            'hour': hours.astype(np.int64),
+            'count': self.counts[codes, hours].astype(np.int64)
+        }, columns=['municipality', 'barangay', 'hour', 'count'])
+    
+    def merged(self, hourly_counts):
+        """New index with hourly_counts added to this one (self is left unchanged)"""
+        if hourly_counts is None or hourly_counts.empty:
+            return self
+        combined = pd.concat([self.to_counts(), hourly_counts], ignore_index=True)
+        return AccidentHourlyIndex(combined.groupby(['municipality', 'barangay', 'hour'])['count'].sum().reset_index())
+    
+    def get(self, municipality, barangay):
+        """24 hourly counts for a location (all zeros if it has no records)"""
+        code = self.location_codes.get((municipality, barangay))
+        if code is None:
+            return np.zeros(24, dtype=np.int32)
+        return self.counts[code]
+
+
+class AccidentDataSnapshot:
+    """Aggregated monthly counts plus the lookup indexes built from them"""
+    
+    def __init__(self, historical_data, accidents=None, fingerprint=None, hourly_index=None, record_count=None,
+                 watermark=None, synced_at=None, refresh_kind='full'):
+        """
+        Args:
+            historical_data: DataFrame from aggregate_monthly_counts
+            accidents: List of raw accident records (only SNAPSHOT_FIELDS). Only the
+                       hourly histogram built from them is kept.
+            fingerprint: Change probe result the snapshot was built against
+            hourly_index: Prebuilt AccidentHourlyIndex (instead of accidents)
+            record_count: Number of source records (default: len(accidents))
+            watermark: Raw newest _id/updatedAt covered by the aggregates (see get_watermark)
+            synced_at: Time of the last full rebuild (default: now)
+            refresh_kind: 'full' or 'incremental', for health reporting
+        """
+        accidents = accidents or []
+        self.historical_data = historical_data
+        self.record_count = len(accidents) if record_count is None else record_count
+        self.history_index = AccidentHistoryIndex(historical_data)
+        self.hourly_index = hourly_index if hourly_index is not None else AccidentHourlyIndex.from_records(accidents)
+        self.fingerprint = fingerprint
+        self.watermark = watermark
+        self.refresh_kind = refresh_kind
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+        self.synced_at = self.loaded_at if synced_at is None else synced_at
+
 
 class AccidentDataLoader:
     """Load and prepare accident data from MongoDB for training"""
     
-    def __init__(self, mongo_uri=None, db_name='lto_website', collection_name='accidents'):
+    def __init__(self, mongo_uri=None, db_name='lto_website', collection_name='accidents', cache_ttl=None,
+                 aggregation_mode=None, full_resync_interval=None):
         """
         Initialize data loader
         
@@ -26,9 +466,21 @@ class AccidentDataLoader:
             mongo_uri: MongoDB connection string. If None, tries to get from environment or uses default
             db_name: Database name (default: 'lto_website')
             collection_name: Collection name (default: 'accidents')
+            cache_ttl: Seconds to serve the cached snapshot before probing for changes.
+                       Default: ACCIDENT_CACHE_TTL_SECONDS environment variable or 300
+            aggregation_mode: 'python' (aggregate in pandas) or 'pipeline' (aggregate in MongoDB).
+                              Default: ACCIDENT_AGGREGATION_MODE environment variable or 'python'
+            full_resync_interval: Seconds after which a refresh rebuilds everything instead of
+                                  merging new records. Default: ACCIDENT_FULL_RESYNC_SECONDS or 21600
         """
         self.db_name = db_name
         self.collection_name = collection_name
+        self.cache_ttl = DEFAULT_CACHE_TTL_SECONDS if cache_ttl is None else cache_ttl
+        self.full_resync_interval = (DEFAULT_FULL_RESYNC_SECONDS if full_resync_interval is None
+                                     else full_resync_interval)
+        self.aggregation_mode = aggregation_mode or DEFAULT_AGGREGATION_MODE
+        if self.aggregation_mode not in AGGREGATION_MODES:
+            raise ValueError(f"aggregation_mode must be one of {AGGREGATION_MODES}, got '{self.aggregation_mode}'")
         
         # Get MongoDB URI from environment or use default
         if mongo_uri:
@@ -47,34 +499,49 @@ class AccidentDataLoader:
         self.client = None
         self.db = None
         self.collection = None
+        self._verified_client = None
+        
+        # Process-level snapshot cache (see get_snapshot)
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+        self._refresh_counts = {'full': 0, 'incremental': 0}
     
     def connect(self):
-        """Connect to MongoDB"""
+        """
+        Attach to the process-wide pooled MongoDB client
+        
+        The connection is verified with a ping the first time only; later calls
+        are dictionary lookups and reuse pooled connections.
+        """
         try:
-            self.client = MongoClient(self.mongo_uri)
+            self.client = get_client(self.mongo_uri)
             self.db = self.client[self.db_name]
             self.collection = self.db[self.collection_name]
             
-            # Test connection
-            self.client.admin.command('ping')
-            logger.info(f"Connected to MongoDB: {self.db_name}.{self.collection_name}")
+            if self._verified_client is not self.client:
+                # Test connection
+                self.client.admin.command('ping')
+                self._verified_client = self.client
+                logger.info(f"Connected to MongoDB: {self.db_name}.{self.collection_name}")
             return True
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {str(e)}")
             raise
     
     def disconnect(self):
-        """Disconnect from MongoDB"""
-        if self.client is not None:
-            self.client.close()
-            logger.info("Disconnected from MongoDB")
+        """Release collection handles; the pooled client stays open for reuse"""
+        self.client = None
+        self.db = None
+        self.collection = None
     
-    def load_raw_data(self, limit=None):
+    def load_raw_data(self, limit=None, projection=None, query=None):
         """
         Load raw accident data from MongoDB
         
         Args:
             limit: Optional limit on number of records to load
+            projection: Optional list of fields to return (default: full documents)
+            query: Optional filter (default: all documents)
             
         Returns:
             List of accident documents
@@ -82,8 +549,8 @@ class AccidentDataLoader:
         if self.collection is None:
             self.connect()
         
-        query = {}
-        cursor = self.collection.find(query)
+        query = query or {}
+        cursor = self.collection.find(query, projection)
         
         if limit:
             cursor = cursor.limit(limit)
@@ -92,6 +559,330 @@ class AccidentDataLoader:
         logger.info(f"Loaded {len(accidents)} accident records from MongoDB")
         return accidents
     
+    def get_watermark(self):
+        """
+        Cheap probe of the accidents collection's high-water marks
+        
+        Returns:
+            dict with document count, newest _id and newest updatedAt (raw values)
+        """
+        if self.collection is None:
+            self.connect()
+        
+        newest = self.collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        latest_update = self.collection.find_one(
+            {'updatedAt': {'$ne': None}}, {'updatedAt': 1}, sort=[('updatedAt', -1)]
+        )
+        return {
+            'count': self.collection.count_documents({}),
+            'max_id': newest['_id'] if newest else None,
+            'max_updated_at': latest_update.get('updatedAt') if latest_update else None
+        }
+    
+    @staticmethod
+    def _fingerprint(watermark):
+        """JSON-friendly form of a watermark, compared to detect changes"""
+        return {
+            'count': watermark['count'],
+            'max_id': str(watermark['max_id']) if watermark['max_id'] is not None else None,
+            'max_updated_at': str(watermark['max_updated_at']) if watermark['max_updated_at'] is not None else None
+        }
+    
+    def get_change_fingerprint(self):
+        """
+        Cheap probe used to detect changes in the accidents collection
+        
+        Returns:
+            dict with document count, newest _id and newest updatedAt
+        """
+        return self._fingerprint(self.get_watermark())
+    
+    def get_snapshot(self, force_refresh=False):
+        """
+        Get the cached aggregates, refreshing them only when needed
+        
+        Within cache_ttl seconds of the last check the snapshot is returned without
+        touching MongoDB. After that a change probe runs and, if the collection
+        changed, only records newer than the snapshot's watermark are fetched and
+        merged (see _refresh_incremental). A full reload happens when that is not
+        safe or full_resync_interval has passed. If the probe fails, the stale
+        snapshot is served so a database hiccup does not take the prediction
+        endpoints down.
+        
+        Args:
+            force_refresh: Reload from MongoDB regardless of TTL and probe
+            
+        Returns:
+            AccidentDataSnapshot
+        """
+        snapshot = self._snapshot
+        if not force_refresh and snapshot is not None and time.time() - snapshot.checked_at < self.cache_ttl:
+            return snapshot
+        
+        with self._snapshot_lock:
+            # Another thread may have refreshed while we waited for the lock
+            snapshot = self._snapshot
+            if not force_refresh and snapshot is not None and time.time() - snapshot.checked_at < self.cache_ttl:
+                return snapshot
+            
+            try:
+                self.connect()
+                watermark = self.get_watermark()
+                fingerprint = self._fingerprint(watermark)
+                if not force_refresh and snapshot is not None and fingerprint == snapshot.fingerprint:
+                    snapshot.checked_at = time.time()
+                    return snapshot
+                
+                if (not force_refresh and snapshot is not None and
+                        time.time() - snapshot.synced_at < self.full_resync_interval):
+                    refreshed = self._refresh_incremental(snapshot, watermark, fingerprint)
+                    if refreshed is not None:
+                        self._snapshot = refreshed
+                        self._refresh_counts['incremental'] += 1
+                        return refreshed
+                
+                # Bound the load by the probed _id so the next incremental refresh starts exactly there
+                query = {'_id': {'$lte': watermark['max_id']}} if watermark['max_id'] is not None else None
+                historical_data, hourly_index, record_count = self.load_aggregates(query)
+                self._snapshot = AccidentDataSnapshot(
+                    historical_data, fingerprint=fingerprint, hourly_index=hourly_index, record_count=record_count,
+                    watermark=dict(watermark, count=record_count)
+                )
+                self._refresh_counts['full'] += 1
+                logger.info(f"Accident snapshot refreshed ({self.aggregation_mode}): {record_count} records, "
+                            f"{len(historical_data)} month-barangay rows")
+                return self._snapshot
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                logger.warning(f"Snapshot refresh failed, serving cached data: {str(e)}")
+                snapshot.checked_at = time.time()
+                return snapshot
+            finally:
+                self.disconnect()
+    
+    def _refresh_incremental(self, snapshot, watermark, fingerprint):
+        """
+        Merge records added since the snapshot's watermark into its aggregates
+        
+        Only documents with an _id above the previous watermark are read, so the
+        cost follows the number of new accidents. Counts are additive, so new
+        records are aggregated on their own and summed into the cached monthly
+        counts and hourly histograms. The previous contribution of an edited or
+        deleted record is not known, so those cases return None and the caller
+        does a full rebuild:
+        - an existing record has a newer updatedAt (edits, soft deletes)
+        - the document count is not the old count plus the new records
+          (hard deletes, or inserts with an out-of-order _id)
+        
+        Returns:
+            New AccidentDataSnapshot, or None if a full rebuild is needed
+        """
+        previous = snapshot.watermark
+        if previous is None or previous['max_id'] is None or watermark['max_id'] is None:
+            return None
+        
+        changed_filter = {'_id': {'$lte': previous['max_id']}}
+        if previous['max_updated_at'] is not None:
+            changed_filter['updatedAt'] = {'$gt': previous['max_updated_at']}
+        else:
+            changed_filter['updatedAt'] = {'$ne': None}
+        if self.collection.find_one(changed_filter, {'_id': 1}) is not None:
+            logger.info("Existing accident records changed, doing a full refresh")
+            return None
+        
+        new_accidents = self.load_raw_data(
+            projection=SNAPSHOT_FIELDS,
+            query={'_id': {'$gt': previous['max_id'], '$lte': watermark['max_id']}}
+        )
+        if previous['count'] + len(new_accidents) != watermark['count']:
+            logger.info(f"Accident count mismatch ({previous['count']} + {len(new_accidents)} new != "
+                        f"{watermark['count']}), doing a full refresh")
+            return None
+        
+        historical_data = snapshot.historical_data
+        hourly_index = snapshot.hourly_index
+        if new_accidents:
+            delta = self.aggregate_monthly_counts(new_accidents)
+            if not delta.empty:
+                historical_data = pd.concat([historical_data, delta], ignore_index=True).groupby(
+                    ['year', 'month', 'municipality', 'barangay']
+                ).agg({'accident_count': 'sum'}).reset_index()
+            hourly_index = hourly_index.merged(hourly_counts_from_records(new_accidents))
+        
+        logger.info(f"Accident snapshot updated incrementally: {len(new_accidents)} new records")
+        return AccidentDataSnapshot(
+            historical_data, fingerprint=fingerprint, hourly_index=hourly_index,
+            record_count=snapshot.record_count + len(new_accidents),
+            watermark=watermark, synced_at=snapshot.synced_at, refresh_kind='incremental'
+        )
+    
+    def invalidate_cache(self):
+        """Drop the cached snapshot so the next request reloads from MongoDB"""
+        with self._snapshot_lock:
+            self._snapshot = None
+        logger.info("Accident snapshot cache invalidated")
+    
+    def get_cache_info(self):
+        """Describe the cached snapshot for health reporting"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {'cached': False, 'ttl_seconds': self.cache_ttl}
+        now = time.time()
+        return {
+            'cached': True,
+            'ttl_seconds': self.cache_ttl,
+            'full_resync_seconds': self.full_resync_interval,
+            'last_refresh': snapshot.refresh_kind,
+            'refreshes': dict(self._refresh_counts),
+            'seconds_since_full_sync': round(now - snapshot.synced_at, 1),
+            'records': snapshot.record_count,
+            'hourly_locations': len(snapshot.hourly_index.location_codes),
+            'aggregated_rows': len(snapshot.historical_data),
+            'age_seconds': round(now - snapshot.loaded_at, 1),
+            'seconds_since_check': round(now - snapshot.checked_at, 1),
+            'fingerprint': snapshot.fingerprint
+        }
+    
+    def load_aggregates(self, query=None):
+        """
+        Load monthly counts and hourly histograms using the configured aggregation mode
+        
+        Args:
+            query: Optional filter on the accident documents (default: all)
+            
+        Returns:
+            (monthly counts DataFrame, AccidentHourlyIndex, number of source records)
+        """
+        if self.aggregation_mode == 'pipeline':
+            try:
+                return self._run_aggregation_pipeline(include_hours=True, query=query)
+            except OperationFailure as e:
+                logger.warning(f"Aggregation pipeline failed, falling back to Python aggregation: {str(e)}")
+        
+        accidents = self.load_raw_data(projection=SNAPSHOT_FIELDS, query=query)
+        return (
+            self.aggregate_monthly_counts(accidents),
+            AccidentHourlyIndex.from_records(accidents),
+            len(accidents)
+        )
+    
+    def load_monthly_counts(self):
+        """Monthly counts per barangay using the configured aggregation mode"""
+        return self.load_aggregates()[0]
+    
+    def aggregate_monthly_counts_pipeline(self):
+        """
+        Aggregate monthly accident counts per barangay inside MongoDB
+        
+        Returns the same DataFrame as aggregate_monthly_counts, but only the grouped
+        rows cross the wire instead of every accident document.
+        
+        Returns:
+            DataFrame with columns: year, month, municipality, barangay, accident_count
+        """
+        return self._run_aggregation_pipeline(include_hours=False)[0]
+    
+    def _run_aggregation_pipeline(self, include_hours=False, query=None):
+        """
+        Group accidents by (year, month, municipality, barangay[, hour]) on the server
+        
+        Documents with a BSON date in dateCommited (the schema type) are grouped by
+        the pipeline. The few without one (legacy string dates, missing dates) are
+        fetched with a projection and handled by the Python path so results stay
+        identical. Names are grouped as stored and stripped afterwards, since the
+        grouped rows are small.
+        
+        Args:
+            include_hours: Also group by hour of day for the hourly histograms
+            query: Optional filter on the accident documents (default: all)
+            
+        Returns:
+            (monthly counts DataFrame, AccidentHourlyIndex or None, number of source records)
+        """
+        if self.collection is None:
+            self.connect()
+        
+        group_id = {
+            'year': '$year',
+            'month': '$month',
+            'municipality': '$municipality',
+            'barangay': '$barangay'
+        }
+        project = {
+            '_id': 0,
+            'year': {'$year': '$dateCommited'},
+            'month': {'$month': '$dateCommited'},
+            'municipality': 1,
+            'barangay': 1
+        }
+        if include_hours:
+            # timeCommited is "HH:MM"; its first two characters are the preferred hour
+            project['time_prefix'] = {'$substr': [{'$ifNull': ['$timeCommited', '']}, 0, 2]}
+            project['date_hour'] = {'$hour': '$dateCommited'}
+            group_id['time_prefix'] = '$time_prefix'
+            group_id['date_hour'] = '$date_hour'
+        
+        pipeline = [
+            {'$match': dict(query or {}, dateCommited={'$type': 'date'})},
+            {'$project': project},
+            {'$group': {'_id': group_id, 'accident_count': {'$sum': 1}}}
+        ]
+        rows = [dict(row['_id'], accident_count=row['accident_count'])
+                for row in self.collection.aggregate(pipeline, allowDiskUse=True)]
+        grouped = pd.DataFrame(rows, columns=list(group_id) + ['accident_count'])
+        
+        # Documents without a BSON date go through the Python path
+        others = list(self.collection.find(dict(query or {}, dateCommited={'$not': {'$type': 'date'}}),
+                                           SNAPSHOT_FIELDS))
+        record_count = int(grouped['accident_count'].sum()) + len(others)
+        logger.info(f"Aggregation pipeline returned {len(grouped)} grouped rows "
+                    f"({record_count} records, {len(others)} without a date)")
+        
+        # Monthly counts: same filters and name cleanup as aggregate_monthly_counts
+        valid = (
+            grouped['municipality'].map(lambda v: isinstance(v, str) and v != 'Unknown') &
+            grouped['barangay'].map(lambda v: isinstance(v, str) and v != 'Unknown')
+        ).astype(bool)
+        monthly = grouped.loc[valid, ['year', 'month', 'municipality', 'barangay', 'accident_count']].copy()
+        monthly['municipality'] = monthly['municipality'].str.strip()
+        monthly['barangay'] = monthly['barangay'].str.strip()
+        if others:
+            other_monthly = self.aggregate_monthly_counts(others)
+            if not other_monthly.empty:
+                monthly = pd.concat([monthly, other_monthly], ignore_index=True)
+        
+        if monthly.empty:
+            logger.warning("No valid accident records found for aggregation")
+            df_aggregated = pd.DataFrame()
+        else:
+            monthly = monthly.astype({'year': np.int64, 'month': np.int64, 'accident_count': np.int64})
+            df_aggregated = monthly.groupby(['year', 'month', 'municipality', 'barangay']).agg({
+                'accident_count': 'sum'
+            }).reset_index()
+        
+        hourly_index = None
+        if include_hours:
+            # Prefer the hour from timeCommited, else the hour of dateCommited
+            prefix = grouped['time_prefix'].astype(object)
+            usable = prefix.map(lambda v: isinstance(v, str) and len(v) == 2 and v.isdigit()).astype(bool)
+            time_hour = pd.to_numeric(prefix.where(usable), errors='coerce')
+            time_hour = time_hour.where((time_hour >= 0) & (time_hour <= 23))
+            hourly = pd.DataFrame({
+                'municipality': grouped['municipality'],
+                'barangay': grouped['barangay'],
+                'hour': time_hour.fillna(grouped['date_hour']),
+                'count': grouped['accident_count']
+            }).dropna(subset=['municipality', 'barangay', 'hour'])
+            hourly['hour'] = hourly['hour'].astype(np.int64)
+            if others:
+                hourly = pd.concat([hourly, hourly_counts_from_records(others)], ignore_index=True)
+            hourly_index = AccidentHourlyIndex(
+                hourly.groupby(['municipality', 'barangay', 'hour'])['count'].sum().reset_index()
+            )
+        
+        return df_aggregated, hourly_index, record_count
+    
     def aggregate_monthly_counts(self, accidents=None):
         """
         Aggregate monthly accident counts per barangay
@@ -179,8 +970,7 @@ class AccidentDataLoader:
             DataFrame with features ready for training
         """
         if df_aggregated is None:
-            accidents = self.load_raw_data()
-            df_aggregated = self.aggregate_monthly_counts(accidents)
+            df_aggregated = self.load_monthly_counts()
         
         if df_aggregated.empty:
             logger.error("No data available for training")
@@ -213,43 +1003,8 @@ class AccidentDataLoader:
         df.attrs['municipality_encoder'] = municipality_encoder
         df.attrs['barangay_encoder'] = barangay_encoder
         
-        # Sort for rolling features
-        df = df.sort_values(['barangay', 'year', 'month'])
-        
-        # Barangay-level lag/rolling features
-        df['accident_count_lag1'] = df.groupby('barangay')['accident_count'].shift(1).fillna(0)
-        df['accident_count_lag3'] = df.groupby('barangay')['accident_count'].shift(3).fillna(0)
-        df['accident_count_lag6'] = df.groupby('barangay')['accident_count'].shift(6).fillna(0)
-        df['accident_count_lag12'] = df.groupby('barangay')['accident_count'].shift(12).fillna(0)
-        
-        df['accident_count_rolling_mean_3'] = df.groupby('barangay')['accident_count'].transform(
-            lambda x: x.rolling(window=3, min_periods=1).mean()
-        )
-        df['accident_count_rolling_std_3'] = df.groupby('barangay')['accident_count'].transform(
-            lambda x: x.rolling(window=3, min_periods=1).std().fillna(0)
-        )
-        df['accident_count_rolling_mean_6'] = df.groupby('barangay')['accident_count'].transform(
-            lambda x: x.rolling(window=6, min_periods=1).mean()
-        )
-        df['accident_count_rolling_std_6'] = df.groupby('barangay')['accident_count'].transform(
-            lambda x: x.rolling(window=6, min_periods=1).std().fillna(0)
-        )
-        df['accident_count_rolling_mean_12'] = df.groupby('barangay')['accident_count'].transform(
-            lambda x: x.rolling(window=12, min_periods=1).mean()
-        )
-        df['accident_count_rolling_std_12'] = df.groupby('barangay')['accident_count'].transform(
-            lambda x: x.rolling(window=12, min_periods=1).std().fillna(0)
-        )
-        
-        # Municipality-level aggregates to capture broader trends
-        df = df.sort_values(['municipality', 'year', 'month'])
-        df['muni_count_lag1'] = df.groupby('municipality')['accident_count'].shift(1).fillna(0)
-        df['muni_count_rolling_mean_3'] = df.groupby('municipality')['accident_count'].transform(
-            lambda x: x.rolling(window=3, min_periods=1).mean()
-        )
-        df['muni_count_rolling_std_3'] = df.groupby('municipality')['accident_count'].transform(
-            lambda x: x.rolling(window=3, min_periods=1).std().fillna(0)
-        )
+        # Barangay- and municipality-level lag/rolling features (vectorized, one pass)
+        df = build_history_features(df)
         
         logger.info(f"Prepared training data: {len(df)} samples")
         logger.info(f"Features: {list(df.columns)}")
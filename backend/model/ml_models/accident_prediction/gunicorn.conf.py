@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for the accident prediction API
+
+    gunicorn -c gunicorn.conf.py
+
+The app module (and with it the models, see initialize_model) is imported once in
+the master and the workers are forked from it, so they share the model pages
+copy-on-write instead of each loading a private copy.
+"""
+
+import gc
+import os
+
+wsgi_app = 'app:app'
+bind = f"0.0.0.0:{os.getenv('PORT', '5004')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# Read by the app (loaded after this file): per-process operations such as model
+# rollback are refused when several workers serve
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Move everything the master loaded out of the collector's reach, so garbage
+    # collections in the workers do not write to (and un-share) those pages
+    gc.freeze()
@@ -0,0 +1,738 @@
+"""
+Candidate-level hyperparameter search
+Drop-in replacements for RandomizedSearchCV (same candidates, folds, scoring and
+best_* attributes) that evaluate (candidate, fold) fits one task at a time so the
+trainer can report progress/ETA, stop worker processes as soon as a cancel is
+requested, keep the partial cv_results_ on disk and stop at a wall-clock budget.
+
+- CandidateSearch: randomized search, every candidate on every fold
+- HalvingCandidateSearch: successive halving, weak candidates are dropped after
+  being scored with a fraction of the training rows (or trees)
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+from joblib import cpu_count
+from joblib.externals.loky import get_reusable_executor
+
+# sklearn is imported where a search runs: the prediction API imports this module
+# (for SEARCH_MODES) and would otherwise load sklearn and scipy at startup
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ('random', 'halving')
+
+
+class SearchCancelled(Exception):
+    """Raised by CandidateSearch.fit() when should_cancel() returns True"""
+
+    def __init__(self, search):
+        super().__init__(f"{search.name} search cancelled after {search.completed_tasks_}/{search.total_tasks_} fits")
+        self.search = search
+
+
+def _index(data, indices):
+    """Row subset of a DataFrame/Series or array"""
+    return data.iloc[indices] if hasattr(data, 'iloc') else data[indices]
+
+
+def _fit_and_score(estimator, params, X, y, train, test, scorer):
+    """Fit one candidate on one fold (runs in a worker process)"""
+    from sklearn.base import clone
+    start = time.perf_counter()
+    try:
+        model = clone(estimator).set_params(**params)
+        model.fit(_index(X, train), _index(y, train))
+        fit_time = time.perf_counter() - start
+        score = scorer(model, _index(X, test), _index(y, test))
+        return float(score), fit_time, None
+    except Exception as e:
+        # Same as sklearn's error_score=np.nan: a failing candidate is ranked last
+        return np.nan, time.perf_counter() - start, str(e)
+
+
+def _to_native(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def _native_params(params):
+    return {key: _to_native(value) for key, value in params.items()} if params else None
+
+
+def resolve_n_jobs(n_jobs):
+    """Worker count for an sklearn-style n_jobs value"""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(cpu_count() + 1 + n_jobs, 1)
+    return max(int(n_jobs), 1)
+
+
+def run_searches(jobs, n_jobs=-1, poll_interval=1.0):
+    """
+    Evaluate the tasks of one or more started searches on one worker pool
+
+    Args:
+        jobs: List of (search, X, y)
+        n_jobs: Worker processes (-1: all cores)
+        poll_interval: Seconds between cancellation/budget checks
+
+    Raises:
+        SearchCancelled: A search's should_cancel() returned True (all searches stop)
+    """
+    # Processes even with one worker, so a cancel can kill a fit in progress
+    executor = get_reusable_executor(max_workers=resolve_n_jobs(n_jobs))
+    pending = {}
+
+    def submit_ready():
+        for search, X, y in jobs:
+            if search.status_ != 'running':
+                continue
+            for key, params, train, test in search._next_tasks():
+                future = executor.submit(_fit_and_score, search._fold_estimator, params,
+                                         X, y, train, test, search._scorer)
+                pending[future] = (search, key)
+
+    def kill_workers():
+        for future in pending:
+            future.cancel()
+        pending.clear()
+        # Kill the workers instead of waiting for the forests they are building
+        executor.shutdown(wait=False, kill_workers=True)
+
+    submit_ready()
+    while pending:
+        done, _ = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+        for future in done:
+            search, key = pending.pop(future)
+            if search.status_ == 'running':
+                search._record(key, future.result())
+
+        cancelled = next((search for search, _, _ in jobs
+                          if search.status_ == 'running' and search._cancel_requested()), None)
+        if cancelled is not None:
+            kill_workers()
+            for search, _, _ in jobs:
+                if search.status_ == 'running':
+                    search._stop('cancelled')
+            raise SearchCancelled(cancelled)
+
+        for search, _, _ in jobs:
+            if search.status_ != 'running' or not search._budget_exhausted():
+                continue
+            search._stop('budget_exhausted')
+            if not any(other.status_ == 'running' for other, _, _ in jobs):
+                kill_workers()
+            else:
+                # Shared pool: drop this search's queued fits, let its running ones finish
+                for future, (owner, _) in list(pending.items()):
+                    if owner is search:
+                        future.cancel()
+                        del pending[future]
+        submit_ready()
+
+    for search, _, _ in jobs:
+        if search.status_ == 'running':
+            search._stop('completed')
+
+
+def fit_searches(jobs, n_jobs=-1, poll_interval=1.0):
+    """
+    Fit several searches at once on one worker pool, then refit each best candidate
+
+    The pool stays busy while one search is in its tail (e.g. the last slow
+    candidates of the regressor) because the other search's fits fill the gaps.
+
+    Args:
+        jobs: List of (search, X, y)
+        n_jobs: Worker processes shared by all searches (-1: all cores)
+        poll_interval: Seconds between cancellation/budget checks
+
+    Raises:
+        SearchCancelled: A search's should_cancel() returned True (all searches stop)
+    """
+    for search, X, y in jobs:
+        search._begin(X, y)
+    run_searches(jobs, n_jobs=n_jobs, poll_interval=poll_interval)
+    for search, X, y in jobs:
+        search._refit(X, y)
+    return [search for search, _, _ in jobs]
+
+
+class CandidateSearch:
+    """
+    Randomized search over (candidate, fold) tasks with progress, cancellation,
+    a time budget and incremental persistence of results
+    """
+
+    mode = 'random'
+
+    def __init__(self, estimator, param_distributions, n_iter=10, cv=None, scoring=None,
+                 random_state=None, n_jobs=-1, name='search', progress_callback=None,
+                 should_cancel=None, results_path=None, poll_interval=1.0, time_budget=None):
+        """
+        Initialize search
+
+        Args:
+            estimator: Unfitted sklearn estimator (its n_jobs is used for the final refit only;
+                       cross-validation fits run single-threaded, one per worker)
+            param_distributions: Same as RandomizedSearchCV
+            n_iter: Number of sampled candidates
+            cv: CV splitter (e.g. KFold), or a list of precomputed (train, test) index pairs
+                so several searches can share one set of folds
+            scoring: Scoring name or callable
+            random_state: Seed for candidate sampling
+            n_jobs: Worker processes for the (candidate, fold) fits (-1: all cores)
+            name: Label used in logs, progress and the results file
+            progress_callback: Called as progress_callback(search) after every finished fit
+            should_cancel: Callable polled about every poll_interval seconds; True aborts the search
+            results_path: JSON file updated with the candidates evaluated so far
+            poll_interval: Seconds between cancellation checks while fits are running
+            time_budget: Wall-clock seconds for the search; once spent, running fits are stopped
+                         and the best candidate evaluated so far is used
+        """
+        self.estimator = estimator
+        self.param_distributions = param_distributions
+        self.n_iter = n_iter
+        self.cv = cv
+        self.scoring = scoring
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.name = name
+        self.progress_callback = progress_callback
+        self.should_cancel = should_cancel
+        self.results_path = results_path
+        self.poll_interval = poll_interval
+        self.time_budget = time_budget
+
+    # Progress ---------------------------------------------------------------
+
+    @property
+    def fraction_complete(self):
+        return self.completed_tasks_ / self.total_tasks_ if self.total_tasks_ else 0.0
+
+    @property
+    def eta_seconds(self):
+        """Remaining time extrapolated from the work finished so far"""
+        fraction = self.fraction_complete
+        if not fraction:
+            return None
+        return self.elapsed_seconds_ / fraction * (1 - fraction)
+
+    @property
+    def completed_candidates(self):
+        return int(self._candidate_done().sum())
+
+    def progress_text(self):
+        return (f"{self.completed_candidates}/{len(self.candidates_)} candidates "
+                f"({self.completed_tasks_}/{self.total_tasks_} fits)")
+
+    # Search -----------------------------------------------------------------
+
+    def fit(self, X, y):
+        """
+        Evaluate the candidates, then refit the best one on all of X, y
+
+        Raises:
+            SearchCancelled: should_cancel() returned True (partial results are saved)
+        """
+        fit_searches([(self, X, y)], n_jobs=self.n_jobs, poll_interval=self.poll_interval)
+        return self
+
+    def _begin(self, X, y):
+        """Sample candidates, generate folds and plan the tasks"""
+        from sklearn.base import clone
+        from sklearn.metrics import check_scoring
+        from sklearn.model_selection import ParameterSampler
+        self.candidates_ = list(ParameterSampler(self.param_distributions, self.n_iter,
+                                                 random_state=self.random_state))
+        self.splits_ = list(self.cv) if isinstance(self.cv, (list, tuple)) else list(self.cv.split(X, y))
+        self._scorer = check_scoring(self.estimator, scoring=self.scoring)
+        # Each forest is built single-threaded; the pool provides the parallelism
+        self._fold_estimator = clone(self.estimator)
+        if 'n_jobs' in self._fold_estimator.get_params():
+            self._fold_estimator.set_params(n_jobs=1)
+
+        self.completed_tasks_ = 0
+        self.elapsed_seconds_ = 0.0
+        self.status_ = 'running'
+        self.trajectory_ = []
+        self._start_time = time.perf_counter()
+        self._last_saved = 0.0
+        self._plan()
+
+    def _plan(self):
+        n_candidates, n_splits = len(self.candidates_), len(self.splits_)
+        self._scores = np.full((n_candidates, n_splits), np.nan)
+        self._fit_times = np.full((n_candidates, n_splits), np.nan)
+        self.total_tasks_ = n_candidates * n_splits
+        self._submitted = False
+        logger.info(f"  {self.name}: fitting {n_splits} folds for each of {n_candidates} candidates, "
+                    f"totalling {self.total_tasks_} fits")
+
+    def _next_tasks(self):
+        """(key, params, train, test) tasks that can be submitted now"""
+        if self._submitted:
+            return []
+        self._submitted = True
+        return [((candidate, fold), params, train, test)
+                for candidate, params in enumerate(self.candidates_)
+                for fold, (train, test) in enumerate(self.splits_)]
+
+    def _cancel_requested(self):
+        return bool(self.should_cancel and self.should_cancel())
+
+    def _budget_exhausted(self):
+        """Time budget spent and at least one candidate fully evaluated"""
+        if not self.time_budget:
+            return False
+        return (time.perf_counter() - self._start_time > self.time_budget and
+                self.completed_candidates > 0)
+
+    def _stop(self, status):
+        self.status_ = status
+        self.elapsed_seconds_ = time.perf_counter() - self._start_time
+        self._finalize()
+        self._record_trajectory(force=True)
+        self._save(force=True)
+        if status == 'cancelled':
+            logger.info(f"  {self.name}: cancelled after {self.completed_tasks_}/{self.total_tasks_} fits")
+        elif status == 'budget_exhausted':
+            logger.info(f"  {self.name}: time budget of {self.time_budget:.0f}s spent after "
+                        f"{self.completed_tasks_}/{self.total_tasks_} fits; using the best candidate so far")
+
+    def _record(self, key, result):
+        candidate, fold = key
+        score, fit_time, error = result
+        if error:
+            logger.warning(f"  {self.name}: candidate {candidate} fold {fold} failed: {error}")
+        self._scores[candidate, fold] = score
+        self._fit_times[candidate, fold] = fit_time
+        self._task_done()
+        if not np.isnan(self._fit_times[candidate]).any():
+            self._record_trajectory()
+
+    def _task_done(self):
+        self.completed_tasks_ += 1
+        self.elapsed_seconds_ = time.perf_counter() - self._start_time
+        if self.progress_callback:
+            self.progress_callback(self)
+        self._save()
+
+    def _refit(self, X, y):
+        from sklearn.base import clone
+        if self.best_params_ is None:
+            raise ValueError(f"{self.name} search: every candidate failed")
+        logger.info(f"  {self.name}: best score {self.best_score_:.4f} after {self.elapsed_seconds_:.0f}s")
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+        self.best_estimator_.fit(X, y)
+        return self
+
+    # Results ----------------------------------------------------------------
+
+    def _candidate_done(self):
+        return ~np.isnan(self._fit_times).any(axis=1)
+
+    def _best_so_far(self):
+        done = self._candidate_done()
+        if not done.any():
+            return None
+        means = self._scores[done].mean(axis=1)
+        return None if np.isnan(means).all() else float(np.nanmax(means))
+
+    def _record_trajectory(self, force=False):
+        """Append (elapsed time, best CV score) whenever the best score improves"""
+        best = self._best_so_far()
+        if best is None:
+            return
+        last = self.trajectory_[-1] if self.trajectory_ else None
+        if last is not None:
+            if last['completed_fits'] == self.completed_tasks_:
+                return
+            if not force and best <= last['best_score']:
+                return
+        self.trajectory_.append({
+            'elapsed_seconds': round(time.perf_counter() - self._start_time, 2),
+            'completed_fits': self.completed_tasks_,
+            'best_score': best
+        })
+
+    @staticmethod
+    def _rank(scores):
+        """Rank like sklearn: ties share the lowest rank, unfinished/failed candidates last"""
+        order_scores = np.where(np.isnan(scores), -np.inf, scores)
+        return np.array([1 + int(np.sum(order_scores > s)) for s in order_scores], dtype=np.int32)
+
+    def _finalize(self):
+        """Build cv_results_ and best_* from the candidates whose folds all finished"""
+        done = self._candidate_done()
+        mean_scores = np.full(len(self.candidates_), np.nan)
+        std_scores = np.full(len(self.candidates_), np.nan)
+        mean_fit_time = np.full(len(self.candidates_), np.nan)
+        mean_scores[done] = self._scores[done].mean(axis=1)
+        std_scores[done] = self._scores[done].std(axis=1)
+        mean_fit_time[done] = self._fit_times[done].mean(axis=1)
+
+        results = {
+            'params': self.candidates_,
+            'mean_test_score': mean_scores,
+            'std_test_score': std_scores,
+            'rank_test_score': self._rank(mean_scores),
+            'mean_fit_time': mean_fit_time
+        }
+        for fold in range(len(self.splits_)):
+            results[f'split{fold}_test_score'] = self._scores[:, fold]
+        for key in sorted({key for params in self.candidates_ for key in params}):
+            results[f'param_{key}'] = [params.get(key) for params in self.candidates_]
+        self.cv_results_ = results
+
+        if np.isnan(mean_scores).all():
+            self.best_index_, self.best_params_, self.best_score_ = None, None, None
+        else:
+            self.best_index_ = int(np.nanargmax(mean_scores))
+            self.best_params_ = self.candidates_[self.best_index_]
+            self.best_score_ = float(mean_scores[self.best_index_])
+
+    def _result_rows(self):
+        """Fully evaluated candidates for the results file"""
+        rows = []
+        for index, params in enumerate(self.candidates_):
+            if np.isnan(self._fit_times[index]).any():
+                continue
+            rows.append({
+                'params': _native_params(params),
+                'mean_test_score': _to_native(self.cv_results_['mean_test_score'][index]),
+                'std_test_score': _to_native(self.cv_results_['std_test_score'][index]),
+                'split_test_scores': [_to_native(score) for score in self._scores[index]],
+                'mean_fit_time': _to_native(self.cv_results_['mean_fit_time'][index])
+            })
+        return rows
+
+    def _fit_seconds(self):
+        """Time spent in finished fits, summed over workers"""
+        return float(np.nansum(self._fit_times))
+
+    def summary(self):
+        """Outcome and score-versus-time trajectory of the search (stored in the model metadata)"""
+        return {
+            'mode': self.mode,
+            'status': self.status_,
+            'n_candidates': len(self.candidates_),
+            'n_splits': len(self.splits_),
+            'completed_fits': self.completed_tasks_,
+            'total_fits': self.total_tasks_,
+            'completed_candidates': self.completed_candidates,
+            'elapsed_seconds': round(self.elapsed_seconds_, 2),
+            'fit_seconds': round(self._fit_seconds(), 2),
+            'time_budget_seconds': self.time_budget,
+            'best_score': self.best_score_,
+            'best_params': _native_params(self.best_params_),
+            'trajectory': self.trajectory_
+        }
+
+    def _save(self, force=False):
+        """Write the evaluated candidates to results_path (at most every 2 seconds unless forced)"""
+        if not self.results_path:
+            return
+        now = time.perf_counter()
+        if not force and now - self._last_saved < 2.0:
+            return
+        self._last_saved = now
+        if not force:
+            self._finalize()
+
+        payload = dict(
+            self.summary(),
+            name=self.name,
+            scoring=self.scoring if isinstance(self.scoring, str) else str(self.scoring),
+            updated_at=time.strftime('%Y-%m-%dT%H:%M:%S'),
+            candidates=self._result_rows()
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+        tmp_path = f"{self.results_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, indent=2)
+        os.replace(tmp_path, self.results_path)
+
+
+class HalvingCandidateSearch(CandidateSearch):
+    """
+    Successive halving over the same sampled candidates as CandidateSearch
+
+    Round i scores the surviving candidates on every fold with r_i resources
+    (training rows per fold, or trees per forest) and keeps the best 1/factor
+    of them. The last round uses the full resource, so its scores compare
+    directly with a full randomized search.
+    """
+
+    mode = 'halving'
+
+    def __init__(self, *args, factor=3, resource='n_samples', min_resources=None,
+                 max_resources=None, **kwargs):
+        """
+        Initialize halving search (other arguments as CandidateSearch)
+
+        Args:
+            factor: Each round keeps the best 1/factor of the candidates
+            resource: 'n_samples' (training rows per fold) or 'n_estimators' (trees per forest)
+            min_resources: Resource of the first round. Default: max_resources / factor^(rounds-1),
+                           at least 50 rows or 10 trees
+            max_resources: Resource of the last round. Default: the smallest training fold,
+                           or the largest sampled n_estimators
+        """
+        super().__init__(*args, **kwargs)
+        if resource not in ('n_samples', 'n_estimators'):
+            raise ValueError(f"Unsupported halving resource: {resource}")
+        self.factor = factor
+        self.resource = resource
+        self.min_resources = min_resources
+        self.max_resources = max_resources
+
+    @property
+    def fraction_complete(self):
+        # Fits get more expensive every round, so weight them by their resource
+        return self._done_work / self._total_work if self._total_work else 0.0
+
+    @property
+    def completed_candidates(self):
+        return len(self._rounds[-1]['done']) if self._rounds else 0
+
+    def progress_text(self):
+        current = self._rounds[-1]
+        return (f"round {len(self._rounds)}/{len(self.resources_)}: "
+                f"{len(current['done'])}/{len(current['candidates'])} candidates with "
+                f"{current['n_resources']:,} {self.resource[2:]} "
+                f"({self.completed_tasks_}/{self.total_tasks_} fits)")
+
+    def _plan(self):
+        n_candidates, n_splits = len(self.candidates_), len(self.splits_)
+        n_rounds = 1 + math.ceil(math.log(n_candidates) / math.log(self.factor)) if n_candidates > 1 else 1
+
+        if self.resource == 'n_samples':
+            max_resources = self.max_resources or min(len(train) for train, _ in self.splits_)
+            floor = 50
+        else:
+            max_resources = self.max_resources or int(max(params.get('n_estimators', 100)
+                                                          for params in self.candidates_))
+            floor = 10
+        min_resources = self.min_resources or max(int(max_resources / self.factor ** (n_rounds - 1)), floor)
+        min_resources = min(min_resources, max_resources)
+        self.resources_ = [int(max(min_resources, max_resources / self.factor ** (n_rounds - 1 - i)))
+                           for i in range(n_rounds)]
+        self.max_resources_ = max_resources
+        self.candidates_per_round_ = [max(1, math.ceil(n_candidates / self.factor ** i)) for i in range(n_rounds)]
+
+        self.total_tasks_ = sum(self.candidates_per_round_) * n_splits
+        self._total_work = sum(n * r for n, r in zip(self.candidates_per_round_, self.resources_)) * n_splits
+        self._done_work = 0
+        self._rounds = []
+        # Nested row subsets per fold: each round sees every row of the previous one
+        rng = np.random.RandomState(self.random_state)
+        self._fold_order = [rng.permutation(train) for train, _ in self.splits_]
+        logger.info(f"  {self.name}: successive halving of {n_candidates} candidates x {n_splits} folds, "
+                    f"{self.resource} per round {self.resources_}, candidates per round "
+                    f"{self.candidates_per_round_} (at most {self.total_tasks_} fits)")
+
+    def _round_params(self, candidate, n_resources):
+        params = self.candidates_[candidate]
+        if self.resource == 'n_estimators':
+            params = dict(params, n_estimators=n_resources)
+        return params
+
+    def _next_tasks(self):
+        if self._rounds:
+            current = self._rounds[-1]
+            if len(current['done']) < len(current['candidates']) or len(self._rounds) == len(self.resources_):
+                return []
+            # Round finished: keep the best 1/factor (failed candidates last)
+            means = np.array([current['scores'][c].mean() for c in current['candidates']])
+            order = np.argsort(-np.where(np.isnan(means), -np.inf, means), kind='stable')
+            survivors = [current['candidates'][i] for i in order[:self.candidates_per_round_[len(self._rounds)]]]
+        else:
+            survivors = list(range(len(self.candidates_)))
+
+        round_index = len(self._rounds)
+        n_resources = self.resources_[round_index]
+        self._rounds.append({
+            'candidates': survivors,
+            'n_resources': n_resources,
+            'scores': {c: np.full(len(self.splits_), np.nan) for c in survivors},
+            'fit_times': {c: np.full(len(self.splits_), np.nan) for c in survivors},
+            'done': set()
+        })
+        tasks = []
+        for candidate in survivors:
+            params = self._round_params(candidate, n_resources)
+            for fold, (train, test) in enumerate(self.splits_):
+                # Only the training rows shrink; every round is scored on the full test fold
+                if self.resource == 'n_samples' and n_resources < len(train):
+                    train = np.sort(self._fold_order[fold][:n_resources])
+                tasks.append(((round_index, candidate, fold), params, train, test))
+        return tasks
+
+    def _record(self, key, result):
+        round_index, candidate, fold = key
+        score, fit_time, error = result
+        if error:
+            logger.warning(f"  {self.name}: candidate {candidate} fold {fold} failed: {error}")
+        current = self._rounds[round_index]
+        current['scores'][candidate][fold] = score
+        current['fit_times'][candidate][fold] = fit_time
+        self._done_work += current['n_resources']
+        if not np.isnan(current['fit_times'][candidate]).any():
+            current['done'].add(candidate)
+        self._task_done()
+        if len(current['done']) == len(current['candidates']):
+            self._record_trajectory()
+
+    def _best_round(self):
+        """Latest round with at least one fully evaluated candidate"""
+        for round_index in range(len(self._rounds) - 1, -1, -1):
+            if self._rounds[round_index]['done']:
+                return round_index
+        return None
+
+    def _budget_exhausted(self):
+        if not self.time_budget:
+            return False
+        return time.perf_counter() - self._start_time > self.time_budget and self._best_round() is not None
+
+    def _candidate_done(self):
+        done = np.zeros(len(self.candidates_), dtype=bool)
+        for current in self._rounds:
+            done[list(current['done'])] = True
+        return done
+
+    def _best_so_far(self):
+        round_index = self._best_round()
+        if round_index is None:
+            return None
+        current = self._rounds[round_index]
+        means = [current['scores'][c].mean() for c in current['done']]
+        return None if np.isnan(means).all() else float(np.nanmax(means))
+
+    def _record_trajectory(self, force=False):
+        """One point per round: its resource, candidates, elapsed time and best score"""
+        round_index = self._best_round()
+        if round_index is None:
+            return
+        current = self._rounds[round_index]
+        point = {
+            'iter': round_index,
+            'n_resources': current['n_resources'],
+            'n_candidates': len(current['done']),
+            'elapsed_seconds': round(time.perf_counter() - self._start_time, 2),
+            'completed_fits': self.completed_tasks_,
+            'best_score': self._best_so_far()
+        }
+        if self.trajectory_ and self.trajectory_[-1]['iter'] == round_index:
+            if self.trajectory_[-1]['completed_fits'] != self.completed_tasks_:
+                self.trajectory_[-1] = point
+        else:
+            self.trajectory_.append(point)
+
+    def _finalize(self):
+        """cv_results_ has one row per (round, candidate), like sklearn's HalvingRandomSearchCV"""
+        rows = [(i, c) for i, current in enumerate(self._rounds) for c in current['candidates']]
+        self._rows = rows
+        n_splits = len(self.splits_)
+        scores = np.array([self._rounds[i]['scores'][c] for i, c in rows]).reshape(len(rows), n_splits)
+        fit_times = np.array([self._rounds[i]['fit_times'][c] for i, c in rows]).reshape(len(rows), n_splits)
+        done = ~np.isnan(fit_times).any(axis=1)
+        mean_scores = np.full(len(rows), np.nan)
+        std_scores = np.full(len(rows), np.nan)
+        mean_fit_time = np.full(len(rows), np.nan)
+        mean_scores[done] = scores[done].mean(axis=1)
+        std_scores[done] = scores[done].std(axis=1)
+        mean_fit_time[done] = fit_times[done].mean(axis=1)
+        iters = np.array([i for i, _ in rows], dtype=np.int32)
+
+        # Later rounds rank first, then by score
+        order_scores = np.where(np.isnan(mean_scores), -np.inf, mean_scores)
+        order = sorted(range(len(rows)), key=lambda r: (-iters[r], -order_scores[r]))
+        ranks = np.empty(len(rows), dtype=np.int32)
+        ranks[order] = np.arange(1, len(rows) + 1)
+
+        params = [self._round_params(c, self._rounds[i]['n_resources']) for i, c in rows]
+        results = {
+            'params': params,
+            'iter': iters,
+            'n_resources': np.array([self._rounds[i]['n_resources'] for i, _ in rows], dtype=np.int64),
+            'mean_test_score': mean_scores,
+            'std_test_score': std_scores,
+            'rank_test_score': ranks,
+            'mean_fit_time': mean_fit_time
+        }
+        for fold in range(n_splits):
+            results[f'split{fold}_test_score'] = scores[:, fold]
+        for key in sorted({key for p in params for key in p}):
+            results[f'param_{key}'] = [p.get(key) for p in params]
+        self.cv_results_ = results
+
+        self.best_index_, self.best_params_, self.best_score_ = None, None, None
+        self.best_n_resources_ = None
+        round_index = self._best_round()
+        if round_index is None:
+            return
+        current = self._rounds[round_index]
+        candidates = sorted(current['done'])
+        means = np.array([current['scores'][c].mean() for c in candidates])
+        if np.isnan(means).all():
+            return
+        best = candidates[int(np.nanargmax(means))]
+        self.best_index_ = rows.index((round_index, best))
+        # The refit always uses the full resource
+        self.best_params_ = self._round_params(best, self.max_resources_)
+        self.best_score_ = float(np.nanmax(means))
+        self.best_n_resources_ = current['n_resources']
+
+    def _result_rows(self):
+        rows = []
+        for index, (round_index, candidate) in enumerate(self._rows):
+            current = self._rounds[round_index]
+            if candidate not in current['done']:
+                continue
+            rows.append({
+                'iter': round_index,
+                'n_resources': current['n_resources'],
+                'params': _native_params(self.cv_results_['params'][index]),
+                'mean_test_score': _to_native(self.cv_results_['mean_test_score'][index]),
+                'std_test_score': _to_native(self.cv_results_['std_test_score'][index]),
+                'split_test_scores': [_to_native(score) for score in current['scores'][candidate]],
+                'mean_fit_time': _to_native(self.cv_results_['mean_fit_time'][index])
+            })
+        return rows
+
+    def _fit_seconds(self):
+        return float(sum(np.nansum(times) for current in self._rounds for times in current['fit_times'].values()))
+
+    def summary(self):
+        return dict(
+            super().summary(),
+            factor=self.factor,
+            resource=self.resource,
+            resources_per_round=self.resources_,
+            candidates_per_round=self.candidates_per_round_,
+            rounds_completed=sum(1 for current in self._rounds
+                                 if len(current['done']) == len(current['candidates'])),
+            best_n_resources=self.best_n_resources_
+        )
+
+
+def make_search(mode, *args, **kwargs):
+    """CandidateSearch for mode 'random', HalvingCandidateSearch for 'halving'"""
+    if mode == 'random':
+        return CandidateSearch(*args, **kwargs)
+    if mode == 'halving':
+        return HalvingCandidateSearch(*args, **kwargs)
+    raise ValueError(f"Unknown search mode: {mode} (expected one of: {', '.join(SEARCH_MODES)})")
@@ -0,0 +1,221 @@
+"""
+Loaded accident prediction models, published as one unit
+A ModelBundle is loaded and validated off to the side and then swapped in with a
+single reference assignment, so a request that captures the current bundle never
+mixes a new regressor with old encoders, feature columns or metadata
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+REGRESSOR_FILE = 'accident_rf_regression_model.pkl'
+CLASSIFIER_FILE = 'accident_rf_classification_model.pkl'
+REGRESSOR_COMPILED_FILE = 'accident_rf_regression_compiled.joblib'
+CLASSIFIER_COMPILED_FILE = 'accident_rf_classification_compiled.joblib'
+MUNICIPALITY_ENCODER_FILE = 'municipality_encoder.pkl'
+BARANGAY_ENCODER_FILE = 'barangay_encoder.pkl'
+FEATURE_COLUMNS_FILE = 'accident_rf_feature_columns.pkl'
+METADATA_FILE = 'accident_rf_regression_metadata.json'
+
+
+class ModelLoadError(Exception):
+    """Raised when trained model files are missing or inconsistent"""
+
+
+class ModelBundle:
+    """Everything one prediction reads: forests, compiled forests, encoders, feature columns and metadata"""
+
+    def __init__(self, regressor, feature_columns, classifier=None, municipality_encoder=None,
+                 barangay_encoder=None, metadata=None, compiled_regressor=None, compiled_classifier=None,
+                 training_job_id=None):
+        """
+        Initialize model bundle
+
+        Args:
+            regressor: Fitted accident count regressor
+            feature_columns: Feature names in training order
+            classifier: Optional fitted high-risk classifier
+            municipality_encoder, barangay_encoder: Optional fitted LabelEncoders
+            metadata: Training metadata dict
+            compiled_regressor, compiled_classifier: Optional CompiledForest exports
+            training_job_id: Training job that produced the files, if known
+        """
+        self.regressor = regressor
+        self.classifier = classifier
+        self.compiled_regressor = compiled_regressor
+        self.compiled_classifier = compiled_classifier
+        self.municipality_encoder = municipality_encoder
+        self.barangay_encoder = barangay_encoder
+        self.feature_columns = list(feature_columns)
+        self.metadata = metadata or {}
+        self.training_job_id = training_job_id
+        self.generation = None  # Assigned by ModelRegistry.publish
+        self.loaded_at = datetime.now().isoformat()
+
+    @property
+    def high_risk_threshold(self):
+        return self.metadata.get('high_risk_threshold')
+
+    @property
+    def use_log_target(self):
+        return self.metadata.get('use_log_target', True)
+
+    @classmethod
+    def load(cls, model_dir, compile_forest=None, training_job_id=None):
+        """
+        Load and validate a bundle from the trained model directory
+
+        Args:
+            model_dir: Directory written by train_rf_model.py
+            compile_forest: Optional callable(model, compiled_path) returning a CompiledForest or None
+            training_job_id: Training job that produced the files, if known
+
+        Returns:
+            Validated ModelBundle
+
+        Raises:
+            ModelLoadError: If a required file is missing or the files do not fit together
+        """
+        if not os.path.exists(model_dir):
+            raise ModelLoadError(f"Model directory not found: {model_dir}")
+
+        def path(name):
+            return os.path.join(model_dir, name)
+
+        def load_optional(name, description):
+            if not os.path.exists(path(name)):
+                logger.warning(f"{description} not found")
+                return None
+            logger.info(f"Loaded {description.lower()}")
+            return joblib.load(path(name))
+
+        if not os.path.exists(path(REGRESSOR_FILE)):
+            raise ModelLoadError(f"Regressor model not found: {path(REGRESSOR_FILE)}. "
+                                 f"Please train the model first using train_rf_model.py")
+        if not os.path.exists(path(FEATURE_COLUMNS_FILE)):
+            raise ModelLoadError("Feature columns not found")
+
+        regressor = joblib.load(path(REGRESSOR_FILE))
+        logger.info(f"Loaded Random Forest Regressor from: {path(REGRESSOR_FILE)}")
+
+        # Classifier is optional (older trainings only exported the regressor)
+        classifier = None
+        if os.path.exists(path(CLASSIFIER_FILE)):
+            classifier = joblib.load(path(CLASSIFIER_FILE))
+            logger.info(f"Loaded Random Forest Classifier from: {path(CLASSIFIER_FILE)}")
+        else:
+            logger.warning("Classifier model not found - will only provide regression predictions")
+
+        feature_columns = joblib.load(path(FEATURE_COLUMNS_FILE))
+        logger.info(f"Loaded feature columns: {feature_columns}")
+
+        metadata = {}
+        if os.path.exists(path(METADATA_FILE)):
+            with open(path(METADATA_FILE), 'r') as f:
+                metadata = json.load(f)
+            logger.info("Loaded model metadata")
+
+        compiled_regressor = compiled_classifier = None
+        if compile_forest is not None:
+            compiled_regressor = compile_forest(regressor, path(REGRESSOR_COMPILED_FILE))
+            compiled_classifier = compile_forest(classifier, path(CLASSIFIER_COMPILED_FILE))
+
+        bundle = cls(
+            regressor,
+            feature_columns,
+            classifier=classifier,
+            municipality_encoder=load_optional(MUNICIPALITY_ENCODER_FILE, 'Municipality encoder'),
+            barangay_encoder=load_optional(BARANGAY_ENCODER_FILE, 'Barangay encoder'),
+            metadata=metadata,
+            compiled_regressor=compiled_regressor,
+            compiled_classifier=compiled_classifier,
+            training_job_id=training_job_id
+        )
+        bundle.validate()
+        return bundle
+
+    def validate(self):
+        """
+        Check the pieces belong together before the bundle is published
+
+        Raises:
+            ModelLoadError: If the forests were trained on a different feature set
+        """
+        if not self.feature_columns:
+            raise ModelLoadError("Feature columns are empty")
+        for name, model in (('Regressor', self.regressor), ('Classifier', self.classifier)):
+            n_features = getattr(model, 'n_features_in_', None)
+            if n_features is not None and n_features != len(self.feature_columns):
+                raise ModelLoadError(f"{name} expects {n_features} features but "
+                                     f"{len(self.feature_columns)} feature columns were saved")
+        if self.classifier is not None and len(getattr(self.classifier, 'classes_', [0, 1])) != 2:
+            raise ModelLoadError("Classifier is not a binary high-risk classifier")
+
+    def info(self):
+        """Bundle identity for the health endpoint"""
+        return {
+            'generation': self.generation,
+            'training_job_id': self.training_job_id,
+            'training_date': self.metadata.get('training_date'),
+            'loaded_at': self.loaded_at
+        }
+
+
+class ModelRegistry:
+    """
+    Current and previous ModelBundle of a serving process
+
+    Readers take registry.current once per request and use only that bundle;
+    publish() and rollback() replace it with one reference swap.
+    """
+
+    def __init__(self):
+        self._current = None
+        self._previous = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return self._current
+
+    @property
+    def previous(self):
+        return self._previous
+
+    def publish(self, bundle):
+        """
+        Make a fully loaded bundle the current one, keeping the old one for rollback
+
+        Returns:
+            The published bundle (with its generation assigned)
+        """
+        with self._lock:
+            self._generation += 1
+            bundle.generation = self._generation
+            self._previous = self._current
+            self._current = bundle
+        return bundle
+
+    def rollback(self):
+        """
+        Swap the current bundle with the previous one
+
+        Returns:
+            The bundle now being served
+
+        Raises:
+            ModelLoadError: If there is no previous bundle
+        """
+        with self._lock:
+            if self._previous is None:
+                raise ModelLoadError("No previous model to roll back to")
+            self._previous, self._current = self._current, self._previous
+            return self._current
@@ -0,0 +1,113 @@
+"""
+Bounded LRU/TTL cache for prediction responses
+Entries belong to one (model version, data fingerprint) pair and are dropped
+as soon as either changes
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry TTL and version-based invalidation"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        """
+        Initialize prediction cache
+
+        Args:
+            max_entries: Maximum number of cached responses.
+                         Default: ACCIDENT_PREDICTION_CACHE_SIZE environment variable or 256
+            ttl: Seconds an entry stays valid (0 disables caching).
+                 Default: ACCIDENT_PREDICTION_CACHE_TTL_SECONDS environment variable or 3600
+        """
+        self.max_entries = int(os.getenv('ACCIDENT_PREDICTION_CACHE_SIZE', '256')) if max_entries is None else max_entries
+        self.ttl = int(os.getenv('ACCIDENT_PREDICTION_CACHE_TTL_SECONDS', '3600')) if ttl is None else ttl
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def _sync(self, version):
+        """Drop every entry if the model/data version changed (caller holds the lock)"""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        """
+        Look up a cached value
+
+        Args:
+            version: (model version, data fingerprint) the caller is serving
+            key: (endpoint, parameters...) tuple
+
+        Returns:
+            Cached value or None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._sync(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, version, key, value):
+        """Store a value, evicting the least recently used entries past max_entries"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._sync(version)
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (e.g. after a model reload)"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
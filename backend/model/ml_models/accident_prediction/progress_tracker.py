@@ -40,6 +40,10 @@ class ProgressTracker:
             message: Status message
             details: Additional details dict
         """
+        # Never overwrite a pending cancellation (the trainer polls for it)
+        if self.is_cancelled():
+            return
+        
         progress_data = {
             'is_training': True,
             'step': step,
@@ -152,10 +156,8 @@ class ProgressTracker:
             with open(temp_file, 'w') as f:
                 json.dump(serializable_data, f, indent=2)
             
-            # Atomic rename
-            if os.path.exists(self.progress_file):
-                os.remove(self.progress_file)
-            os.rename(temp_file, self.progress_file)
+            # Atomic rename (readers never see a missing file)
+            os.replace(temp_file, self.progress_file)
         except IOError as e:
             print(f"Error writing progress file: {e}")
     
@@ -2,18 +2,25 @@
 """
 Scheduled retraining script for Accident Prediction Model
 Runs automatically at the end of each month via systemd timer
+
+Configuration (environment variables):
+- ACCIDENT_RETRAIN_REFRESH: Refit with the previous best hyperparameters and only run
+  the full search when metrics degrade or the features changed (default: 1; 0 always searches)
+- ACCIDENT_REFRESH_TOLERANCE: Allowed drop in test R² / accuracy before a refresh searches (default: 0.02)
 """
 
 import os
 import sys
 import subprocess
 import logging
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
 # Get script directory
 script_dir = Path(__file__).parent.absolute()
 project_root = script_dir.parent.parent.parent.parent
+sys.path.append(str(script_dir))
 
 # Create logs directory if it doesn't exist (Windows-compatible)
 logs_dir = script_dir / 'logs'
@@ -31,6 +38,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+RETRAIN_REFRESH = os.getenv('ACCIDENT_RETRAIN_REFRESH', '1').lower() in ('1', 'true', 'yes')
+REFRESH_TOLERANCE = os.getenv('ACCIDENT_REFRESH_TOLERANCE', '0.02')
+
 def is_last_day_of_month():
     """Check if today is the last day of the current month"""
     today = datetime.now()
@@ -40,6 +50,41 @@ def is_last_day_of_month():
     return tomorrow.day == 1
 
 
+def run_training_job(venv_python, timeout=3600):
+    """
+    Queue a training job and wait for the training worker to finish it.
+    Starts a worker (drain-and-exit); it exits at once if one is already running.
+    
+    Returns:
+        The finished job record (status succeeded, failed or cancelled)
+    """
+    from training_jobs import TrainingJobStore, JobConflictError, FINISHED_STATUSES
+    
+    store = TrainingJobStore()
+    try:
+        args = ['--refresh', '--refresh-tolerance', REFRESH_TOLERANCE] if RETRAIN_REFRESH else []
+        job = store.submit(params={'source': 'scheduled', 'args': args})
+        logger.info(f"Queued training job {job['id']}")
+    except JobConflictError as e:
+        job = e.job
+        logger.info(f"Training job {job['id']} is already {job['status']}; waiting for it instead")
+    
+    # Always start one: a worker that looks alive may be exiting or dead, and a
+    # redundant worker exits at once on the worker lock
+    if not store.worker_status()['alive']:
+        logger.info("No training worker running; starting one")
+    subprocess.Popen([str(venv_python), str(script_dir / 'training_worker.py'), '--once'], cwd=str(script_dir))
+    
+    deadline = time.monotonic() + timeout
+    while True:
+        job = store.get(job['id'])
+        if job['status'] in FINISHED_STATUSES:
+            return job
+        if time.monotonic() > deadline:
+            raise subprocess.TimeoutExpired(str(script_dir / 'train_rf_model.py'), timeout)
+        time.sleep(5)
+
+
 def main():
     """Main retraining function"""
     logger.info("=" * 80)
@@ -92,18 +137,12 @@ def main():
             logger.error(f"Training script not found: {train_script}")
             sys.exit(1)
         
-        result = subprocess.run(
-            [str(venv_python), str(train_script)],
-            cwd=str(script_dir),
-            capture_output=True,
-            text=True,
-            timeout=3600  # 1 hour timeout
-        )
+        # Training runs in the training worker; the worker enforces its own timeout
+        job = run_training_job(venv_python, timeout=2 * 3600)
         
-        if result.returncode != 0:
-            logger.error("Training failed!")
-            logger.error(f"STDOUT:\n{result.stdout}")
-            logger.error(f"STDERR:\n{result.stderr}")
+        if job['status'] != 'succeeded':
+            logger.error(f"Training {job['status']}: {job.get('error')}")
+            logger.error(f"Job log: {job['log_path']}")
             
             # Log failed retrain activity
             try:
@@ -113,7 +152,7 @@ def main():
                 log_data = {
                     'logType': 'automatic_retrain_accident',
                     'status': 'failed',
-                    'details': f'Automatic retrain failed: {result.stderr[:200] if result.stderr else "Unknown error"}'
+                    'details': f'Automatic retrain failed: {(job.get("error") or "Unknown error")[:200]}'
                 }
                 try:
                     requests.post(log_url, json=log_data, timeout=10)
@@ -124,8 +163,7 @@ def main():
             
             sys.exit(1)
         
-        logger.info("Training completed successfully!")
-        logger.info(f"STDOUT:\n{result.stdout}")
+        logger.info(f"Training completed successfully! (job {job['id']}, log: {job['log_path']})")
         
         # Step 2: Try to reload model via API endpoint first (if available)
         logger.info("Step 2: Attempting to reload model via API endpoint...")
@@ -211,7 +249,7 @@ def main():
         return 0
         
     except subprocess.TimeoutExpired:
-        logger.error("Training process timed out after 1 hour")
+        logger.error("Timed out waiting for the training job to finish")
         sys.exit(1)
     except Exception as e:
         logger.error(f"Unexpected error during retraining: {str(e)}")
@@ -4,13 +4,15 @@ Train Random Forest Models for Accident Prediction
 - Classifier: Predicts whether an area is high-risk
 """
 
+import argparse
 import os
 import sys
 import pandas as pd
 import numpy as np
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.model_selection import (
-    train_test_split, cross_val_score, RandomizedSearchCV,
+    train_test_split, cross_val_score,
     KFold, StratifiedKFold, TimeSeriesSplit
 )
 from sklearn.metrics import (
@@ -20,6 +22,7 @@ from sklearn.metrics import (
 )
 import joblib
 import json
+import time
 from datetime import datetime
 import logging
 
@@ -29,6 +32,8 @@ sys.path.append(current_dir)
 
 from data_loader import AccidentDataLoader
 from progress_tracker import ProgressTracker
+from compiled_forest import CompiledForest
+from hyperparameter_search import make_search, fit_searches, resolve_n_jobs, SearchCancelled, SEARCH_MODES
 
 logging.basicConfig(
     level=logging.INFO,
@@ -36,11 +41,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Test metric compared with the previous model when refreshing (higher is better)
+REFRESH_METRICS = {'regressor': 'test_r2', 'classifier': 'test_accuracy'}
+
+EXECUTION_MODES = ('sequential', 'concurrent')
+
 
 class AccidentRFTrainer:
     """Train Random Forest models (regressor + classifier) for accident prediction"""
     
-    def __init__(self, model_dir=None, high_risk_threshold=None, progress_tracker=None):
+    def __init__(self, model_dir=None, high_risk_threshold=None, progress_tracker=None,
+                 search_mode='random', time_budget=None, refresh=False, refresh_tolerance=0.02,
+                 execution='sequential', n_jobs=-1):
         """
         Initialize trainer
         
@@ -49,7 +61,24 @@ class AccidentRFTrainer:
             high_risk_threshold: Threshold for high-risk classification (percentile or absolute value).
                                  If None, uses 75th percentile of accident counts.
             progress_tracker: ProgressTracker instance for progress updates (optional)
+            search_mode: 'random' (every candidate on every fold) or 'halving' (successive halving)
+            time_budget: Wall-clock seconds for both hyperparameter searches (optional). The regressor
+                         gets half, the classifier the rest; each then uses its best candidate so far.
+            refresh: Refit each model once with the best_params of the previous training run instead
+                     of searching. A model is searched anyway when there is no previous run, the feature
+                     set changed, or its test metric (R² / accuracy) dropped by more than refresh_tolerance.
+            refresh_tolerance: Allowed drop of the test metric before a refresh falls back to a search
+            execution: 'sequential' (regressor search, then classifier search) or 'concurrent' (both
+                       searches in one worker pool on the same precomputed folds)
+            n_jobs: Cores used for the searches and refits (-1: all cores)
         """
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {search_mode} (expected one of: {', '.join(SEARCH_MODES)})")
+        if time_budget is not None and time_budget <= 0:
+            raise ValueError("time_budget must be positive")
+        if execution not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution} (expected one of: {', '.join(EXECUTION_MODES)})")
+        
         if model_dir is None:
             base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
             model_dir = os.path.join(base_dir, 'trained')
@@ -66,6 +95,230 @@ class AccidentRFTrainer:
         self.use_log_target = True
         self.high_risk_threshold = high_risk_threshold
         self.progress_tracker = progress_tracker
+        self.search_results_dir = os.path.join(model_dir, 'search_results')
+        self.search_mode = search_mode
+        self.time_budget = time_budget
+        self.search_summaries = {}
+        self._search_started = None
+        self.metadata_path = os.path.join(model_dir, 'accident_rf_regression_metadata.json')
+        self.refresh = refresh
+        self.refresh_tolerance = refresh_tolerance
+        self.refresh_plan = {}
+        self.refresh_decisions = {}
+        self.execution = execution
+        self.n_jobs = n_jobs
+    
+    def _is_cancelled(self):
+        return bool(self.progress_tracker and self.progress_tracker.is_cancelled())
+    
+    def _search_progress(self, step, step_name, start_percent, end_percent, searches=None):
+        """
+        Progress callback for CandidateSearch: maps fits completed onto
+        [start_percent, end_percent] of the overall bar, with an ETA
+
+        Args:
+            searches: Searches sharing this part of the bar (concurrent execution);
+                      their progress is averaged. Default: the reporting search only
+        """
+        state = {'last_update': 0.0}
+        
+        def report(search):
+            group = searches or [search]
+            now = time.monotonic()
+            finished = all(s.completed_tasks_ == s.total_tasks_ for s in group)
+            # The progress file is rewritten at most every 2 seconds
+            if not self.progress_tracker or (now - state['last_update'] < 2.0 and not finished):
+                return
+            state['last_update'] = now
+            fraction = sum(s.fraction_complete for s in group) / len(group)
+            etas = [s.eta_seconds for s in group]
+            eta = None if None in etas else max(etas)
+            eta_text = f", ETA {int(eta // 60)}m {int(eta % 60):02d}s" if eta is not None else ''
+            percent = start_percent + (end_percent - start_percent) * fraction
+            text = search.progress_text() if len(group) == 1 else \
+                '; '.join(f"{s.name} {s.progress_text()}" for s in group)
+            self.progress_tracker.update(
+                step, step_name, round(percent, 1),
+                f"Hyperparameter search: {text}{eta_text}",
+                details={'search': {
+                    'name': '+'.join(s.name for s in group),
+                    'mode': search.mode,
+                    'fraction_complete': round(fraction, 4),
+                    'completed_fits': sum(s.completed_tasks_ for s in group),
+                    'total_fits': sum(s.total_tasks_ for s in group),
+                    'completed_candidates': sum(s.completed_candidates for s in group),
+                    'n_candidates': sum(len(s.candidates_) for s in group),
+                    'elapsed_seconds': round(max(s.elapsed_seconds_ for s in group), 1),
+                    'eta_seconds': round(eta, 1) if eta is not None else None
+                }}
+            )
+        return report
+    
+    def _make_search(self, name, estimator, param_dist, cv, scoring, random_state, progress_callback):
+        """Hyperparameter search for the configured mode, with progress, cancellation and budget"""
+        time_budget = None
+        if self.time_budget and self.execution == 'concurrent':
+            # Both searches run side by side for the whole budget
+            time_budget = self.time_budget
+        elif self.time_budget:
+            if self._search_started is None:
+                # The regressor gets half of the budget, the classifier whatever is left
+                self._search_started = time.monotonic()
+                time_budget = self.time_budget / 2
+            else:
+                time_budget = max(self.time_budget - (time.monotonic() - self._search_started), 1.0)
+        return make_search(
+            self.search_mode,
+            estimator=estimator,
+            param_distributions=param_dist,
+            n_iter=100,  # Increased from 40 to 100 for more thorough search
+            cv=cv,
+            scoring=scoring,
+            random_state=random_state,
+            n_jobs=self.n_jobs,
+            name=name,
+            progress_callback=progress_callback,
+            should_cancel=self._is_cancelled,
+            results_path=os.path.join(self.search_results_dir, f'{name}_cv_results.json'),
+            time_budget=time_budget
+        )
+    
+    def _save_search_summary(self):
+        """Write the CV score versus time of both searches (to compare search modes)"""
+        summary_path = os.path.join(self.search_results_dir, 'search_summary.json')
+        os.makedirs(self.search_results_dir, exist_ok=True)
+        with open(summary_path, 'w') as f:
+            json.dump({
+                'search_mode': self.search_mode,
+                'time_budget_seconds': self.time_budget,
+                'training_date': datetime.now().isoformat(),
+                **self.search_summaries
+            }, f, indent=2)
+        logger.info(f"Search summary saved: {summary_path}")
+    
+    def _plan_refresh(self):
+        """
+        Decide which models can be refit with the previous run's best_params
+
+        Returns:
+            {model name: previous metrics (with best_params)} for the models to refresh
+        """
+        previous = self._load_previous_metadata()
+        plan = {}
+        for name in REFRESH_METRICS:
+            if previous is None:
+                reason = 'no previous training run'
+            elif previous.get('feature_columns') != self.feature_columns:
+                reason = 'feature set changed'
+            elif not (previous.get(f'{name}_metrics') or {}).get('best_params'):
+                reason = 'previous run has no best_params'
+            else:
+                plan[name] = previous[f'{name}_metrics']
+                continue
+            self.refresh_decisions[name] = {'action': 'search', 'reason': reason}
+            logger.info(f"  Refresh: full search for {name} ({reason})")
+        return plan
+    
+    def _refresh_model(self, name, base_model, X_train, y_train, evaluate):
+        """
+        Refit a model once with the previous best_params
+
+        Args:
+            name: 'regressor' or 'classifier'
+            base_model: Unfitted estimator to take the parameters
+            X_train, y_train: Training data
+            evaluate: Callable computing the model's metrics
+
+        Returns:
+            Metrics of the refit model, or None if it needs a full search instead
+        """
+        previous = self.refresh_plan.get(name)
+        if previous is None:
+            return None
+        params = previous['best_params']
+        try:
+            model = clone(base_model).set_params(**params)
+        except (ValueError, TypeError) as e:
+            self.refresh_decisions[name] = {'action': 'search', 'reason': f'previous best_params rejected: {str(e)}'}
+            logger.info(f"  Refresh: full search for {name} (previous best_params rejected: {str(e)})")
+            return None
+        
+        logger.info(f"  Refresh: refitting {name} with previous best params {params}")
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        setattr(self, f'{name}_model', model)
+        metrics = evaluate()
+        
+        metric = REFRESH_METRICS[name]
+        previous_value, value = previous.get(metric), metrics[metric]
+        decision = {
+            'metric': metric,
+            'previous': previous_value,
+            'refit': value,
+            'tolerance': self.refresh_tolerance,
+            'fit_seconds': round(time.perf_counter() - start, 2)
+        }
+        if previous_value is not None and previous_value - value > self.refresh_tolerance:
+            reason = f'{metric} dropped from {previous_value:.4f} to {value:.4f}'
+            self.refresh_decisions[name] = dict(decision, action='search', reason=reason)
+            logger.info(f"  Refresh: full search for {name} ({reason})")
+            return None
+        
+        self.refresh_decisions[name] = dict(decision, action='refit')
+        logger.info(f"  Refresh: kept previous {name} params ({metric} {value:.4f}, previous {previous_value})")
+        metrics['best_params'] = params
+        return metrics
+    
+    def _load_previous_metadata(self):
+        """Metadata of the previous training run, or None"""
+        if not os.path.exists(self.metadata_path):
+            return None
+        try:
+            with open(self.metadata_path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"Could not read previous metadata: {str(e)}")
+            return None
+    
+    def _training_timing(self, model_seconds, previous):
+        """
+        Wall-clock summary of the model training steps, compared with the previous run
+
+        Args:
+            model_seconds: Wall-clock seconds of steps 5-6 (searches, refits, evaluation)
+            previous: Metadata of the previous run (or None)
+        """
+        n_workers = resolve_n_jobs(self.n_jobs)
+        summaries = list(self.search_summaries.values())
+        timing = {
+            'execution': self.execution,
+            'n_workers': n_workers,
+            'model_training_seconds': round(model_seconds, 2),
+            'search_wall_seconds': None,
+            'search_fit_seconds': None,
+            'pool_utilization': None
+        }
+        if summaries:
+            elapsed = [summary['elapsed_seconds'] for summary in summaries]
+            # Concurrent searches overlap; sequential ones add up
+            search_wall = max(elapsed) if self.execution == 'concurrent' else sum(elapsed)
+            fit_seconds = sum(summary['fit_seconds'] for summary in summaries)
+            timing.update(
+                search_wall_seconds=round(search_wall, 2),
+                search_fit_seconds=round(fit_seconds, 2),
+                pool_utilization=round(fit_seconds / (search_wall * n_workers), 3) if search_wall else None
+            )
+        previous_timing = (previous or {}).get('timing')
+        if previous_timing:
+            timing['previous'] = {
+                'execution': previous_timing.get('execution'),
+                'model_training_seconds': previous_timing.get('model_training_seconds'),
+                'search_wall_seconds': previous_timing.get('search_wall_seconds')
+            }
+            if previous_timing.get('model_training_seconds'):
+                timing['model_training_seconds_change'] = round(
+                    model_seconds - previous_timing['model_training_seconds'], 2)
+        return timing
     
     def _time_based_split(self, df, test_size=0.2):
         """
@@ -110,6 +363,13 @@ class AccidentRFTrainer:
         logger.info("=" * 60)
         logger.info("Starting Random Forest Model Training (Regressor + Classifier)")
         logger.info("=" * 60)
+        logger.info(f"Hyperparameter search: {self.search_mode}" +
+                    (f", time budget {self.time_budget:.0f}s" if self.time_budget else "") +
+                    (f" (refresh, tolerance {self.refresh_tolerance})" if self.refresh else ""))
+        self.search_summaries = {}
+        self._search_started = None
+        self.refresh_plan = {}
+        self.refresh_decisions = {}
         
         if self.progress_tracker:
             self.progress_tracker.reset()
@@ -132,22 +392,30 @@ class AccidentRFTrainer:
         
         try:
             loader.connect()
-            accidents = loader.load_raw_data()
-            
-            if not accidents:
-                raise ValueError("No accident data found in database")
-            
-            logger.info(f"Loaded {len(accidents)} accident records")
-            
-            # Aggregate monthly counts
-            logger.info("Step 2: Aggregating monthly counts per barangay...")
-            if self.progress_tracker:
-                if self.progress_tracker.is_cancelled():
-                    logger.info("Training cancelled")
-                    return None
-                self.progress_tracker.update(2, "Aggregating Data", 15, f"Aggregating {len(accidents)} records into monthly counts...")
             
-            df_aggregated = loader.aggregate_monthly_counts(accidents)
+            if loader.aggregation_mode == 'pipeline':
+                # MongoDB groups the records; only monthly rows are transferred
+                if self.progress_tracker:
+                    self.progress_tracker.update(2, "Aggregating Data", 15, "Aggregating monthly counts in MongoDB...")
+                logger.info("Step 2: Aggregating monthly counts per barangay in MongoDB...")
+                df_aggregated = loader.load_monthly_counts()
+            else:
+                accidents = loader.load_raw_data()
+                
+                if not accidents:
+                    raise ValueError("No accident data found in database")
+                
+                logger.info(f"Loaded {len(accidents)} accident records")
+                
+                # Aggregate monthly counts
+                logger.info("Step 2: Aggregating monthly counts per barangay...")
+                if self.progress_tracker:
+                    if self.progress_tracker.is_cancelled():
+                        logger.info("Training cancelled")
+                        return None
+                    self.progress_tracker.update(2, "Aggregating Data", 15, f"Aggregating {len(accidents)} records into monthly counts...")
+                
+                df_aggregated = loader.aggregate_monthly_counts(accidents)
             
             if df_aggregated.empty:
                 raise ValueError("No valid aggregated data found")
@@ -177,6 +445,10 @@ class AccidentRFTrainer:
             
             logger.info(f"Training data shape: {df.shape}")
             
+            previous_metadata = self._load_previous_metadata()
+            if self.refresh:
+                self.refresh_plan = self._plan_refresh()
+            
             # Prepare features and targets
             X = df[self.feature_columns]
             y_raw = df['accident_count']
@@ -229,34 +501,57 @@ class AccidentRFTrainer:
             logger.info(f"Train class distribution: Low-risk={sum(y_train_class==0)}, High-risk={sum(y_train_class==1)}")
             logger.info(f"Test class distribution: Low-risk={sum(y_test_class==0)}, High-risk={sum(y_test_class==1)}")
             
-            # Train Regressor
-            logger.info("Step 5: Training Random Forest Regressor...")
-            if self.progress_tracker:
-                if self.progress_tracker.is_cancelled():
-                    logger.info("Training cancelled")
-                    return None
-                self.progress_tracker.update(5, "Training Regressor", 40, "Training Random Forest Regressor model with hyperparameter tuning...")
-            
-            regressor_metrics = self._train_regressor(
-                X_train, y_train_t, y_train_raw, X_test, y_test_t, y_test_raw, random_state
-            )
-            
-            # Check for cancellation after regressor training
-            if self.progress_tracker and self.progress_tracker.is_cancelled():
-                logger.info("Training cancelled after regressor training")
-                return None
-            
-            # Train Classifier
-            logger.info("Step 6: Training Random Forest Classifier...")
-            if self.progress_tracker:
-                if self.progress_tracker.is_cancelled():
-                    logger.info("Training cancelled")
+            model_start = time.perf_counter()
+            if self.execution == 'concurrent':
+                # Train Regressor and Classifier together
+                logger.info("Steps 5-6: Training Random Forest Regressor and Classifier concurrently...")
+                if self.progress_tracker:
+                    if self.progress_tracker.is_cancelled():
+                        logger.info("Training cancelled")
+                        return None
+                    self.progress_tracker.update(5, "Training Models", 40, "Training Random Forest Regressor and Classifier models with hyperparameter tuning...")
+                
+                regressor_metrics, classifier_metrics = self._train_concurrently(
+                    X_train, y_train_t, y_train_raw, y_train_class,
+                    X_test, y_test_raw, y_test_class, random_state
+                )
+            else:
+                # Train Regressor
+                logger.info("Step 5: Training Random Forest Regressor...")
+                if self.progress_tracker:
+                    if self.progress_tracker.is_cancelled():
+                        logger.info("Training cancelled")
+                        return None
+                    self.progress_tracker.update(5, "Training Regressor", 40,
+                                                 "Refitting Random Forest Regressor with the previous best hyperparameters..."
+                                                 if 'regressor' in self.refresh_plan else
+                                                 "Training Random Forest Regressor model with hyperparameter tuning...")
+                
+                regressor_metrics = self._train_regressor(
+                    X_train, y_train_t, y_train_raw, X_test, y_test_t, y_test_raw, random_state
+                )
+                
+                # Check for cancellation after regressor training
+                if self.progress_tracker and self.progress_tracker.is_cancelled():
+                    logger.info("Training cancelled after regressor training")
                     return None
-                self.progress_tracker.update(6, "Training Classifier", 70, "Training Random Forest Classifier model with hyperparameter tuning...")
+                
+                # Train Classifier
+                logger.info("Step 6: Training Random Forest Classifier...")
+                if self.progress_tracker:
+                    if self.progress_tracker.is_cancelled():
+                        logger.info("Training cancelled")
+                        return None
+                    self.progress_tracker.update(6, "Training Classifier", 70,
+                                                 "Refitting Random Forest Classifier with the previous best hyperparameters..."
+                                                 if 'classifier' in self.refresh_plan else
+                                                 "Training Random Forest Classifier model with hyperparameter tuning...")
+                
+                classifier_metrics = self._train_classifier(
+                    X_train, y_train_class, X_test, y_test_class, random_state
+                )
             
-            classifier_metrics = self._train_classifier(
-                X_train, y_train_class, X_test, y_test_class, random_state
-            )
+            model_seconds = time.perf_counter() - model_start
             
             # Check for cancellation after classifier training
             if self.progress_tracker and self.progress_tracker.is_cancelled():
@@ -272,6 +567,7 @@ class AccidentRFTrainer:
                 self.progress_tracker.update(7, "Saving Models", 90, "Saving trained models and metadata to disk...")
             
             self._save_models()
+            self._export_compiled_models()
             
             # Store metadata
             self.metadata = {
@@ -288,8 +584,13 @@ class AccidentRFTrainer:
                 'high_risk_threshold': float(threshold_value),
                 'use_time_split': use_time_split
             }
+            if self.refresh:
+                self.metadata['refresh'] = self.refresh_decisions
+            self.metadata['timing'] = self._training_timing(model_seconds, previous_metadata)
             
             self._save_metadata()
+            if self.search_summaries:
+                self._save_search_summary()
             
             # Print summary
             logger.info("=" * 60)
@@ -328,6 +629,10 @@ class AccidentRFTrainer:
                 'classifier': classifier_metrics
             }
             
+        except SearchCancelled as e:
+            # Worker processes are already stopped; partial cv_results_ are in search_results/
+            logger.info(f"Training cancelled: {str(e)}")
+            return None
         except Exception as e:
             if self.progress_tracker:
                 self.progress_tracker.complete(
@@ -339,11 +644,9 @@ class AccidentRFTrainer:
         finally:
             loader.disconnect()
     
-    def _train_regressor(self, X_train, y_train_t, y_train_raw, X_test, y_test_t, y_test_raw, random_state):
-        """Train Random Forest Regressor with hyperparameter tuning"""
-        # Hyperparameter tuning - Enhanced for better accuracy
-        logger.info("  Performing enhanced hyperparameter tuning for regressor...")
-        base_model = RandomForestRegressor(random_state=random_state, n_jobs=-1)
+    def _regressor_search_space(self, random_state):
+        """Base estimator and parameter distributions for the regressor search"""
+        base_model = RandomForestRegressor(random_state=random_state, n_jobs=self.n_jobs)
         param_dist = {
             'n_estimators': np.arange(300, 1001, 50),  # Increased range: 300-1000 (was 200-800)
             'max_depth': [15, 20, 25, 30, 35, 40, None],  # Added more depth options
@@ -353,30 +656,11 @@ class AccidentRFTrainer:
             'bootstrap': [True, False],
             'max_samples': [0.8, 0.9, 1.0]  # Added max_samples for better generalization
         }
-        search = RandomizedSearchCV(
-            estimator=base_model,
-            param_distributions=param_dist,
-            n_iter=100,  # Increased from 40 to 100 for more thorough search
-            cv=KFold(n_splits=5, shuffle=True, random_state=random_state),
-            scoring='neg_mean_absolute_error',
-            random_state=random_state,
-            n_jobs=-1,
-            verbose=1
-        )
-        search.fit(X_train, y_train_t)
-        self.regressor_model = search.best_estimator_
-        logger.info(f"  Best regressor params: {search.best_params_}")
-        
-        # Evaluate regressor
-        metrics = self._evaluate_regressor(X_train, y_train_raw, X_test, y_test_raw, random_state)
-        metrics['best_params'] = search.best_params_
-        return metrics
+        return base_model, param_dist
     
-    def _train_classifier(self, X_train, y_train_class, X_test, y_test_class, random_state):
-        """Train Random Forest Classifier with hyperparameter tuning"""
-        # Hyperparameter tuning - Enhanced for better accuracy (90-95% target)
-        logger.info("  Performing enhanced hyperparameter tuning for classifier (targeting 90-95% accuracy)...")
-        base_model = RandomForestClassifier(random_state=random_state, n_jobs=-1, class_weight='balanced')
+    def _classifier_search_space(self, random_state):
+        """Base estimator and parameter distributions for the classifier search"""
+        base_model = RandomForestClassifier(random_state=random_state, n_jobs=self.n_jobs, class_weight='balanced')
         param_dist = {
             'n_estimators': np.arange(300, 1001, 50),  # Increased range: 300-1000 (was 200-800)
             'max_depth': [15, 20, 25, 30, 35, 40, None],  # Added more depth options
@@ -386,24 +670,96 @@ class AccidentRFTrainer:
             'bootstrap': [True, False],
             'max_samples': [0.8, 0.9, 1.0]  # Added max_samples for better generalization
         }
-        search = RandomizedSearchCV(
-            estimator=base_model,
-            param_distributions=param_dist,
-            n_iter=100,  # Increased from 40 to 100 for more thorough search
+        return base_model, param_dist
+    
+    def _use_search_result(self, name, search, evaluate):
+        """Keep a finished search's best model and return its metrics"""
+        self.search_summaries[name] = search.summary()
+        setattr(self, f'{name}_model', search.best_estimator_)
+        logger.info(f"  Best {name} params: {search.best_params_}")
+        metrics = evaluate()
+        metrics['best_params'] = search.best_params_
+        return metrics
+    
+    def _train_regressor(self, X_train, y_train_t, y_train_raw, X_test, y_test_t, y_test_raw, random_state):
+        """Train Random Forest Regressor with hyperparameter tuning"""
+        # Hyperparameter tuning - Enhanced for better accuracy
+        logger.info("  Performing enhanced hyperparameter tuning for regressor...")
+        base_model, param_dist = self._regressor_search_space(random_state)
+        evaluate = lambda: self._evaluate_regressor(X_train, y_train_raw, X_test, y_test_raw, random_state)
+        refreshed = self._refresh_model('regressor', base_model, X_train, y_train_t, evaluate)
+        if refreshed is not None:
+            return refreshed
+        
+        search = self._make_search(
+            'regressor', base_model, param_dist,
+            cv=KFold(n_splits=5, shuffle=True, random_state=random_state),
+            scoring='neg_mean_absolute_error',
+            random_state=random_state,
+            progress_callback=self._search_progress(5, "Training Regressor", 40, 70)
+        )
+        search.fit(X_train, y_train_t)
+        return self._use_search_result('regressor', search, evaluate)
+    
+    def _train_classifier(self, X_train, y_train_class, X_test, y_test_class, random_state):
+        """Train Random Forest Classifier with hyperparameter tuning"""
+        # Hyperparameter tuning - Enhanced for better accuracy (90-95% target)
+        logger.info("  Performing enhanced hyperparameter tuning for classifier (targeting 90-95% accuracy)...")
+        base_model, param_dist = self._classifier_search_space(random_state)
+        evaluate = lambda: self._evaluate_classifier(X_train, y_train_class, X_test, y_test_class, random_state)
+        refreshed = self._refresh_model('classifier', base_model, X_train, y_train_class, evaluate)
+        if refreshed is not None:
+            return refreshed
+        
+        search = self._make_search(
+            'classifier', base_model, param_dist,
             cv=StratifiedKFold(n_splits=5, shuffle=True, random_state=random_state),
             scoring='accuracy',  # Changed from 'f1' to 'accuracy' to directly optimize for accuracy
             random_state=random_state,
-            n_jobs=-1,
-            verbose=1
+            progress_callback=self._search_progress(6, "Training Classifier", 70, 90)
         )
         search.fit(X_train, y_train_class)
-        self.classifier_model = search.best_estimator_
-        logger.info(f"  Best classifier params: {search.best_params_}")
+        return self._use_search_result('classifier', search, evaluate)
+    
+    def _train_concurrently(self, X_train, y_train_t, y_train_raw, y_train_class,
+                            X_test, y_test_raw, y_test_class, random_state):
+        """
+        Train the regressor and classifier with both searches in one worker pool
+
+        The fold indices are generated once (stratified on the high-risk class) and
+        shared by both searches, so the pool runs regressor and classifier fits side
+        by side instead of idling while one search finishes its slowest candidates.
+
+        Returns:
+            (regressor metrics, classifier metrics)
+        """
+        splits = list(StratifiedKFold(n_splits=5, shuffle=True, random_state=random_state)
+                      .split(X_train, y_train_class))
+        models = {
+            'regressor': (self._regressor_search_space(random_state), y_train_t, 'neg_mean_absolute_error',
+                          lambda: self._evaluate_regressor(X_train, y_train_raw, X_test, y_test_raw, random_state)),
+            'classifier': (self._classifier_search_space(random_state), y_train_class, 'accuracy',
+                           lambda: self._evaluate_classifier(X_train, y_train_class, X_test, y_test_class, random_state))
+        }
+        metrics, searches, jobs = {}, [], []
+        progress_callback = self._search_progress(5, "Training Models", 40, 90, searches=searches)
+        for name, ((base_model, param_dist), y_train, scoring, evaluate) in models.items():
+            refreshed = self._refresh_model(name, base_model, X_train, y_train, evaluate)
+            if refreshed is not None:
+                metrics[name] = refreshed
+                continue
+            search = self._make_search(name, base_model, param_dist, cv=splits, scoring=scoring,
+                                       random_state=random_state, progress_callback=progress_callback)
+            searches.append(search)
+            jobs.append((search, X_train, y_train))
         
-        # Evaluate classifier
-        metrics = self._evaluate_classifier(X_train, y_train_class, X_test, y_test_class, random_state)
-        metrics['best_params'] = search.best_params_
-        return metrics
+        if jobs:
+            logger.info(f"  Running the {' and '.join(search.name for search in searches)} search(es) "
+                        f"on one pool of {resolve_n_jobs(self.n_jobs)} worker(s)")
+            fit_searches(jobs, n_jobs=self.n_jobs)
+            for search in searches:
+                metrics[search.name] = self._use_search_result(search.name, search, models[search.name][3])
+        return metrics['regressor'], metrics['classifier']
     
     def _evaluate_regressor(self, X_train, y_train_raw, X_test, y_test_raw, random_state):
         """Evaluate regressor performance on raw scale"""
@@ -467,7 +823,7 @@ class AccidentRFTrainer:
         cv_scores = cross_val_score(
             self.regressor_model, X_train, y_train_transformed,
             cv=KFold(n_splits=5, shuffle=True, random_state=random_state),
-            scoring='r2', n_jobs=-1
+            scoring='r2', n_jobs=self.n_jobs
         )
         cv_mean = cv_scores.mean()
         cv_std = cv_scores.std()
@@ -534,7 +890,7 @@ class AccidentRFTrainer:
         cv_scores = cross_val_score(
             self.classifier_model, X_train, y_train_class,
             cv=StratifiedKFold(n_splits=5, shuffle=True, random_state=random_state),
-            scoring='accuracy', n_jobs=-1
+            scoring='accuracy', n_jobs=self.n_jobs
         )
         cv_mean = cv_scores.mean()
         cv_std = cv_scores.std()
@@ -589,9 +945,23 @@ class AccidentRFTrainer:
             joblib.dump(self.feature_columns, feature_path)
             logger.info(f"Feature columns saved: {feature_path}")
     
+    def _export_compiled_models(self):
+        """Export the forests as flat node arrays for the API's fast inference path"""
+        for model, name in [(self.regressor_model, 'accident_rf_regression_compiled.joblib'),
+                            (self.classifier_model, 'accident_rf_classification_compiled.joblib')]:
+            if model is None:
+                continue
+            try:
+                compiled_path = os.path.join(self.model_dir, name)
+                CompiledForest.from_sklearn(model).save(compiled_path)
+                logger.info(f"Compiled forest saved: {compiled_path}")
+            except Exception as e:
+                # The API compiles from the .pkl when the export is missing
+                logger.warning(f"Could not export compiled forest {name}: {str(e)}")
+    
     def _save_metadata(self):
         """Save model metadata"""
-        metadata_path = os.path.join(self.model_dir, 'accident_rf_regression_metadata.json')
+        metadata_path = self.metadata_path
 
         # Convert numpy types to native Python types for JSON serialization
         def to_serializable(obj):
@@ -616,12 +986,36 @@ class AccidentRFTrainer:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the accident prediction Random Forest models')
+    parser.add_argument('--search-mode', choices=SEARCH_MODES, default='random',
+                        help="Hyperparameter search: 'random' (all candidates, all folds) or "
+                             "'halving' (successive halving over training sample size)")
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Wall-clock seconds for the hyperparameter searches (default: no limit)')
+    parser.add_argument('--refresh', action='store_true',
+                        help="Refit with the previous run's best_params; search only when metrics "
+                             "degrade or the feature set changed")
+    parser.add_argument('--refresh-tolerance', type=float, default=0.02,
+                        help='Allowed drop in test R² / accuracy before a refresh runs a full search (default: 0.02)')
+    parser.add_argument('--execution', choices=EXECUTION_MODES, default='sequential',
+                        help="'sequential' (regressor search, then classifier search) or 'concurrent' "
+                             "(both searches in one worker pool on shared folds)")
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help='Cores for the searches and refits (default: -1, all cores)')
+    args = parser.parse_args()
+    
     # Train the models
     progress_tracker = ProgressTracker()
-    trainer = AccidentRFTrainer(progress_tracker=progress_tracker)
+    trainer = AccidentRFTrainer(progress_tracker=progress_tracker, search_mode=args.search_mode,
+                                time_budget=args.time_budget, refresh=args.refresh,
+                                refresh_tolerance=args.refresh_tolerance, execution=args.execution,
+                                n_jobs=args.n_jobs)
     
     try:
         results = trainer.train(use_time_split=True)
+        if results is None:
+            logger.info("Training cancelled; models were not updated")
+            sys.exit(1)
         
         print("\n" + "=" * 60)
         print("Training Summary")
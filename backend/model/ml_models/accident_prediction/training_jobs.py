@@ -0,0 +1,340 @@
+"""
+Durable training job queue backed by SQLite
+Serving workers enqueue retraining jobs here; a single training worker process
+(training_worker.py) claims them, runs the training script and records the outcome.
+
+Any process can read job state, so status and cancellation work no matter which
+gunicorn worker receives the request, and a job survives the worker that queued it.
+
+Configuration (environment variables):
+- TRAINING_JOBS_DB: SQLite database path (default: jobs/training_jobs.db)
+- TRAINING_JOBS_LOG_DIR: Directory for per-job log files (default: logs/training_jobs)
+"""
+
+import json
+import os
+import sqlite3
+import uuid
+from datetime import datetime, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_DB_PATH = os.getenv('TRAINING_JOBS_DB', os.path.join(current_dir, 'jobs', 'training_jobs.db'))
+DEFAULT_LOG_DIR = os.getenv('TRAINING_JOBS_LOG_DIR', os.path.join(current_dir, 'logs', 'training_jobs'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    pid INTEGER,
+    returncode INTEGER,
+    error TEXT,
+    log_path TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created_at);
+-- At most one queued/running job per kind, even with several serving processes
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_one_active ON jobs(kind) WHERE status IN ('queued', 'running');
+CREATE TABLE IF NOT EXISTS worker (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pid INTEGER,
+    started_at TEXT,
+    heartbeat_at TEXT
+);
+"""
+
+
+class JobConflictError(Exception):
+    """Raised when a job of the same kind is already queued or running"""
+
+    def __init__(self, job):
+        super().__init__(f"Job {job['id']} is already {job['status']}")
+        self.job = job
+
+
+class TrainingJobStore:
+    """SQLite-backed job records shared by the API processes and the training worker"""
+
+    def __init__(self, db_path=None, log_dir=None):
+        """
+        Initialize job store
+
+        Args:
+            db_path: SQLite database path. Default: TRAINING_JOBS_DB or jobs/training_jobs.db
+            log_dir: Directory for job log files. Default: TRAINING_JOBS_LOG_DIR or logs/training_jobs
+        """
+        self.db_path = db_path or DEFAULT_DB_PATH
+        self.log_dir = log_dir or DEFAULT_LOG_DIR
+        self._initialized = False
+
+    def exists(self):
+        """Whether the database has been created (readers skip work until then)"""
+        return os.path.exists(self.db_path)
+
+    def _connect(self):
+        """Open a connection (one per call keeps the store fork- and thread-safe)"""
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'] or '{}')
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def submit(self, kind='accident_rf', params=None):
+        """
+        Queue a new job
+
+        Returns:
+            The job record
+
+        Raises:
+            JobConflictError: A job of this kind is already queued or running
+        """
+        job_id = uuid.uuid4().hex
+        log_path = os.path.join(self.log_dir, f'{job_id}.log')
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so the active check and insert are atomic
+            conn.execute('BEGIN IMMEDIATE')
+            active = conn.execute(
+                'SELECT * FROM jobs WHERE kind = ? AND status IN (?, ?)', (kind, *ACTIVE_STATUSES)
+            ).fetchone()
+            if active is not None:
+                conn.execute('ROLLBACK')
+                raise JobConflictError(self._to_dict(active))
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, params, created_at, log_path) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, QUEUED, json.dumps(params or {}), datetime.now().isoformat(), log_path)
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Job record by ID, or None"""
+        if not self.exists():
+            return None
+        conn = self._connect()
+        try:
+            return self._to_dict(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+        finally:
+            conn.close()
+
+    def list(self, limit=20, status=None):
+        """Most recent jobs first"""
+        if not self.exists():
+            return []
+        conn = self._connect()
+        try:
+            if status:
+                rows = conn.execute(
+                    'SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?', (status, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+            return [self._to_dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def active(self, kind='accident_rf'):
+        """The queued or running job of this kind, or None"""
+        if not self.exists():
+            return None
+        conn = self._connect()
+        try:
+            return self._to_dict(conn.execute(
+                'SELECT * FROM jobs WHERE kind = ? AND status IN (?, ?)', (kind, *ACTIVE_STATUSES)
+            ).fetchone())
+        finally:
+            conn.close()
+
+    def latest_succeeded(self, kind='accident_rf'):
+        """Most recently finished successful job of this kind, or None"""
+        if not self.exists():
+            return None
+        conn = self._connect()
+        try:
+            return self._to_dict(conn.execute(
+                'SELECT * FROM jobs WHERE kind = ? AND status = ? ORDER BY finished_at DESC LIMIT 1',
+                (kind, SUCCEEDED)
+            ).fetchone())
+        finally:
+            conn.close()
+
+    def claim_next(self):
+        """
+        Move the oldest queued job to running (training worker only)
+
+        Returns:
+            The claimed job record, or None if the queue is empty
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute('ROLLBACK')
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?',
+                (RUNNING, datetime.now().isoformat(), row['id'])
+            )
+            conn.execute('COMMIT')
+            job_id = row['id']
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def set_pid(self, job_id, pid):
+        """Record the process running a job"""
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE jobs SET pid = ? WHERE id = ?', (pid, job_id))
+        finally:
+            conn.close()
+
+    def finish(self, job_id, status, returncode=None, error=None):
+        """Mark a job succeeded, failed or cancelled"""
+        if status not in FINISHED_STATUSES:
+            raise ValueError(f"Not a final job status: {status}")
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, returncode = ?, error = ? WHERE id = ?',
+                (status, datetime.now().isoformat(), returncode, error, job_id)
+            )
+        finally:
+            conn.close()
+
+    def requeue(self, job_id, error=None):
+        """Put an interrupted running job back on the queue"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, pid = NULL, started_at = NULL, error = ? WHERE id = ?',
+                (QUEUED, error, job_id)
+            )
+        finally:
+            conn.close()
+
+    def request_cancel(self, job_id):
+        """
+        Cancel a job: a queued job is cancelled immediately, a running job is
+        flagged and its process is stopped by the training worker
+
+        Returns:
+            The updated job record, or None if the job does not exist
+        """
+        if not self.exists():
+            return None
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, cancel_requested = 1 WHERE id = ? AND status = ?',
+                (CANCELLED, datetime.now().isoformat(), job_id, QUEUED)
+            )
+            conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?', (job_id, RUNNING))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def is_cancel_requested(self, job_id):
+        job = self.get(job_id)
+        return bool(job and job['cancel_requested'])
+
+    def heartbeat(self, pid, started_at=None):
+        """Record that the training worker is alive"""
+        conn = self._connect()
+        try:
+            now = datetime.now().isoformat()
+            conn.execute(
+                'INSERT INTO worker (id, pid, started_at, heartbeat_at) VALUES (1, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET pid = excluded.pid, '
+                'started_at = COALESCE(?, worker.started_at), heartbeat_at = excluded.heartbeat_at',
+                (pid, started_at or now, now, started_at)
+            )
+        finally:
+            conn.close()
+
+    def clear_worker(self, pid):
+        """Remove the worker heartbeat on clean shutdown"""
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM worker WHERE pid = ?', (pid,))
+        finally:
+            conn.close()
+
+    def worker_status(self, stale_after=30):
+        """
+        Training worker liveness
+
+        Args:
+            stale_after: Seconds without a heartbeat before the worker counts as gone
+        """
+        if not self.exists():
+            return {'alive': False, 'pid': None, 'heartbeat_at': None}
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM worker WHERE id = 1').fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return {'alive': False, 'pid': None, 'heartbeat_at': None}
+        heartbeat_at = datetime.fromisoformat(row['heartbeat_at'])
+        return {
+            'alive': datetime.now() - heartbeat_at < timedelta(seconds=stale_after),
+            'pid': row['pid'],
+            'started_at': row['started_at'],
+            'heartbeat_at': row['heartbeat_at']
+        }
+
+    def read_log(self, job_id, tail=None):
+        """
+        Contents of a job's log file
+
+        Args:
+            tail: Only return the last N lines
+
+        Returns:
+            Log text, or None if the job or its log does not exist
+        """
+        job = self.get(job_id)
+        if not job or not job['log_path'] or not os.path.exists(job['log_path']):
+            return None
+        with open(job['log_path'], 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.readlines()
+        if tail:
+            lines = lines[-tail:]
+        return ''.join(lines)
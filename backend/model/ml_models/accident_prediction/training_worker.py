@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Training worker for the accident prediction model
+Claims queued jobs from the SQLite job store (training_jobs.py) one at a time and
+runs train_rf_model.py in its own process group, streaming its output to the job's
+log file. Cancellation and timeouts stop the whole process group.
+
+Only one worker runs per job database (guarded by a lock file). Serving processes
+pick up the new model themselves once a job succeeds.
+
+Usage:
+    python training_worker.py          # run until stopped (systemd service)
+    python training_worker.py --once   # drain the queue, then exit
+
+Configuration (environment variables):
+- TRAINING_JOB_TIMEOUT_SECONDS: Stop a job after this long (default: 3600)
+- TRAINING_WORKER_POLL_SECONDS: Queue/cancellation poll interval (default: 1)
+- TRAINING_WORKER_KILL_GRACE_SECONDS: Wait after SIGTERM before SIGKILL (default: 10)
+"""
+
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, run a single worker by hand
+    fcntl = None
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from training_jobs import TrainingJobStore, QUEUED, SUCCEEDED, FAILED, CANCELLED
+from progress_tracker import ProgressTracker
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOB_TIMEOUT_SECONDS = int(os.getenv('TRAINING_JOB_TIMEOUT_SECONDS', '3600'))
+POLL_SECONDS = float(os.getenv('TRAINING_WORKER_POLL_SECONDS', '1'))
+KILL_GRACE_SECONDS = float(os.getenv('TRAINING_WORKER_KILL_GRACE_SECONDS', '10'))
+MAX_ATTEMPTS = 2
+
+TRAIN_SCRIPT = os.path.join(current_dir, 'train_rf_model.py')
+
+
+def process_alive(pid):
+    """Whether a process with this PID exists"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def is_job_process(pid, job_id):
+    """
+    Whether pid is still the training process of job_id, leading its own process group
+
+    A pid stored before a crash or reboot may belong to an unrelated process by now;
+    the job's process carries TRAINING_JOB_ID in its environment. Without /proc (or
+    permission to read it) the process cannot be identified and is not ours.
+    """
+    if not process_alive(pid):
+        return False
+    try:
+        with open(f'/proc/{pid}/environ', 'rb') as environ_file:
+            environ = environ_file.read().split(b'\0')
+        if os.getpgid(pid) != pid:
+            return False
+    except (OSError, AttributeError):
+        return False
+    return f'TRAINING_JOB_ID={job_id}'.encode() in environ
+
+
+def stop_process_group(pid, grace=KILL_GRACE_SECONDS):
+    """SIGTERM a job's process group, then SIGKILL whatever is left after the grace period"""
+    if os.name != 'posix':
+        if process_alive(pid):
+            os.kill(pid, signal.SIGTERM)
+        return
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline:
+        try:
+            os.killpg(pid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.1)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class TrainingWorker:
+    """Runs queued training jobs one after another"""
+
+    def __init__(self, store=None, command=None, progress_tracker=None,
+                 timeout=None, poll_interval=None, kill_grace=None):
+        """
+        Initialize training worker
+
+        Args:
+            store: TrainingJobStore (default: shared database)
+            command: Command line for a job (default: this interpreter running train_rf_model.py)
+            progress_tracker: ProgressTracker used by the training script (default: training_progress.json)
+            timeout: Seconds before a job is stopped. Default: TRAINING_JOB_TIMEOUT_SECONDS or 3600
+            poll_interval: Seconds between queue/cancellation checks. Default: TRAINING_WORKER_POLL_SECONDS or 1
+            kill_grace: Seconds between SIGTERM and SIGKILL. Default: TRAINING_WORKER_KILL_GRACE_SECONDS or 10
+        """
+        self.store = store or TrainingJobStore()
+        self.command = command or [sys.executable, TRAIN_SCRIPT]
+        self.progress_tracker = progress_tracker or ProgressTracker()
+        self.timeout = JOB_TIMEOUT_SECONDS if timeout is None else timeout
+        self.poll_interval = POLL_SECONDS if poll_interval is None else poll_interval
+        self.kill_grace = KILL_GRACE_SECONDS if kill_grace is None else kill_grace
+        self.pid = os.getpid()
+        self.started_at = datetime.now().isoformat()
+        self._lock_file = None
+        self._stopping = False
+
+    def acquire_lock(self):
+        """
+        Take the single-worker lock for this job database
+
+        Returns:
+            False if another worker already holds it
+        """
+        if fcntl is None:
+            return True
+        lock_path = f"{self.store.db_path}.worker.lock"
+        os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+        self._lock_file = open(lock_path, 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def release_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def recover_interrupted(self):
+        """
+        Handle jobs left 'running' by a worker that died: stop any training process
+        still alive, then requeue the job once or mark it failed
+        """
+        for job in self.store.list(limit=100, status='running'):
+            if is_job_process(job['pid'], job['id']):
+                logger.warning(f"Stopping orphaned training process {job['pid']} of job {job['id']}")
+                stop_process_group(job['pid'], self.kill_grace)
+            elif process_alive(job['pid']):
+                logger.warning(f"Not stopping process {job['pid']}: it is no longer the training process of job {job['id']}")
+            if job['cancel_requested']:
+                self.store.finish(job['id'], CANCELLED, error='Cancelled while the worker was down')
+            elif job['attempts'] < MAX_ATTEMPTS:
+                logger.info(f"Requeueing interrupted job {job['id']}")
+                self.store.requeue(job['id'], error='Interrupted by a worker restart; requeued')
+            else:
+                self.store.finish(job['id'], FAILED, error='Interrupted by a worker restart')
+
+    def run_job(self, job):
+        """
+        Run one claimed job to completion, cancellation or timeout
+
+        Returns:
+            The job's final status
+        """
+        job_id = job['id']
+        os.makedirs(os.path.dirname(job['log_path']), exist_ok=True)
+        logger.info(f"Starting job {job_id} (log: {job['log_path']})")
+        self.progress_tracker.reset()
+        self.progress_tracker.update(0, "Starting", 0, "Initializing training process...", details={'job_id': job_id})
+
+        env = dict(os.environ, PYTHONUNBUFFERED='1', TRAINING_JOB_ID=job_id)
+        with open(job['log_path'], 'ab') as log_file:
+            process = subprocess.Popen(
+                self.command + job['params'].get('args', []),
+                cwd=current_dir,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                env=env,
+                # Own process group: cancellation also stops joblib/loky children
+                start_new_session=(os.name == 'posix')
+            )
+        self.store.set_pid(job_id, process.pid)
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        last_heartbeat = time.monotonic()
+        while True:
+            try:
+                returncode = process.wait(timeout=self.poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if time.monotonic() - last_heartbeat >= 5:
+                self.store.heartbeat(self.pid, self.started_at)
+                last_heartbeat = time.monotonic()
+            if self.store.is_cancel_requested(job_id):
+                stop_process_group(process.pid, self.kill_grace)
+                process.wait()
+                self.store.finish(job_id, CANCELLED, returncode=process.returncode, error='Cancelled by user')
+                self.progress_tracker.cancel()
+                logger.info(f"Job {job_id} cancelled")
+                return CANCELLED
+            if self._stopping:
+                # Worker is shutting down: stop training and leave the job for the next worker
+                stop_process_group(process.pid, self.kill_grace)
+                process.wait()
+                self.store.requeue(job_id, error='Worker shut down during training; requeued')
+                logger.info(f"Job {job_id} requeued (worker shutting down)")
+                return QUEUED
+            if deadline is not None and time.monotonic() > deadline:
+                stop_process_group(process.pid, self.kill_grace)
+                process.wait()
+                error = f'Training timed out after {self.timeout} seconds'
+                self.store.finish(job_id, FAILED, returncode=process.returncode, error=error)
+                self.progress_tracker.complete(success=False, message=error, details={'error': error, 'job_id': job_id})
+                logger.error(f"Job {job_id}: {error}")
+                return FAILED
+
+        if returncode != 0:
+            error = f'Training exited with code {returncode}; see the job log'
+            self.store.finish(job_id, FAILED, returncode=returncode, error=error)
+            self.progress_tracker.complete(success=False, message="Training failed",
+                                           details={'error': error, 'job_id': job_id})
+            logger.error(f"Job {job_id} failed with exit code {returncode}")
+            return FAILED
+
+        self.store.finish(job_id, SUCCEEDED, returncode=0)
+        progress = self.progress_tracker.get() or {}
+        self.progress_tracker.complete(
+            success=True,
+            message="Model retrained successfully; serving processes reload it automatically",
+            details=dict(progress.get('details') or {}, job_id=job_id)
+        )
+        logger.info(f"Job {job_id} succeeded")
+        return SUCCEEDED
+
+    def run(self, once=False):
+        """
+        Process jobs until stopped (or until the queue is empty with once=True)
+
+        Returns:
+            Number of jobs run, or None if another worker holds the lock
+        """
+        if not self.acquire_lock():
+            logger.info("Another training worker is already running")
+            return None
+        try:
+            signal.signal(signal.SIGTERM, self._handle_stop)
+        except ValueError:
+            pass  # Not the main thread (e.g. tests); rely on the caller to stop us
+        jobs_run = 0
+        try:
+            self.store.heartbeat(self.pid, self.started_at)
+            self.recover_interrupted()
+            while not self._stopping:
+                job = self.store.claim_next()
+                if job is None and once:
+                    # Look once more after clearing the heartbeat: the worker spawned for a
+                    # job submitted just now exits on our lock, so the job is ours to run
+                    self.store.clear_worker(self.pid)
+                    job = self.store.claim_next()
+                    if job is None:
+                        break
+                    self.store.heartbeat(self.pid, self.started_at)
+                if job is None:
+                    self.store.heartbeat(self.pid, self.started_at)
+                    time.sleep(self.poll_interval)
+                    continue
+                try:
+                    self.run_job(job)
+                except Exception as e:
+                    logger.exception(f"Job {job['id']} could not be run")
+                    self.store.finish(job['id'], FAILED, error=str(e))
+                jobs_run += 1
+        finally:
+            self.store.clear_worker(self.pid)
+            self.release_lock()
+        return jobs_run
+
+    def _handle_stop(self, signum, frame):
+        logger.info("Stop requested; finishing the current poll")
+        self._stopping = True
+
+
+def spawn_worker():
+    """
+    Start a detached `training_worker.py --once` process (used by the API after each
+    submitted job). It exits immediately if another worker holds the lock.
+    """
+    kwargs = {'start_new_session': True} if os.name == 'posix' else {}
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--once'],
+        cwd=current_dir,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        **kwargs
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Accident prediction training worker')
+    parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+    args = parser.parse_args()
+    TrainingWorker().run(once=args.once)
@@ -0,0 +1,3 @@
+"""
+Modules shared by the accident prediction and MV registration services
+"""
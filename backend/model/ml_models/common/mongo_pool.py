@@ -0,0 +1,178 @@
+"""
+Process-wide pooled MongoDB client
+Shares one MongoClient (and its connection pool) per connection string and
+process, instead of opening a new client for every request.
+
+The client is created lazily on first use, so a gunicorn master that imports
+the app before forking never hands its sockets to the workers. A client
+created in another process (i.e. inherited through fork) is discarded and
+rebuilt in the child.
+
+Configuration (environment variables):
+- MONGO_MAX_POOL_SIZE: Maximum connections per server (default: 50)
+- MONGO_MIN_POOL_SIZE: Connections kept open while idle (default: 0)
+- MONGO_MAX_IDLE_TIME_MS: Close pooled connections idle this long (default: 300000)
+- MONGO_SERVER_SELECTION_TIMEOUT_MS: Wait for a usable server (default: 5000)
+- MONGO_CONNECT_TIMEOUT_MS: TCP connect timeout (default: 10000)
+- MONGO_SOCKET_TIMEOUT_MS: Per-operation socket timeout, 0 for none (default: 0)
+"""
+
+import os
+import threading
+import logging
+
+from pymongo import MongoClient
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '300000'))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '10000'))
+SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '0'))
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events for the health endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checked_in = 0
+            self.checkout_failures = 0
+            self.pools_cleared = 0
+
+    def _bump(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def connection_created(self, event):
+        self._bump('created')
+
+    def connection_closed(self, event):
+        self._bump('closed')
+
+    def connection_checked_out(self, event):
+        self._bump('checked_out')
+
+    def connection_checked_in(self, event):
+        self._bump('checked_in')
+
+    def connection_check_out_failed(self, event):
+        self._bump('checkout_failures')
+
+    def pool_cleared(self, event):
+        self._bump('pools_cleared')
+
+    # Remaining events are not tracked
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'open_connections': self.created - self.closed,
+                'in_use': self.checked_out - self.checked_in,
+                'connections_created': self.created,
+                'checkouts': self.checked_out,
+                'checkout_failures': self.checkout_failures,
+                'pools_cleared': self.pools_cleared
+            }
+
+
+_clients = {}
+_owner_pid = None
+_lock = threading.Lock()
+_stats = PoolStatsListener()
+
+
+def _reset_after_fork():
+    """Forget the parent's clients and lock in a freshly forked child"""
+    global _clients, _owner_pid, _lock
+    _clients = {}
+    _owner_pid = None
+    _lock = threading.Lock()
+    _stats.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client(mongo_uri):
+    """
+    Return the pooled MongoClient for mongo_uri, creating it on first use
+
+    Callers must not close the returned client; it is shared by the process.
+    """
+    global _owner_pid
+    pid = os.getpid()
+    with _lock:
+        if _owner_pid != pid:
+            # Clients inherited from another process are unusable; drop without closing
+            _clients.clear()
+            _owner_pid = pid
+
+        client = _clients.get(mongo_uri)
+        if client is None:
+            client = MongoClient(
+                mongo_uri,
+                maxPoolSize=MAX_POOL_SIZE,
+                minPoolSize=MIN_POOL_SIZE,
+                maxIdleTimeMS=MAX_IDLE_TIME_MS,
+                serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=SOCKET_TIMEOUT_MS or None,
+                event_listeners=[_stats],
+                connect=False
+            )
+            _clients[mongo_uri] = client
+            logger.info(f"Created pooled MongoDB client (pid {pid}, maxPoolSize {MAX_POOL_SIZE})")
+        return client
+
+
+def close_all():
+    """Close every pooled client owned by this process (shutdown and tests)"""
+    global _owner_pid
+    with _lock:
+        if _owner_pid == os.getpid():
+            for client in _clients.values():
+                client.close()
+        _clients.clear()
+        _owner_pid = None
+
+
+def pool_stats():
+    """Pool configuration and connection counters for this process"""
+    with _lock:
+        clients = len(_clients) if _owner_pid == os.getpid() else 0
+    stats = {
+        'pid': os.getpid(),
+        'clients': clients,
+        'max_pool_size': MAX_POOL_SIZE,
+        'min_pool_size': MIN_POOL_SIZE,
+        'max_idle_time_ms': MAX_IDLE_TIME_MS,
+        'server_selection_timeout_ms': SERVER_SELECTION_TIMEOUT_MS
+    }
+    stats.update(_stats.snapshot())
+    return stats
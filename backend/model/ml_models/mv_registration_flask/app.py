@@ -13,10 +13,14 @@ Uses optimized SARIMA model with:
 - Enhanced metrics (MAE, RMSE, MAPE, R²)
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 import traceback
 from werkzeug.utils import secure_filename
@@ -60,10 +64,12 @@ if not env_loaded:
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sarima_model_optimized import OptimizedSARIMAModel
+from forecast_table import FORECAST_TABLE_DAYS
 from data_preprocessor_daily import DailyDataPreprocessor
 from mongo_to_csv_exporter import export_mongo_to_csv
 from barangay_predictor import BarangayPredictor
-from config import ENABLE_PER_MUNICIPALITY, DAVAO_ORIENTAL_MUNICIPALITIES, MIN_WEEKS_FOR_MUNICIPALITY_MODEL
+from config import (ENABLE_PER_MUNICIPALITY, DAVAO_ORIENTAL_MUNICIPALITIES, MIN_WEEKS_FOR_MUNICIPALITY_MODEL,
+                    REGIONAL_FORECAST_WORKERS, REGIONAL_FORECAST_TIMEOUT_SECONDS)
 
 def convert_to_native_types(obj):
     """
@@ -99,6 +105,17 @@ def convert_to_native_types(obj):
     else:
         return obj
 
+
+def wants_stream():
+    """Whether the client asked for NDJSON streaming (?stream=1)"""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def ndjson_line(record):
+    """One NDJSON line (JSON object plus newline)"""
+    return json.dumps(convert_to_native_types(record), ensure_ascii=False) + '\n'
+
+
 app = Flask(__name__)
 # Set maximum upload size to 50MB
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
@@ -132,6 +149,186 @@ aggregated_model = None  # Main aggregated model (always used)
 municipality_models = {}  # Dictionary of per-municipality models (when enabled)
 preprocessor = None
 barangay_predictor = None  # Barangay-level predictor
+# Serving processes (gunicorn.conf.py exports its worker count; 1 for the Flask server)
+SERVING_WORKERS = int(os.getenv('WEB_CONCURRENCY', '1'))
+forecast_exog = None  # Exogenous variables for the full forecast horizon (see precompute_forecasts)
+
+# CRITICAL FIX: Force July 31, 2025 as the last training date
+# The test date range ends on July 31, 2025, so ALL predictions must start from August 1, 2025
+# This ensures consistency across all municipalities regardless of when their individual models were trained
+FORECAST_LAST_DATE = pd.Timestamp(year=2025, month=7, day=31)
+# First day of the next month (same logic as in OptimizedSARIMAModel.predict())
+if FORECAST_LAST_DATE.month == 12:
+    FORECAST_START_DATE = pd.Timestamp(year=FORECAST_LAST_DATE.year + 1, month=1, day=1)
+else:
+    FORECAST_START_DATE = pd.Timestamp(year=FORECAST_LAST_DATE.year, month=FORECAST_LAST_DATE.month + 1, day=1)
+
+
+def forecast_exogenous(days):
+    """
+    Exogenous variables for `days` days from FORECAST_START_DATE, indexed by date
+    (a slice of the precomputed horizon when it is long enough)
+    """
+    if forecast_exog is not None and days <= len(forecast_exog):
+        return forecast_exog.iloc[:days]
+    future_dates = pd.date_range(
+        start=FORECAST_START_DATE,
+        periods=days,
+        freq='D'
+    )
+    future_exog = preprocessor._create_exogenous_variables(future_dates)
+    return future_exog[['is_weekend_or_holiday']]  # Use only the combined indicator
+
+
+_forecast_executor = None
+_forecast_executor_pid = None
+_forecast_executor_lock = threading.Lock()
+# Model -> forecast that timed out while running; it holds a pool thread until it returns
+_stalled_forecasts = {}
+_stalled_forecasts_lock = threading.Lock()
+
+
+def forecast_executor():
+    """
+    Thread pool for regional forecasts, created on first use in the process that
+    uses it (threads do not survive the fork of a preloading gunicorn master)
+    """
+    global _forecast_executor, _forecast_executor_pid
+    with _forecast_executor_lock:
+        if _forecast_executor is None or _forecast_executor_pid != os.getpid():
+            _forecast_executor = ThreadPoolExecutor(max_workers=max(1, REGIONAL_FORECAST_WORKERS),
+                                                    thread_name_prefix='regional-forecast')
+            _forecast_executor_pid = os.getpid()
+            _stalled_forecasts.clear()
+        return _forecast_executor
+
+
+def timed_predict(model, days, exogenous):
+    """model.predict() and the seconds it took"""
+    start = time.perf_counter()
+    predictions = model.predict(days=days, exogenous=exogenous)
+    return predictions, time.perf_counter() - start
+
+
+def submit_forecasts(models, forecast):
+    """
+    Submit forecast(name, model) for each model to the pool, skipping models whose
+    timed-out forecast from an earlier request is still running
+    
+    A running forecast cannot be stopped, so a hung model would otherwise take one
+    more pool thread with every request until the pool is exhausted.
+    
+    Returns:
+        Dict of future -> municipality for the submitted models
+    """
+    executor = forecast_executor()
+    futures = {}
+    with _stalled_forecasts_lock:
+        for model, future in list(_stalled_forecasts.items()):
+            if future.done():
+                del _stalled_forecasts[model]
+        if len(_stalled_forecasts) >= max(1, REGIONAL_FORECAST_WORKERS):
+            logger.warning(
+                f"Regional forecast pool saturated: all {max(1, REGIONAL_FORECAST_WORKERS)} threads are held "
+                f"by timed-out forecasts; other municipalities are skipped until they return"
+            )
+        for name, model in models.items():
+            if model in _stalled_forecasts:
+                logger.warning(f"Skipping municipality '{name}': its timed-out forecast is still running")
+            else:
+                futures[executor.submit(forecast, name, model)] = name
+    return futures
+
+
+def predict_municipalities(models, days, exogenous):
+    """
+    Forecast every municipality model on the regional forecast pool
+    
+    Each model gets REGIONAL_FORECAST_TIMEOUT_SECONDS to obtain a pool thread and
+    the same again to run once it has one, so a slow model does not use up the
+    others' time. A model that raises or misses either deadline is logged and left
+    out. A timed-out forecast that already started cannot be stopped: it keeps its
+    pool thread until it returns, and later requests leave the model out until then.
+    
+    Args:
+        models: Dict of municipality name -> OptimizedSARIMAModel
+        days: Number of days to predict
+        exogenous: Future exogenous variables (DataFrame with DatetimeIndex)
+        
+    Returns:
+        List of (municipality, predictions) in the order of models
+    """
+    timeout = REGIONAL_FORECAST_TIMEOUT_SECONDS
+    start = time.perf_counter()
+    started = {}  # Municipality -> time its forecast got a pool thread
+    
+    def forecast(name, model):
+        started[name] = time.perf_counter()
+        return timed_predict(model, days, exogenous)
+    
+    pending = submit_forecasts(models, forecast)
+    outcomes = {}
+    timings = {}
+    while pending:
+        now = time.perf_counter()
+        for future, name in list(pending.items()):
+            if future.done() or now < started.get(name, start) + timeout:
+                continue
+            if name not in started:
+                if future.cancel():
+                    del pending[future]
+                    logger.warning(f"Skipping municipality '{name}': no free forecast thread within {timeout:g}s")
+                else:
+                    started.setdefault(name, now)  # Just picked up; its own deadline starts now
+                continue
+            del pending[future]
+            with _stalled_forecasts_lock:
+                _stalled_forecasts[models[name]] = future
+            logger.warning(f"Timed out generating predictions for municipality '{name}' after {timeout:g}s")
+        if not pending:
+            break
+        
+        next_deadline = min(started.get(name, start) + timeout for name in pending.values())
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            try:
+                outcomes[name], timings[name] = future.result()
+            except Exception as e:
+                logger.warning(f"Failed to generate predictions for municipality '{name}': {str(e)}")
+    
+    results = [(name, outcomes[name]) for name in models if name in outcomes]
+    if timings:
+        slowest = max(timings, key=timings.get)
+        logger.info(
+            f"Regional forecast: {len(results)}/{len(models)} municipality models in "
+            f"{(time.perf_counter() - start) * 1e3:.1f} ms (slowest {slowest}: {timings[slowest] * 1e3:.1f} ms)"
+        )
+        logger.info("Per-municipality forecast times: " +
+                    ", ".join(f"{name} {timings[name] * 1e3:.1f} ms" for name, _ in results))
+    return results
+
+
+def precompute_forecast(model):
+    """Precompute a model's 52-week forecast; on failure it keeps forecasting per request"""
+    try:
+        model.precompute_forecast(forecast_exogenous(FORECAST_TABLE_DAYS), days=FORECAST_TABLE_DAYS)
+    except Exception as e:
+        logger.warning(f"Could not precompute forecast for {model.municipality or 'aggregated'} model: {str(e)}")
+
+
+def precompute_forecasts():
+    """
+    Forecast the full 52-week horizon of every loaded model once, so prediction
+    requests for any number of weeks slice the stored forecast instead of
+    running the state-space forecast again
+    """
+    global forecast_exog
+    forecast_exog = None
+    forecast_exog = forecast_exogenous(FORECAST_TABLE_DAYS)
+    for model in [aggregated_model] + list(municipality_models.values()):
+        precompute_forecast(model)
+    logger.info(f"Precomputed {FORECAST_TABLE_DAYS}-day forecasts for {1 + len(municipality_models)} model(s)")
 
 def initialize_model():
     """Initialize the Optimized SARIMA model(s) and preprocessor with daily data"""
@@ -194,6 +391,9 @@ def initialize_model():
         barangay_predictor = BarangayPredictor(csv_path)
         logger.info("Barangay predictor initialized")
         
+        # Daily series of every municipality, read from the CSVs (once) when a model has to be trained
+        municipality_series = None
+        
         # Initialize aggregated model (always needed) - using optimized version
         logger.info("Initializing optimized aggregated model...")
         aggregated_model = OptimizedSARIMAModel(
@@ -209,10 +409,11 @@ def initialize_model():
         else:
             logger.info("Training new optimized aggregated model...")
             # Load daily data with exogenous variables
-            daily_data, exogenous_vars, processing_info = preprocessor.load_and_process_daily_data(
+            aggregated_series, municipality_series = preprocessor.load_all_daily_series(
                 fill_missing_days=True,
                 fill_method='zero'
             )
+            daily_data, exogenous_vars, processing_info = aggregated_series
             # Train with richer exogenous variables (weekends/holidays + schedule-based features)
             exog_cols = [
                 'is_weekend_or_holiday',
@@ -253,11 +454,14 @@ def initialize_model():
                     else:
                         # Try to train if data is available
                         try:
-                            daily_data, exogenous_vars, processing_info = preprocessor.load_and_process_daily_data(
-                                fill_missing_days=True,
-                                fill_method='zero',
-                                municipality=municipality
-                            )
+                            if municipality_series is None:
+                                _, municipality_series = preprocessor.load_all_daily_series(
+                                    fill_missing_days=True,
+                                    fill_method='zero'
+                                )
+                            if municipality.upper() not in municipality_series:
+                                raise ValueError(f"No data found for municipality '{municipality}'")
+                            daily_data, exogenous_vars, processing_info = municipality_series[municipality.upper()]
                             
                             # Check if we have enough data
                             if len(daily_data) >= MIN_WEEKS_FOR_MUNICIPALITY_MODEL * 7:  # Convert weeks to days
@@ -281,6 +485,8 @@ def initialize_model():
         else:
             logger.info("Per-municipality mode disabled. Using aggregated optimized model only.")
         
+        precompute_forecasts()
+        
         logger.info("Optimized model initialized successfully!")
         return True
     except Exception as e:
@@ -346,33 +552,16 @@ def predict_registrations():
                 )
                 logger.info(f"Available municipality models: {list(municipality_models.keys())}")
         
-        # CRITICAL FIX: Force July 31, 2025 as the last training date
-        # The test date range ends on July 31, 2025, so ALL predictions must start from August 1, 2025
-        # This ensures consistency across all municipalities regardless of when their individual models were trained
-        actual_last_date = pd.Timestamp(year=2025, month=7, day=31)
+        # All predictions start from FORECAST_START_DATE (August 1, 2025), the month after FORECAST_LAST_DATE
+        actual_last_date = FORECAST_LAST_DATE
+        next_month_start = FORECAST_START_DATE
         logger.info(f"Using hardcoded actual_last_date: {actual_last_date} (test date range end: July 31, 2025)")
-        logger.info(f"This ensures all predictions start from August 1, 2025 (next month after last training data)")
-        
-        # Calculate the first day of the next month (same logic as in OptimizedSARIMAModel.predict())
-        if actual_last_date.month == 12:
-            next_month_start = pd.Timestamp(year=actual_last_date.year + 1, month=1, day=1)
-        else:
-            next_month_start = pd.Timestamp(year=actual_last_date.year, month=actual_last_date.month + 1, day=1)
-        
-        logger.info(f"Actual last registration date: {actual_last_date}")
-        logger.info(f"First day of next month: {next_month_start}")
         logger.info(f"Generating exogenous variables for dates starting from: {next_month_start}")
         
-        # Create future dates for exogenous variables starting from first day of next month
-        future_dates = pd.date_range(
-            start=next_month_start,
-            periods=days,
-            freq='D'
-        )
-        
-        # Create future exogenous variables
-        future_exog = preprocessor._create_exogenous_variables(future_dates)
-        future_exog = future_exog[['is_weekend_or_holiday']]  # Use only the combined indicator
+        # Future exogenous variables (sliced from the precomputed horizon, which the
+        # models' precomputed forecasts were made with)
+        future_exog = forecast_exogenous(days)
+        future_dates = future_exog.index
         
         # CRITICAL: Ensure future_exog has a DatetimeIndex so the model can use these dates
         # This ensures all models (aggregated and municipality-specific) use the same prediction dates
@@ -418,16 +607,7 @@ def predict_registrations():
                 f"{global_first_week_start_str}"
             )
             
-            for mun_name, mun_model in municipality_models.items():
-                try:
-                    logger.info(f"Generating predictions for municipality: {mun_name}")
-                    mun_predictions = mun_model.predict(days=days, exogenous=future_exog)
-                except Exception as e:
-                    logger.warning(
-                        f"Failed to generate predictions for municipality '{mun_name}': {str(e)}"
-                    )
-                    continue
-                
+            for mun_name, mun_predictions in predict_municipalities(municipality_models, days, future_exog):
                 # Track earliest prediction_start_date for informational purposes
                 if not prediction_start_date:
                     prediction_start_date = mun_predictions.get('prediction_start_date')
@@ -614,6 +794,36 @@ def predict_registrations():
             'traceback': traceback.format_exc()
         }), 500
 
+def stream_barangay_registrations(mun_predictions, municipality, prediction_dates, weeks):
+    """
+    NDJSON generator for /api/predict/registrations/barangay?stream=1
+    Yields each barangay prediction as it is distributed, then a summary record
+    """
+    municipality_summary = {}
+    total_records = 0
+    try:
+        for pred in barangay_predictor.iter_barangay_registrations(mun_predictions, municipality=municipality):
+            brgy_summary = municipality_summary.setdefault(pred['municipality'], {}).setdefault(
+                pred['barangay'], {'total_predicted': 0}
+            )
+            brgy_summary['total_predicted'] += pred['predicted_count']
+            total_records += 1
+            yield ndjson_line(dict(pred, type='prediction'))
+    except Exception as e:
+        logger.error(f"Error streaming barangay registrations: {str(e)}")
+        yield ndjson_line({'type': 'error', 'success': False, 'error': str(e)})
+        return
+    
+    yield ndjson_line({
+        'type': 'summary',
+        'success': True,
+        'municipality_summary': municipality_summary,
+        'prediction_dates': prediction_dates,
+        'weeks': weeks,
+        'municipality': municipality,
+        'total_records': total_records
+    })
+
 @app.route('/api/predict/registrations/barangay', methods=['GET'])
 def predict_barangay_registrations():
     """
@@ -623,6 +833,9 @@ def predict_barangay_registrations():
     - weeks (int, optional): Number of weeks to predict (default: 4, max: 52)
     - municipality (str, optional): Specific municipality name (e.g., "CITY OF MATI", "LUPON")
       If not provided, returns predictions for all municipalities
+    - stream (optional): 1 to stream application/x-ndjson, one {"type": "prediction", ...}
+      object per line as barangays are distributed, then a {"type": "summary", ...} line
+      with prediction_dates and per-barangay totals
     
     Returns:
     - barangay_predictions: List of barangay-level predictions
@@ -669,15 +882,14 @@ def predict_barangay_registrations():
         daily_preds = result['daily_predictions']
         
         # Group by week (Sunday to Saturday)
+        dates = pd.to_datetime([pred['date'] for pred in daily_preds])
+        # Get the Sunday of each week (dayofweek: 0=Monday, 6=Sunday)
+        # Calculate days to subtract to get to Sunday
+        days_to_sunday = (dates.dayofweek + 1) % 7
+        week_keys = (dates - pd.to_timedelta(days_to_sunday, unit='D')).strftime('%Y-%m-%d')
+        
         weekly_predictions = {}
-        for pred in daily_preds:
-            date = pd.to_datetime(pred['date'])
-            # Get the Sunday of that week (weekday: 0=Monday, 6=Sunday)
-            # Calculate days to subtract to get to Sunday
-            days_to_sunday = (date.weekday() + 1) % 7
-            week_start = date - pd.Timedelta(days=days_to_sunday)
-            week_key = week_start.strftime('%Y-%m-%d')
-            
+        for week_key, pred in zip(week_keys, daily_preds):
             if week_key not in weekly_predictions:
                 weekly_predictions[week_key] = {
                     'municipality': municipality_upper or 'ALL',
@@ -699,6 +911,14 @@ def predict_barangay_registrations():
         if municipality_upper:
             mun_predictions = {m: v for m, v in mun_predictions.items() if m == municipality_upper or m == 'ALL'}
         
+        if wants_stream():
+            return Response(
+                stream_with_context(stream_barangay_registrations(
+                    mun_predictions, municipality_upper, list(weekly_predictions.keys()), weeks
+                )),
+                mimetype='application/x-ndjson'
+            )
+        
         # Distribute to barangays
         barangay_predictions = barangay_predictor.predict_barangay_registrations(
             mun_predictions,
@@ -939,11 +1159,21 @@ def retrain_model():
     Optional JSON Body:
     - force (bool): Force retrain even if model exists (default: false)
     
+    Training runs inside this request and only this process reloads the models,
+    so it is refused (409) when several workers serve; under gunicorn it must
+    finish within GUNICORN_TIMEOUT.
+    
     Returns:
     - success: Boolean indicating success
     - message: Status message
     - training_info: Information about the training process (including CV results)
     """
+    if SERVING_WORKERS > 1:
+        return jsonify({
+            'success': False,
+            'error': f'Retraining only reloads the worker that receives it; run a single worker '
+                     f'(WEB_CONCURRENCY=1) to retrain through the API ({SERVING_WORKERS} workers are serving)'
+        }), 409
     try:
         if aggregated_model is None or preprocessor is None:
             return jsonify({
@@ -999,6 +1229,7 @@ def retrain_model():
                 force=force,
                 processing_info=processing_info
             )
+            precompute_forecast(mun_model)
             
             # Add processing info to training results
             if training_info:
@@ -1066,6 +1297,7 @@ def retrain_model():
                 force=force,
                 processing_info=processing_info
             )
+            precompute_forecast(aggregated_model)
             
             # Add processing info to training results
             if training_info:
@@ -7,9 +7,37 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import logging
+import os
+from registration_snapshot import list_csv_files, load_registrations, snapshot_key
 
 logger = logging.getLogger(__name__)
 
+
+def largest_remainder_counts(totals, proportions):
+    """
+    Split each total into whole counts by proportion, summing exactly to the total
+    Every count starts at floor(total * proportion); the units still missing go to
+    the largest fractional parts (ties to the earlier column).
+    
+    Args:
+        totals: Totals to split, one per row (rounded to whole counts)
+        proportions: Proportion per column (summing to 1)
+    
+    Returns:
+        int64 array of shape (len(totals), len(proportions))
+    """
+    totals = np.rint(np.asarray(totals, dtype=float)).astype(np.int64)
+    shares = np.outer(totals, np.asarray(proportions, dtype=float))
+    counts = np.floor(shares)
+    missing = totals - counts.sum(axis=1).astype(np.int64)
+    
+    # Rank of each fractional part within its row, largest first
+    order = np.argsort(counts - shares, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(shares.shape[1]), axis=1)
+    return counts.astype(np.int64) + (ranks < missing[:, None])
+
+
 class BarangayPredictor:
     """
     Predicts vehicle registrations at barangay level using hierarchical approach:
@@ -26,34 +54,20 @@ class BarangayPredictor:
             csv_path: Path to CSV file with vehicle registration data
         """
         self.csv_path = csv_path
-        self.barangay_proportions = {}  # Cache for barangay proportions
+        # Cache for barangay proportions: (lookback_days, per-municipality window) -> proportions
+        self.barangay_proportions = {}
+        self._proportions_key = None  # Snapshot key of the CSV files the cache was computed from
         
     def load_barangay_data(self):
         """
-        Load and process barangay-level data from CSV
+        Load and process barangay-level data from CSV (through the registration snapshot)
         
         Returns:
             DataFrame with barangay, municipality, date, and count columns
         """
         try:
             import os
-            csv_dir = os.path.dirname(self.csv_path)
-            all_csv_files = [f for f in os.listdir(csv_dir) if f.endswith('.csv')]
-            
-            dfs = []
-            for csv_file in all_csv_files:
-                csv_path = os.path.join(csv_dir, csv_file)
-                try:
-                    df_temp = pd.read_csv(csv_path)
-                    dfs.append(df_temp)
-                except Exception as e:
-                    logger.warning(f"Could not load {csv_file}: {str(e)}")
-                    continue
-            
-            if not dfs:
-                raise ValueError("No valid CSV files could be loaded")
-            
-            df = pd.concat(dfs, ignore_index=True)
+            df, _ = load_registrations(os.path.dirname(self.csv_path))
             
             # Validate required columns
             required_columns = ['dateOfRenewal', 'address_municipality', 'address_barangay']
@@ -61,13 +75,6 @@ class BarangayPredictor:
             if missing_columns:
                 raise ValueError(f"CSV missing required columns: {', '.join(missing_columns)}")
             
-            # Parse dates
-            df['dateOfRenewal_parsed'] = pd.to_datetime(
-                df['dateOfRenewal'],
-                format='%m/%d/%Y',
-                errors='coerce'
-            )
-            
             # Drop rows with invalid dates or missing barangay
             df = df.dropna(subset=['dateOfRenewal_parsed', 'address_barangay'])
             
@@ -85,54 +92,147 @@ class BarangayPredictor:
         """
         Calculate historical proportions of registrations per barangay within each municipality
         
+        Proportions of all municipalities are computed together and cached until the
+        CSV files change.
+        
         Args:
             municipality: Specific municipality (None for all)
             lookback_days: Number of days to look back for calculating proportions (default: 90 days)
+                (from the municipality's latest registration, or the latest overall if None)
         
         Returns:
             dict: {municipality: {barangay: proportion, ...}, ...}
         """
         try:
-            df = self.load_barangay_data()
+            proportions = self._cached_proportions(lookback_days, municipality_window=bool(municipality))
             
             # Filter by municipality if specified
             if municipality:
                 municipality_upper = municipality.upper().strip()
-                df = df[df['municipality'] == municipality_upper].copy()
-            
-            # Filter to recent data (last N days)
-            if len(df) > 0:
-                max_date = df['dateOfRenewal_parsed'].max()
-                min_date = max_date - timedelta(days=lookback_days)
-                df = df[df['dateOfRenewal_parsed'] >= min_date].copy()
+                proportions = {m: p for m, p in proportions.items() if m == municipality_upper}
             
-            if len(df) == 0:
+            if not proportions:
                 logger.warning(f"No data found for calculating barangay proportions")
                 return {}
             
-            # Calculate proportions per municipality
-            proportions = {}
-            
-            for mun in df['municipality'].unique():
-                mun_data = df[df['municipality'] == mun].copy()
-                
-                # Count registrations per barangay
-                barangay_counts = mun_data.groupby('barangay').size()
-                total = barangay_counts.sum()
-                
-                if total > 0:
-                    # Calculate proportions
-                    mun_proportions = (barangay_counts / total).to_dict()
-                    proportions[mun] = mun_proportions
-                    
-                    logger.info(f"Calculated proportions for {mun}: {len(mun_proportions)} barangays")
-            
-            return proportions
+            return dict(proportions)
             
         except Exception as e:
             logger.error(f"Error calculating barangay proportions: {str(e)}")
             return {}
     
+    def _cached_proportions(self, lookback_days, municipality_window):
+        """
+        Barangay proportions of every municipality, recomputed only when the CSV files change
+        
+        Args:
+            lookback_days: Number of days to look back for calculating proportions
+            municipality_window: Count back from each municipality's latest registration
+                (True) or from the latest registration overall (False)
+        
+        Returns:
+            dict: {municipality: {barangay: proportion, ...}, ...}
+        """
+        csv_dir = os.path.dirname(self.csv_path)
+        data_key = snapshot_key(csv_dir, list_csv_files(csv_dir))
+        if data_key != self._proportions_key:
+            self.barangay_proportions = {}
+            self._proportions_key = data_key
+        
+        cache_key = (lookback_days, municipality_window)
+        if cache_key not in self.barangay_proportions:
+            self.barangay_proportions[cache_key] = self._group_proportions(
+                self.load_barangay_data(), lookback_days, municipality_window
+            )
+        return self.barangay_proportions[cache_key]
+    
+    def _group_proportions(self, df, lookback_days, municipality_window):
+        """Barangay proportions of all municipalities from one groupby (see _cached_proportions)"""
+        if len(df) == 0:
+            return {}
+        
+        # Filter to recent data (last N days)
+        dates = df['dateOfRenewal_parsed']
+        if municipality_window:
+            max_date = dates.groupby(df['municipality']).transform('max')
+        else:
+            max_date = dates.max()
+        recent = df[dates >= max_date - timedelta(days=lookback_days)]
+        
+        # Count registrations per barangay, as a share of the municipality total
+        barangay_counts = recent.groupby(['municipality', 'barangay']).size()
+        shares = barangay_counts / barangay_counts.groupby(level='municipality').transform('sum')
+        
+        proportions = {}
+        for mun, mun_shares in shares.groupby(level='municipality'):
+            proportions[mun] = dict(zip(mun_shares.index.get_level_values('barangay'), mun_shares.tolist()))
+            logger.info(f"Calculated proportions for {mun}: {len(proportions[mun])} barangays")
+        return proportions
+    
+    def iter_barangay_registrations(self, municipality_predictions, municipality=None):
+        """
+        Yield barangay predictions one at a time, distributing municipality-level
+        predictions by historical proportions (see predict_barangay_registrations)
+        
+        Args:
+            municipality_predictions: dict or list of predictions (same formats as
+                predict_barangay_registrations)
+            municipality: Specific municipality to predict (None for all)
+        
+        Yields:
+            dict: {municipality, barangay, date, predicted_count, proportion, municipality_total}
+        """
+        # Calculate proportions
+        proportions = self.calculate_barangay_proportions(municipality)
+        
+        if not proportions:
+            logger.warning("No barangay proportions available. Cannot distribute predictions.")
+            return
+        
+        # Convert municipality_predictions to standard format
+        if isinstance(municipality_predictions, list):
+            # Format 2: List of dicts
+            predictions_dict = {}
+            for pred in municipality_predictions:
+                mun = pred.get('municipality', '').upper().strip()
+                date = pred.get('date') or pred.get('week_start')
+                count = pred.get('predicted') or pred.get('predicted_count') or pred.get('total_predicted') or 0
+                
+                if mun not in predictions_dict:
+                    predictions_dict[mun] = {}
+                predictions_dict[mun][date] = count
+        else:
+            # Format 1: Dict of dicts
+            predictions_dict = municipality_predictions
+        
+        # Distribute predictions
+        for mun, date_predictions in predictions_dict.items():
+            if municipality and mun.upper().strip() != municipality.upper().strip():
+                continue
+            
+            mun_proportions = proportions.get(mun.upper().strip(), {})
+            
+            if not mun_proportions:
+                logger.warning(f"No proportions found for municipality: {mun}")
+                continue
+            
+            # Distribute all dates at once (dates x barangays); barangay counts sum to each date's total
+            barangays = list(mun_proportions.keys())
+            barangay_proportions = list(mun_proportions.values())
+            totals = list(date_predictions.values())
+            counts = largest_remainder_counts(totals, barangay_proportions).tolist()
+            
+            for date, total_count, date_counts in zip(date_predictions.keys(), totals, counts):
+                for barangay, proportion, barangay_count in zip(barangays, barangay_proportions, date_counts):
+                    yield {
+                        'municipality': mun,
+                        'barangay': barangay,
+                        'date': date,
+                        'predicted_count': barangay_count,
+                        'proportion': proportion,
+                        'municipality_total': total_count
+                    }
+    
     def predict_barangay_registrations(self, municipality_predictions, municipality=None):
         """
         Distribute municipality-level predictions to barangays based on historical proportions
@@ -147,56 +247,7 @@ class BarangayPredictor:
             list: [{municipality, barangay, date, predicted_count, ...}, ...]
         """
         try:
-            # Calculate proportions
-            proportions = self.calculate_barangay_proportions(municipality)
-            
-            if not proportions:
-                logger.warning("No barangay proportions available. Cannot distribute predictions.")
-                return []
-            
-            # Convert municipality_predictions to standard format
-            if isinstance(municipality_predictions, list):
-                # Format 2: List of dicts
-                predictions_dict = {}
-                for pred in municipality_predictions:
-                    mun = pred.get('municipality', '').upper().strip()
-                    date = pred.get('date') or pred.get('week_start')
-                    count = pred.get('predicted') or pred.get('predicted_count') or pred.get('total_predicted') or 0
-                    
-                    if mun not in predictions_dict:
-                        predictions_dict[mun] = {}
-                    predictions_dict[mun][date] = count
-            else:
-                # Format 1: Dict of dicts
-                predictions_dict = municipality_predictions
-            
-            # Distribute predictions
-            barangay_predictions = []
-            
-            for mun, date_predictions in predictions_dict.items():
-                if municipality and mun.upper().strip() != municipality.upper().strip():
-                    continue
-                
-                mun_proportions = proportions.get(mun.upper().strip(), {})
-                
-                if not mun_proportions:
-                    logger.warning(f"No proportions found for municipality: {mun}")
-                    continue
-                
-                # Distribute each date's prediction
-                for date, total_count in date_predictions.items():
-                    for barangay, proportion in mun_proportions.items():
-                        barangay_count = int(round(total_count * proportion))
-                        
-                        barangay_predictions.append({
-                            'municipality': mun,
-                            'barangay': barangay,
-                            'date': date,
-                            'predicted_count': barangay_count,
-                            'proportion': proportion,
-                            'municipality_total': total_count
-                        })
-            
+            barangay_predictions = list(self.iter_barangay_registrations(municipality_predictions, municipality))
             logger.info(f"Generated {len(barangay_predictions)} barangay predictions")
             return barangay_predictions
             
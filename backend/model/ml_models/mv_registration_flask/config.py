@@ -2,9 +2,19 @@
 Configuration file for SARIMA prediction API
 """
 
+import os
+
 # Feature Flags
 ENABLE_PER_MUNICIPALITY = True  # Enable per-municipality predictions
 
+# Regional forecasts run the municipality models on a bounded thread pool (at least one
+# thread). Each model gets the timeout to obtain a thread and the timeout again to run;
+# a model that misses either is left out of the total. A timed-out forecast that is
+# already running cannot be stopped; it keeps its pool thread until it returns, and
+# later requests leave the model out until then.
+REGIONAL_FORECAST_WORKERS = int(os.getenv('REGIONAL_FORECAST_WORKERS', min(4, os.cpu_count() or 1)))
+REGIONAL_FORECAST_TIMEOUT_SECONDS = float(os.getenv('REGIONAL_FORECAST_TIMEOUT_SECONDS', '30'))
+
 # Minimum data requirements for per-municipality models
 MIN_WEEKS_FOR_MUNICIPALITY_MODEL = 12  # Minimum weeks with registrations needed
 MIN_AVG_REGISTRATIONS_PER_WEEK = 10    # Minimum average registrations per week
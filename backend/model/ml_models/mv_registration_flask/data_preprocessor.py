@@ -8,6 +8,7 @@ import numpy as np
 from datetime import datetime
 import os
 from config import DAVAO_ORIENTAL_MUNICIPALITIES, MIN_WEEKS_FOR_MUNICIPALITY_MODEL, MIN_AVG_REGISTRATIONS_PER_WEEK
+from registration_snapshot import load_registrations
 
 class DataPreprocessor:
     def __init__(self, csv_path):
@@ -29,41 +30,19 @@ class DataPreprocessor:
             tuple: (DataFrame with weekly aggregated registration counts, dict with processing info)
         """
         csv_dir = os.path.dirname(self.csv_path)
-        csv_filename = os.path.basename(self.csv_path)
         
-        # Check if directory exists
-        if not os.path.exists(csv_dir):
-            raise FileNotFoundError(f"Directory not found: {csv_dir}")
-        
-        # Find all CSV files in the directory
-        all_csv_files = [f for f in os.listdir(csv_dir) if f.endswith('.csv')]
-        
-        if not all_csv_files:
-            raise FileNotFoundError(f"No CSV files found in: {csv_dir}")
+        # All CSV files combined (registration snapshot: used columns only, dates already parsed)
+        df, file_rows = load_registrations(csv_dir)
+        all_csv_files = list(file_rows)
+        total_rows = sum(rows for rows in file_rows.values() if rows is not None)
         
         print(f"Found {len(all_csv_files)} CSV file(s) in directory: {csv_dir}")
         print(f"Files: {', '.join(all_csv_files)}")
-        
-        # Load and combine all CSV files
-        dfs = []
-        total_rows = 0
-        
-        for csv_file in all_csv_files:
-            csv_path = os.path.join(csv_dir, csv_file)
-            try:
-                df_temp = pd.read_csv(csv_path)
-                dfs.append(df_temp)
-                total_rows += len(df_temp)
-                print(f"  - Loaded {csv_file}: {len(df_temp)} rows")
-            except Exception as e:
-                print(f"  - Warning: Could not load {csv_file}: {str(e)}")
-                continue
-        
-        if not dfs:
-            raise ValueError("No valid CSV files could be loaded")
-        
-        # Combine all dataframes
-        df = pd.concat(dfs, ignore_index=True)
+        for csv_file, rows in file_rows.items():
+            if rows is None:
+                print(f"  - Warning: Could not load {csv_file}")
+            else:
+                print(f"  - Loaded {csv_file}: {rows} rows")
         
         # Validate required columns
         required_columns = ['fileNo', 'dateOfRenewal', 'address_municipality']
@@ -102,13 +81,6 @@ class DataPreprocessor:
         if len(df_filtered) == 0:
             raise ValueError("No data found for Davao Oriental municipalities")
         
-        # Parse dateOfRenewal
-        df_filtered['dateOfRenewal_parsed'] = pd.to_datetime(
-            df_filtered['dateOfRenewal'],
-            format='%m/%d/%Y',
-            errors='coerce'
-        )
-        
         # Drop rows with invalid dates
         df_filtered = df_filtered.dropna(subset=['dateOfRenewal_parsed'])
         
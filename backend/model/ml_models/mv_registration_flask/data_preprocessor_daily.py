@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 import os
 import holidays
 from config import DAVAO_ORIENTAL_MUNICIPALITIES
+from registration_snapshot import load_registrations
 
 class DailyDataPreprocessor:
     """
@@ -93,41 +94,69 @@ class DailyDataPreprocessor:
         Returns:
             tuple: (daily_data DataFrame with DateTime index, exogenous_vars DataFrame, processing_info dict)
         """
-        csv_dir = os.path.dirname(self.csv_path)
+        df_filtered, load_info = self._load_registrations()
         
-        # Check if directory exists
-        if not os.path.exists(csv_dir):
-            raise FileNotFoundError(f"Directory not found: {csv_dir}")
+        # Filter by specific municipality if provided
+        if municipality:
+            municipality_upper = municipality.upper().strip()
+            if municipality_upper not in self.davao_oriental_municipalities:
+                raise ValueError(f"Municipality '{municipality}' not found in Davao Oriental. Available municipalities: {', '.join(self.davao_oriental_municipalities)}")
+            df_filtered = df_filtered[df_filtered['municipality_upper'] == municipality_upper]
+            print(f"Filtered to {len(df_filtered)} rows from {municipality_upper}")
+            if len(df_filtered) == 0:
+                raise ValueError(f"No data found for municipality '{municipality}'")
         
-        # Find all CSV files in the directory
-        all_csv_files = [f for f in os.listdir(csv_dir) if f.endswith('.csv')]
+        return self._build_daily_series(df_filtered, load_info, fill_missing_days, fill_method, municipality)
+    
+    def load_all_daily_series(self, fill_missing_days=True, fill_method='forward'):
+        """
+        Load CSV data once and process it into the aggregated daily series and the
+        daily series of every municipality (instead of one load_and_process_daily_data()
+        call, each re-reading all CSV files, per series)
         
-        if not all_csv_files:
-            raise FileNotFoundError(f"No CSV files found in: {csv_dir}")
+        Args:
+            fill_missing_days: If True, fill missing days with 0 or forward-fill
+            fill_method: 'zero' to fill with 0, 'forward' to forward-fill last value
         
-        print(f"Found {len(all_csv_files)} CSV file(s) in directory: {csv_dir}")
-        print(f"Files: {', '.join(all_csv_files)}")
+        Returns:
+            tuple: (aggregated, municipality_series) where aggregated is the
+            (daily_data, exogenous_vars, processing_info) tuple for all municipalities and
+            municipality_series maps each municipality with data (upper case) to its tuple
+        """
+        df_filtered, load_info = self._load_registrations()
+        aggregated = self._build_daily_series(df_filtered, load_info, fill_missing_days, fill_method)
+        
+        municipality_series = {}
+        for municipality_upper, df_municipality in df_filtered.groupby('municipality_upper', sort=False):
+            print(f"Processing {len(df_municipality)} rows from {municipality_upper}")
+            municipality_series[municipality_upper] = self._build_daily_series(
+                df_municipality, load_info, fill_missing_days, fill_method, municipality_upper
+            )
         
-        # Load and combine all CSV files
-        dfs = []
-        total_rows = 0
+        return aggregated, municipality_series
+    
+    def _load_registrations(self):
+        """
+        Read the CSV files in the data directory (through the registration snapshot) and keep
+        the deduplicated Davao Oriental registrations with a valid dateOfRenewal up to today
         
-        for csv_file in all_csv_files:
-            csv_path = os.path.join(csv_dir, csv_file)
-            try:
-                df_temp = pd.read_csv(csv_path)
-                dfs.append(df_temp)
-                total_rows += len(df_temp)
-                print(f"  - Loaded {csv_file}: {len(df_temp)} rows")
-            except Exception as e:
-                print(f"  - Warning: Could not load {csv_file}: {str(e)}")
-                continue
+        Returns:
+            tuple: (registrations DataFrame with municipality_upper and dateOfRenewal_parsed, load info dict)
+        """
+        csv_dir = os.path.dirname(self.csv_path)
         
-        if not dfs:
-            raise ValueError("No valid CSV files could be loaded")
+        # All CSV files combined, snapshot columns only, dates already parsed
+        df, file_rows = load_registrations(csv_dir)
+        all_csv_files = list(file_rows)
+        total_rows = sum(rows for rows in file_rows.values() if rows is not None)
         
-        # Combine all dataframes
-        df = pd.concat(dfs, ignore_index=True)
+        print(f"Found {len(all_csv_files)} CSV file(s) in directory: {csv_dir}")
+        print(f"Files: {', '.join(all_csv_files)}")
+        for csv_file, rows in file_rows.items():
+            if rows is None:
+                print(f"  - Warning: Could not load {csv_file}")
+            else:
+                print(f"  - Loaded {csv_file}: {rows} rows")
         
         # Validate required columns
         required_columns = ['fileNo', 'dateOfRenewal', 'address_municipality']
@@ -156,28 +185,10 @@ class DailyDataPreprocessor:
         davao_mask = df['municipality_upper'].isin(self.davao_oriental_municipalities)
         df_filtered = df[davao_mask].copy()
         
-        # Filter by specific municipality if provided
-        if municipality:
-            municipality_upper = municipality.upper().strip()
-            if municipality_upper not in self.davao_oriental_municipalities:
-                raise ValueError(f"Municipality '{municipality}' not found in Davao Oriental. Available municipalities: {', '.join(self.davao_oriental_municipalities)}")
-            df_filtered = df_filtered[df_filtered['municipality_upper'] == municipality_upper].copy()
-            print(f"Filtered to {len(df_filtered)} rows from {municipality_upper}")
-        else:
-            print(f"Filtered to {len(df_filtered)} rows from Davao Oriental municipalities")
+        print(f"Filtered to {len(df_filtered)} rows from Davao Oriental municipalities")
         
         if len(df_filtered) == 0:
-            if municipality:
-                raise ValueError(f"No data found for municipality '{municipality}'")
-            else:
-                raise ValueError("No data found for Davao Oriental municipalities")
-        
-        # Parse dateOfRenewal
-        df_filtered['dateOfRenewal_parsed'] = pd.to_datetime(
-            df_filtered['dateOfRenewal'],
-            format='%m/%d/%Y',
-            errors='coerce'
-        )
+            raise ValueError("No data found for Davao Oriental municipalities")
         
         # Drop rows with invalid dates
         df_filtered = df_filtered.dropna(subset=['dateOfRenewal_parsed'])
@@ -197,6 +208,29 @@ class DailyDataPreprocessor:
                 f"with dateOfRenewal after {today_date}"
             )
         
+        load_info = {
+            'total_csv_files': len(all_csv_files),
+            'csv_files': all_csv_files,
+            'total_rows_before_dedup': total_rows,
+            'duplicates_removed': duplicates_removed,
+            'total_rows_after_dedup': len(df)
+        }
+        return df_filtered, load_info
+    
+    def _build_daily_series(self, df_filtered, load_info, fill_missing_days, fill_method, municipality=None):
+        """
+        Aggregate registrations to a gap-filled daily series with exogenous variables
+        
+        Args:
+            df_filtered: Registrations from _load_registrations() (all or one municipality)
+            load_info: Load info from _load_registrations()
+            fill_missing_days: If True, fill missing days with 0 or forward-fill
+            fill_method: 'zero' to fill with 0, 'forward' to forward-fill last value
+            municipality: Municipality name of the registrations (None for all municipalities)
+        
+        Returns:
+            tuple: (daily_data DataFrame with DateTime index, exogenous_vars DataFrame, processing_info dict)
+        """
         # Sort by date
         df_filtered = df_filtered.sort_values('dateOfRenewal_parsed')
         
@@ -259,11 +293,7 @@ class DailyDataPreprocessor:
         
         # Prepare processing info
         processing_info = {
-            'total_csv_files': len(all_csv_files),
-            'csv_files': all_csv_files,
-            'total_rows_before_dedup': total_rows,
-            'duplicates_removed': duplicates_removed,
-            'total_rows_after_dedup': len(df),
+            **load_info,
             'filtered_rows': len(df_filtered),
             'total_days': len(daily_data),
             'days_with_registrations': (daily_data['count'] > 0).sum(),
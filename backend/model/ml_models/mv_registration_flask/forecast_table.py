@@ -0,0 +1,145 @@
+"""
+Precomputed forecast of a fitted SARIMA model over the longest served horizon
+The forecast for the first n days does not depend on how many days are forecast
+(each step only uses the exogenous values up to that day), so one 364-day forecast
+made when a model is loaded answers every 1-52 week request by slicing.
+
+The per-day rounding and week grouping of OptimizedSARIMAModel.predict() are done
+once here with NumPy; a request only slices and sums prepared arrays.
+"""
+
+import numpy as np
+import pandas as pd
+
+FORECAST_TABLE_DAYS = 364  # 52 weeks, the longest horizon the API serves
+
+
+def _counts(values):
+    """int(round(max(0, value))) for every value; NaN counts as 0"""
+    return np.rint(np.where(values > 0, values, 0)).astype(np.int64)
+
+
+class ForecastTable:
+    """Daily forecast and confidence bounds of one model, formatted like predict() results"""
+
+    def __init__(self, dates, forecast, lower, upper, exogenous=None):
+        """
+        Initialize forecast table
+
+        Args:
+            dates: DatetimeIndex of the forecast days
+            forecast, lower, upper: Forecast and confidence bounds per day (original scale)
+            exogenous: Exogenous values the forecast was made with (None if the model has none)
+        """
+        self.dates = pd.DatetimeIndex(dates)
+        self._date_values = self.dates.asi8
+        self.forecast = np.asarray(forecast, dtype=float)
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.exogenous = None if exogenous is None else np.asarray(exogenous, dtype=float)
+
+        self.date_strings = list(self.dates.strftime('%Y-%m-%d'))
+        counts = np.stack([_counts(self.forecast), _counts(self.lower), _counts(self.upper)])
+        iso_weeks = self.dates.isocalendar().week.astype(int).tolist()
+        # Shared by every result; callers must not modify them
+        self.daily = [
+            {
+                'date': date,
+                'day': day,
+                'week': week,
+                'predicted_count': predicted,
+                'lower_bound': lower_bound,
+                'upper_bound': upper_bound
+            }
+            for date, day, week, predicted, lower_bound, upper_bound in zip(
+                self.date_strings, self.dates.day.tolist(), iso_weeks, *counts.tolist()
+            )
+        ]
+        # Running totals of the rounded counts, so any run of days sums with one subtraction
+        self._cumulative = np.concatenate([np.zeros((3, 1), dtype=np.int64), np.cumsum(counts, axis=1)], axis=1)
+        # Sunday starting each day's week
+        days = self.dates.values.astype('datetime64[D]')
+        self._week_start = days - ((self.dates.dayofweek.to_numpy() + 1) % 7)
+        self._layouts = {}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def covers(self, dates, exogenous=None):
+        """Whether this table forecast the given days with the same exogenous values"""
+        n_days = len(dates)
+        if n_days == 0 or n_days > len(self.dates):
+            return False
+        if not np.array_equal(pd.DatetimeIndex(dates).asi8, self._date_values[:n_days]):
+            return False
+        if self.exogenous is None or exogenous is None:
+            return self.exogenous is None and exogenous is None
+        values = np.asarray(exogenous, dtype=float)[:n_days]
+        return values.shape == self.exogenous[:n_days].shape and np.array_equal(values, self.exogenous[:n_days])
+
+    def _week_layout(self, next_month_start):
+        """
+        Week groups as predict() forms them: Sunday-to-Saturday weeks, with the days
+        before the first Sunday on or after next_month_start folded into that week
+        """
+        key = pd.Timestamp(next_month_start).normalize()
+        layout = self._layouts.get(key)
+        if layout is None:
+            start = np.datetime64(key.date(), 'D')
+            first_week_start = start + (6 - key.weekday()) % 7
+            week_start = np.where(self._week_start < start, first_week_start, self._week_start)
+            # Forecast days are consecutive, so each week is one run of days
+            bounds = np.flatnonzero(week_start[1:] != week_start[:-1]) + 1
+            starts = np.concatenate([[0], bounds])
+            ends = np.concatenate([bounds, [len(week_start)]])
+            labels = pd.DatetimeIndex(week_start[starts])
+            layout = (starts, ends, list(labels.strftime('%Y-%m-%d')), labels.isocalendar().week.astype(int).tolist())
+            self._layouts[key] = layout
+        return layout
+
+    def result(self, days, next_month_start, last_data_date):
+        """
+        predict() result for the first `days` forecast days
+
+        Args:
+            days: Number of days (at most len(self))
+            next_month_start: First day of the month after the last data date (week grouping)
+            last_data_date: Reported as last_data_date
+        """
+        starts, ends, labels, iso_weeks = self._week_layout(next_month_start)
+        n_weeks = int(np.searchsorted(starts, days))
+        week_ends = np.minimum(ends[:n_weeks], days)
+        totals = (self._cumulative[:, week_ends] - self._cumulative[:, starts[:n_weeks]]).tolist()
+        weekly_predictions = [
+            {
+                'date': label,
+                'week_start': label,
+                'predicted_count': predicted,
+                'predicted': predicted,
+                'total_predicted': predicted,
+                'lower_bound': lower_bound,
+                'upper_bound': upper_bound,
+                'week': week
+            }
+            for label, week, predicted, lower_bound, upper_bound in zip(labels, iso_weeks, *totals)
+        ]
+
+        forecast = self.forecast[:days]
+        forecast_lower = self.lower[:days]
+        forecast_upper = self.upper[:days]
+        return {
+            'daily_predictions': self.daily[:days],
+            'weekly_predictions': weekly_predictions,
+            'monthly_aggregation': {
+                'total_predicted': int(round(max(0, np.nansum(forecast)))),
+                'lower_bound': int(round(max(0, np.nansum(forecast_lower)))),
+                'upper_bound': int(round(max(0, np.nansum(forecast_upper))))
+            },
+            'prediction_dates': self.date_strings[:days],
+            'prediction_days': days,
+            'last_data_date': str(last_data_date),
+            'prediction_start_date': self.date_strings[0],
+            'forecast': forecast.tolist(),
+            'forecast_ci_lower': forecast_lower.tolist(),
+            'forecast_ci_upper': forecast_upper.tolist()
+        }
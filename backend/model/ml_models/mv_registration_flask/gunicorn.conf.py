@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for the vehicle registration prediction API
+
+    gunicorn -c gunicorn.conf.py
+
+The app module (wsgi.py, which loads the SARIMA models) is imported once in
+the master and the workers are forked from it, so they share the model pages
+copy-on-write instead of each loading a private copy.
+
+One worker by default: POST /api/model/retrain retrains and reloads the models
+inside the worker that receives it, and other workers would keep serving the old
+models and forecast tables. With more workers the endpoint answers 409 and the
+retrain timer (which restarts the service) is the only way to retrain. The retrain
+also runs inside the request, so it must finish within GUNICORN_TIMEOUT or
+gunicorn kills the worker mid-training.
+"""
+
+import gc
+import os
+
+wsgi_app = 'wsgi:app'
+bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+# Read by the app (loaded after this file): the retrain endpoint is refused with several workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+# Long enough for an in-request retrain (SARIMA order search for every model)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '1800'))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Move everything the master loaded out of the collector's reach, so garbage
+    # collections in the workers do not write to (and un-share) those pages
+    gc.freeze()
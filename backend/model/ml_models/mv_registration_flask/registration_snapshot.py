@@ -0,0 +1,144 @@
+"""
+Columnar snapshot of the registration CSV directory
+The CSV exports carry 21 columns (owner names, contact details and birth dates
+included) of which the models use five. Those columns are read once into a Parquet
+file next to the CSVs, with categorical municipality/barangay names and the renewal
+date already parsed, and every loader reads the snapshot until a CSV file is added,
+removed or changed (the snapshot is keyed by the file names, sizes and mtimes).
+
+Needs pyarrow. Without it, or if the snapshot cannot be written, the CSV files are
+read directly (still only the snapshot columns).
+"""
+
+import json
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Columns any loader uses; the rest of the export is never read
+SNAPSHOT_COLUMNS = ['fileNo', 'plateNo', 'dateOfRenewal', 'address_municipality', 'address_barangay']
+# Few distinct values per column, stored once each
+CATEGORICAL_COLUMNS = ['dateOfRenewal', 'address_municipality', 'address_barangay']
+SNAPSHOT_FILENAME = '.registrations_snapshot.parquet'
+SNAPSHOT_VERSION = 1  # Bump when the snapshot columns or their processing change
+_METADATA_KEY = b'registration_snapshot'
+
+
+def list_csv_files(csv_dir):
+    """CSV file names in csv_dir, in directory order"""
+    if not os.path.exists(csv_dir):
+        raise FileNotFoundError(f"Directory not found: {csv_dir}")
+
+    all_csv_files = [f for f in os.listdir(csv_dir) if f.endswith('.csv')]
+    if not all_csv_files:
+        raise FileNotFoundError(f"No CSV files found in: {csv_dir}")
+    return all_csv_files
+
+
+def snapshot_key(csv_dir, csv_files):
+    """Version plus name, size and mtime of every CSV file; any change invalidates the snapshot"""
+    files = []
+    for csv_file in sorted(csv_files):
+        stat = os.stat(os.path.join(csv_dir, csv_file))
+        files.append([csv_file, stat.st_size, stat.st_mtime_ns])
+    return {'version': SNAPSHOT_VERSION, 'files': files}
+
+
+def load_registrations(csv_dir):
+    """
+    Registration rows of all CSV files in csv_dir, from the snapshot when it is current
+
+    Args:
+        csv_dir: Directory with the registration CSV exports
+
+    Returns:
+        tuple: (DataFrame with the SNAPSHOT_COLUMNS found in the files plus dateOfRenewal_parsed,
+                dict of CSV file name -> rows loaded, None for a file that could not be read)
+    """
+    csv_files = list_csv_files(csv_dir)
+    key = snapshot_key(csv_dir, csv_files)
+    path = os.path.join(csv_dir, SNAPSHOT_FILENAME)
+
+    snapshot = _read_snapshot(path, key)
+    if snapshot is not None:
+        return snapshot
+
+    df, file_rows = _read_csv_files(csv_dir, csv_files)
+    _write_snapshot(path, key, df, file_rows)
+    return df, file_rows
+
+
+def _read_csv_files(csv_dir, csv_files):
+    """Snapshot columns of the CSV files, with parsed dates and categorical names"""
+    dfs = []
+    file_rows = {}
+    for csv_file in csv_files:
+        try:
+            df_temp = pd.read_csv(os.path.join(csv_dir, csv_file), usecols=lambda column: column in SNAPSHOT_COLUMNS)
+        except Exception as e:
+            logger.warning(f"Could not load {csv_file}: {str(e)}")
+            file_rows[csv_file] = None
+            continue
+        dfs.append(df_temp)
+        file_rows[csv_file] = len(df_temp)
+
+    if not dfs:
+        raise ValueError("No valid CSV files could be loaded")
+
+    df = pd.concat(dfs, ignore_index=True)
+    if 'dateOfRenewal' in df.columns:
+        df['dateOfRenewal_parsed'] = pd.to_datetime(df['dateOfRenewal'], format='%m/%d/%Y', errors='coerce')
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    logger.info(f"Read {len(df)} registration rows from {len(dfs)} CSV file(s) in {csv_dir}")
+    return df, file_rows
+
+
+def _read_snapshot(path, key):
+    """(DataFrame, file rows) from the snapshot at path, or None if it is missing or stale"""
+    if not os.path.exists(path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    try:
+        # One read: key and rows come from the same file even if another worker replaces it
+        table = pq.read_table(path)
+        stored = json.loads(table.schema.metadata[_METADATA_KEY])
+        if stored['key'] != key:
+            logger.info("Registration CSV files changed; rebuilding the snapshot")
+            return None
+        return table.to_pandas(), stored['file_rows']
+    except Exception as e:
+        logger.warning(f"Could not read registration snapshot {path}: {str(e)}")
+        return None
+
+
+def _write_snapshot(path, key, df, file_rows):
+    """Write the snapshot; failures are logged, the caller already has the data"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.info("pyarrow is not installed; registration CSV files are read without a snapshot")
+        return
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_METADATA_KEY] = json.dumps({'key': key, 'file_rows': file_rows}).encode()
+        # Write next to the target and rename so readers never see a partial file
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not write registration snapshot {path}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
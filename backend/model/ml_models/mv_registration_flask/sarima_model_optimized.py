@@ -14,20 +14,19 @@ Key Improvements:
 
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from statsmodels.stats.diagnostic import acorr_ljungbox
-from statsmodels.tsa.stattools import adfuller, acf, pacf
-from sklearn.model_selection import TimeSeriesSplit
-from sklearn.preprocessing import MinMaxScaler, StandardScaler
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-import pmdarima as pm
+# statsmodels, sklearn and pmdarima are only needed to fit and evaluate models, so they are
+# imported in the methods that use them and the prediction API starts without them
+# (unpickling a fitted model imports the statsmodels classes it needs)
 import pickle
+import joblib
 import os
 import json
 import logging
 from datetime import datetime, timedelta
 import holidays
 import warnings
+
+from forecast_table import ForecastTable, FORECAST_TABLE_DAYS
 warnings.filterwarnings('ignore')
 
 # Set up logging
@@ -84,6 +83,7 @@ class OptimizedSARIMAModel:
         self.diagnostics = None
         self.cv_results = None
         self._metadata = None
+        self.forecast_table = None  # Set by precompute_forecast()
         
         # Create model directory if it doesn't exist
         os.makedirs(model_dir, exist_ok=True)
@@ -115,6 +115,7 @@ class OptimizedSARIMAModel:
         Returns:
             tuple: (is_stationary: bool, adf_result: dict)
         """
+        from statsmodels.tsa.stattools import adfuller
         try:
             adf_result = adfuller(series.dropna())
             p_value = adf_result[1]
@@ -149,6 +150,7 @@ class OptimizedSARIMAModel:
         Returns:
             tuple: (p, d, q, P, D, Q, s) parameters
         """
+        import pmdarima as pm
         logger.info("=" * 60)
         logger.info("AUTO_ARIMA PARAMETER OPTIMIZATION")
         logger.info("=" * 60)
@@ -244,6 +246,7 @@ class OptimizedSARIMAModel:
             return data
         
         if fit:
+            from sklearn.preprocessing import MinMaxScaler, StandardScaler
             if self.scaler_type == 'minmax':
                 self.scaler = MinMaxScaler()
             elif self.scaler_type == 'standard':
@@ -397,6 +400,7 @@ class OptimizedSARIMAModel:
         Returns:
             Dictionary with training information
         """
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
         logger.info("=" * 60)
         logger.info("TRAINING OPTIMIZED SARIMA MODEL")
         logger.info("=" * 60)
@@ -488,6 +492,7 @@ class OptimizedSARIMAModel:
         try:
             logger.info("Fitting model (this may take a few minutes)...")
             self.fitted_model = self.model.fit(disp=False, maxiter=200)
+            self.forecast_table = None
             logger.info("Model fitting completed!")
             logger.info(f"AIC: {self.fitted_model.aic:.2f}")
             logger.info(f"BIC: {self.fitted_model.bic:.2f}")
@@ -614,6 +619,7 @@ class OptimizedSARIMAModel:
             is_training: Whether this is training data
             exogenous: Exogenous variables for predictions
         """
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
         try:
             # Get fitted values (in-sample predictions)
             fitted_values = self.fitted_model.fittedvalues
@@ -757,6 +763,7 @@ class OptimizedSARIMAModel:
             test_series: Test time series values
             exogenous: Exogenous variables for test period
         """
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
         try:
             # Generate forecasts for the test period
             forecast_steps = len(test_series)
@@ -982,6 +989,8 @@ class OptimizedSARIMAModel:
     
     def _calculate_diagnostics(self, actual_series):
         """Calculate diagnostic metrics: residuals randomness, ACF/PACF"""
+        from statsmodels.stats.diagnostic import acorr_ljungbox
+        from statsmodels.tsa.stattools import acf, pacf
         try:
             residuals = self.fitted_model.resid
             residuals_clean = residuals.dropna()
@@ -1068,6 +1077,9 @@ class OptimizedSARIMAModel:
             exogenous: Exogenous variables
             n_splits: Number of splits for cross-validation
         """
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+        from sklearn.model_selection import TimeSeriesSplit
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
         try:
             logger.info(f"Performing {n_splits}-fold TimeSeriesSplit cross-validation...")
             
@@ -1218,6 +1230,10 @@ class OptimizedSARIMAModel:
         """
         Generate predictions for the specified number of days
         
+        Served from the precomputed forecast (precompute_forecast()) when it covers
+        the requested days with the same exogenous values; entries of
+        daily_predictions are then shared between calls and must not be modified.
+        
         Args:
             days: Number of days to predict (default: 30)
             exogenous: Exogenous variables for future dates (DataFrame, optional)
@@ -1230,6 +1246,59 @@ class OptimizedSARIMAModel:
         
         logger.info(f"Generating predictions for {days} days...")
         
+        actual_last_date, next_month_start, forecast_dates, exogenous = self._forecast_inputs(days, exogenous)
+        
+        table = self.forecast_table
+        if table is not None and len(forecast_dates) == days and table.covers(forecast_dates, exogenous):
+            logger.info(f"Using precomputed {len(table)}-day forecast")
+            return table.result(days, next_month_start, actual_last_date)
+        
+        # Generate forecasts
+        try:
+            result = self._forecast_table(days, forecast_dates, exogenous).result(
+                days, next_month_start, actual_last_date
+            )
+            monthly = result['monthly_aggregation']
+            
+            logger.info(f"Predictions generated successfully")
+            logger.info(f"  Total predicted: {monthly['total_predicted']} registrations")
+            logger.info(f"  Confidence interval: [{monthly['lower_bound']}, {monthly['upper_bound']}]")
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error generating predictions: {str(e)}")
+            raise
+    
+    def precompute_forecast(self, exogenous=None, days=FORECAST_TABLE_DAYS):
+        """
+        Forecast the longest served horizon once, so predict() answers shorter
+        horizons with the same start and exogenous values by slicing
+        
+        Args:
+            exogenous: Exogenous variables for the horizon, indexed by the forecast
+                dates (as passed to predict()); generated as predict() does if omitted
+            days: Horizon in days (default: 364, i.e. 52 weeks)
+            
+        Returns:
+            ForecastTable (also kept as self.forecast_table until the model is
+            retrained or reloaded)
+        """
+        if self.fitted_model is None:
+            raise ValueError("Model not trained. Please train the model first.")
+        
+        _, _, forecast_dates, exogenous = self._forecast_inputs(days, exogenous)
+        self.forecast_table = self._forecast_table(days, forecast_dates, exogenous)
+        logger.info(f"Precomputed {days}-day forecast from {forecast_dates[0].date()}")
+        return self.forecast_table
+    
+    def _forecast_inputs(self, days, exogenous=None):
+        """
+        Resolve the forecast start, dates and exogenous variables for predict()
+        
+        Returns:
+            tuple: (actual_last_date, next_month_start, forecast_dates, exogenous)
+        """
         # Determine actual last registration date
         # CRITICAL: Use the ACTUAL last registration date, not just the last date in daily data
         actual_last_date = None
@@ -1319,148 +1388,55 @@ class OptimizedSARIMAModel:
                 exogenous = self._generate_exogenous_for_future_dates(forecast_dates)
                 logger.info(f"Generated exogenous variables with columns: {list(exogenous.columns)}")
         
-        # Generate forecasts
-        try:
-            forecast_result = self.fitted_model.get_forecast(
-                steps=days,
-                exog=exogenous
-            )
-            
-            forecast = forecast_result.predicted_mean
-            forecast_ci = forecast_result.conf_int()
-            
-            # Inverse transform if normalization was used
-            if self.use_normalization:
-                forecast = self.inverse_normalize(forecast)
-                forecast_ci_lower = self.inverse_normalize(forecast_ci.iloc[:, 0])
-                forecast_ci_upper = self.inverse_normalize(forecast_ci.iloc[:, 1])
-            else:
-                forecast_ci_lower = forecast_ci.iloc[:, 0]
-                forecast_ci_upper = forecast_ci.iloc[:, 1]
-            
-            # Debug: Log forecast statistics
-            logger.info(f"DEBUG: Forecast statistics:")
-            logger.info(f"  Min: {forecast.min():.2f}, Max: {forecast.max():.2f}, Mean: {forecast.mean():.2f}")
-            logger.info(f"  Negative values: {(forecast < 0).sum()} out of {len(forecast)}")
-            logger.info(f"  Values < 1: {(forecast < 1).sum()} out of {len(forecast)}")
-            logger.info(f"  First 5 forecast values: {forecast.head().tolist()}")
-            
-            # Prepare daily predictions
-            daily_predictions = []
-            for i, date in enumerate(forecast_dates):
-                daily_predictions.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'day': date.day,
-                    'week': date.isocalendar()[1],
-                    'predicted_count': int(round(max(0, forecast.iloc[i]))),
-                    'lower_bound': int(round(max(0, forecast_ci_lower.iloc[i]))),
-                    'upper_bound': int(round(max(0, forecast_ci_upper.iloc[i])))
-                })
-            
-            # Aggregate to weekly totals
-            # Calculate the Sunday on or after next_month_start for the first week
-            next_month_start_weekday = next_month_start.weekday()
-            days_until_sunday = (6 - next_month_start_weekday) % 7
-            if days_until_sunday == 0 and next_month_start_weekday != 6:
-                days_until_sunday = 7
-            first_week_start = next_month_start + timedelta(days=days_until_sunday)
-            
-            weekly_predictions = []
-            weekly_grouped = {}
-            for pred in daily_predictions:
-                date_obj = pd.to_datetime(pred['date'])
-                # Calculate Sunday of the week (weekday: Monday=0, Sunday=6)
-                # We want to find the previous Sunday (or current date if it's Sunday)
-                # Formula: (weekday + 1) % 7 gives days since Sunday
-                days_since_sunday = (date_obj.weekday() + 1) % 7
-                week_start = date_obj - timedelta(days=days_since_sunday)
-                
-                # If week_start is before next_month_start, use first_week_start instead
-                if week_start < next_month_start:
-                    week_start = first_week_start
-                
-                week_key = week_start.strftime('%Y-%m-%d')
-                
-                if week_key not in weekly_grouped:
-                    weekly_grouped[week_key] = {
-                        'date': week_key,  # Use 'date' for compatibility
-                        'week_start': week_key,
-                        'days': [],
-                        'total_predicted': 0,
-                        'predicted_count': 0,  # Add for frontend compatibility
-                        'predicted': 0,  # Add for frontend compatibility
-                        'lower_bound': 0,
-                        'upper_bound': 0
-                    }
-                
-                weekly_grouped[week_key]['days'].append(pred)
-                weekly_grouped[week_key]['total_predicted'] += pred['predicted_count']
-                weekly_grouped[week_key]['predicted_count'] += pred['predicted_count']  # Same value
-                weekly_grouped[week_key]['predicted'] += pred['predicted_count']  # Same value
-                weekly_grouped[week_key]['lower_bound'] += pred['lower_bound']
-                weekly_grouped[week_key]['upper_bound'] += pred['upper_bound']
-            
-            # Convert to list and ensure all fields are present
-            weekly_predictions = []
-            for week_data in weekly_grouped.values():
-                weekly_predictions.append({
-                    'date': week_data['date'],
-                    'week_start': week_data['week_start'],
-                    'predicted_count': int(week_data['predicted_count']),
-                    'predicted': int(week_data['predicted']),  # Alias for compatibility
-                    'total_predicted': int(week_data['total_predicted']),  # Keep for backward compatibility
-                    'lower_bound': int(week_data['lower_bound']),
-                    'upper_bound': int(week_data['upper_bound']),
-                    'week': pd.to_datetime(week_data['date']).isocalendar()[1]  # Add week number
-                })
-            
-            # Aggregate to monthly total
-            monthly_total = int(round(max(0, forecast.sum())))
-            monthly_lower = int(round(max(0, forecast_ci_lower.sum())))
-            monthly_upper = int(round(max(0, forecast_ci_upper.sum())))
-            
-            result = {
-                'daily_predictions': daily_predictions,
-                'weekly_predictions': weekly_predictions,
-                'monthly_aggregation': {
-                    'total_predicted': monthly_total,
-                    'lower_bound': monthly_lower,
-                    'upper_bound': monthly_upper
-                },
-                'prediction_dates': [p['date'] for p in daily_predictions],
-                'prediction_days': days,
-                'last_data_date': str(actual_last_date),  # Actual last registration date
-                'prediction_start_date': daily_predictions[0]['date'],
-                'forecast': forecast.tolist() if hasattr(forecast, 'tolist') else list(forecast),
-                'forecast_ci_lower': forecast_ci_lower.tolist() if hasattr(forecast_ci_lower, 'tolist') else list(forecast_ci_lower),
-                'forecast_ci_upper': forecast_ci_upper.tolist() if hasattr(forecast_ci_upper, 'tolist') else list(forecast_ci_upper)
-            }
-            
-            logger.info(f"Predictions generated successfully")
-            logger.info(f"  Total predicted: {monthly_total} registrations")
-            logger.info(f"  Confidence interval: [{monthly_lower}, {monthly_upper}]")
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error generating predictions: {str(e)}")
-            raise
+        return actual_last_date, next_month_start, forecast_dates, exogenous
+    
+    def _forecast_table(self, days, forecast_dates, exogenous=None):
+        """Run the state-space forecast for `days` days and wrap it in a ForecastTable"""
+        forecast_result = self.fitted_model.get_forecast(
+            steps=days,
+            exog=exogenous
+        )
+        
+        forecast = forecast_result.predicted_mean
+        forecast_ci = forecast_result.conf_int()
+        
+        # Inverse transform if normalization was used
+        if self.use_normalization:
+            forecast = self.inverse_normalize(forecast)
+            forecast_ci_lower = self.inverse_normalize(forecast_ci.iloc[:, 0])
+            forecast_ci_upper = self.inverse_normalize(forecast_ci.iloc[:, 1])
+        else:
+            forecast_ci_lower = forecast_ci.iloc[:, 0]
+            forecast_ci_upper = forecast_ci.iloc[:, 1]
+        
+        # Debug: Log forecast statistics
+        logger.info(f"DEBUG: Forecast statistics:")
+        logger.info(f"  Min: {forecast.min():.2f}, Max: {forecast.max():.2f}, Mean: {forecast.mean():.2f}")
+        logger.info(f"  Negative values: {(forecast < 0).sum()} out of {len(forecast)}")
+        logger.info(f"  Values < 1: {(forecast < 1).sum()} out of {len(forecast)}")
+        logger.info(f"  First 5 forecast values: {forecast.head().tolist()}")
+        
+        return ForecastTable(forecast_dates, forecast, forecast_ci_lower, forecast_ci_upper, exogenous)
     
     def save_model(self):
         """Save the trained model to disk"""
         try:
             os.makedirs(self.model_dir, exist_ok=True)
             
-            # Save fitted model
-            with open(self.model_file, 'wb') as f:
-                pickle.dump(self.fitted_model, f)
+            # Save fitted model uncompressed with joblib so load_model can memory-map its arrays.
+            # Every file is written next to its target and renamed into place: processes that
+            # still map the old model file keep reading it instead of a truncated one (SIGBUS).
+            self._write_atomic(self.model_file, lambda path: joblib.dump(self.fitted_model, path))
             
             # Save scaler if normalization was used
             scaler_file = None
             if self.use_normalization and self.scaler is not None:
                 scaler_filename = self.model_file.replace('.pkl', '_scaler.pkl')
-                with open(scaler_filename, 'wb') as f:
-                    pickle.dump(self.scaler, f)
+                
+                def write_scaler(path):
+                    with open(path, 'wb') as f:
+                        pickle.dump(self.scaler, f)
+                self._write_atomic(scaler_filename, write_scaler)
                 scaler_file = scaler_filename
             
             # Save metadata
@@ -1521,8 +1497,11 @@ class OptimizedSARIMAModel:
                 }
             }
             
-            with open(self.metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=2, default=str)
+            # Written last, once the model and scaler files are in place
+            def write_metadata(path):
+                with open(path, 'w') as f:
+                    json.dump(metadata, f, indent=2, default=str)
+            self._write_atomic(self.metadata_file, write_metadata)
             
             logger.info(f"Model saved to {self.model_file}")
             
@@ -1530,12 +1509,26 @@ class OptimizedSARIMAModel:
             logger.error(f"Error saving model: {str(e)}")
             raise
     
+    @staticmethod
+    def _write_atomic(path, write):
+        """Call write(tmp_path) on a file next to path, then rename it over path"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
     def load_model(self):
         """Load a previously trained model from disk"""
         try:
-            # Load fitted model
-            with open(self.model_file, 'rb') as f:
-                self.fitted_model = pickle.load(f)
+            # Load fitted model; arrays are mapped copy-on-write from the file (statsmodels needs
+            # writable buffers), so workers forked after loading share the pages.
+            # Files written with pickle.dump by older versions load normally, without mapping
+            self.fitted_model = joblib.load(self.model_file, mmap_mode='c')
+            self.forecast_table = None
             
             # Load metadata
             with open(self.metadata_file, 'r') as f:
@@ -0,0 +1,17 @@
+"""
+WSGI entry point for the vehicle registration prediction API
+
+    gunicorn -c gunicorn.conf.py
+
+Loads the models at import, so with preload_app they are loaded once in the
+gunicorn master and shared by the forked workers. app.py itself does not load
+anything on import (tests and scripts import it).
+"""
+
+import sys
+
+from app import app, initialize_model, logger
+
+if not initialize_model():
+    logger.error("Failed to initialize optimized model. Please check the error messages above.")
+    sys.exit(1)
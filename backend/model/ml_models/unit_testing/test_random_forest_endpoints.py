@@ -6,7 +6,11 @@ Tests all endpoints including valid predictions, malformed inputs, metadata, and
 import pytest
 import json
 import os
+import sqlite3
+import subprocess
 import sys
+import threading
+import time
 from unittest.mock import patch, MagicMock
 import pandas as pd
 import numpy as np
@@ -34,6 +38,19 @@ accident_app_module = importlib.util.module_from_spec(spec)
 sys.modules["accident_app"] = accident_app_module
 spec.loader.exec_module(accident_app_module)
 app = accident_app_module.app
+AccidentDataLoader = accident_app_module.AccidentDataLoader
+AccidentDataSnapshot = sys.modules['data_loader'].AccidentDataSnapshot
+AccidentHistoryIndex = accident_app_module.AccidentHistoryIndex
+mongo_pool = accident_app_module.mongo_pool
+PredictionCache = accident_app_module.PredictionCache
+CompiledForest = accident_app_module.CompiledForest
+ModelBundle = accident_app_module.ModelBundle
+ModelRegistry = accident_app_module.ModelRegistry
+ModelLoadError = accident_app_module.ModelLoadError
+TrainingJobStore = accident_app_module.TrainingJobStore
+training_worker = sys.modules['training_worker']
+from hyperparameter_search import CandidateSearch, HalvingCandidateSearch, SearchCancelled, fit_searches
+from train_rf_model import AccidentRFTrainer
 
 
 @pytest.fixture
@@ -47,14 +64,15 @@ def client():
 @pytest.fixture
 def mock_models_loaded():
     """Mock the models to be loaded"""
-    # Mock regressor prediction
+    # Mock regressor prediction (one value per feature row)
     mock_regressor = MagicMock()
-    mock_regressor.predict.return_value = np.array([3.5])
+    mock_regressor.predict.side_effect = lambda X: np.full(len(X), 3.5)
     
     # Mock classifier prediction
     mock_classifier = MagicMock()
-    mock_classifier.predict.return_value = np.array([1])  # High risk
-    mock_classifier.predict_proba.return_value = np.array([[0.25, 0.75]])  # 75% high risk
+    mock_classifier.classes_ = np.array([0, 1])
+    mock_classifier.predict.side_effect = lambda X: np.ones(len(X), dtype=int)  # High risk
+    mock_classifier.predict_proba.side_effect = lambda X: np.tile([0.25, 0.75], (len(X), 1))  # 75% high risk
     
     # Mock metadata
     mock_metadata = {
@@ -82,21 +100,26 @@ def mock_models_loaded():
     
     # Mock data_loader
     mock_data_loader = MagicMock()
-    mock_data_loader.connect.return_value = None
-    mock_data_loader.load_raw_data.return_value = []
-    mock_data_loader.aggregate_monthly_counts.return_value = pd.DataFrame()
-    mock_data_loader.disconnect.return_value = None
-    
-    with patch.object(accident_app_module, 'rf_regressor_model', mock_regressor), \
-         patch.object(accident_app_module, 'rf_classifier_model', mock_classifier), \
-         patch.object(accident_app_module, 'model_loaded', True), \
-         patch.object(accident_app_module, 'model_metadata', mock_metadata), \
+    mock_data_loader.get_snapshot.return_value = AccidentDataSnapshot(pd.DataFrame(), [])
+    mock_data_loader.get_cache_info.return_value = {'cached': False, 'ttl_seconds': 300}
+    
+    registry = ModelRegistry()
+    registry.publish(ModelBundle(
+        mock_regressor,
+        ['year', 'month', 'month_sin', 'month_cos', 'year_normalized', 'municipality_encoded',
+         'barangay_encoded', 'accident_count_lag1', 'accident_count_rolling_mean_3'],
+        classifier=mock_classifier,
+        metadata=mock_metadata
+    ))
+    
+    with patch.object(accident_app_module, 'model_registry', registry), \
          patch.object(accident_app_module, 'data_loader', mock_data_loader):
         
         yield {
             'regressor': mock_regressor,
             'classifier': mock_classifier,
-            'metadata': mock_metadata
+            'metadata': mock_metadata,
+            'registry': registry
         }
 
 
@@ -253,6 +276,29 @@ class TestRandomForestBatchPredictions:
         assert isinstance(data['predictions'], list)
         assert len(data['predictions']) > 0
     
+    def test_batch_runs_each_forest_once(self, client, mock_models_loaded):
+        """Test batch prediction builds one feature matrix and traverses each forest once"""
+        payload = {
+            'year': 2024,
+            'month': 6,
+            'locations': [
+                {'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+                {'municipality': 'MATI (CAPITAL)', 'barangay': 'CENTRAL'},
+                {'municipality': 'LUPON', 'barangay': 'POBLACION'}
+            ]
+        }
+        
+        response = client.post('/api/accidents/predict/batch', json=payload)
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['predictions']) == 3
+        assert mock_models_loaded['regressor'].predict.call_count == 1
+        assert mock_models_loaded['classifier'].predict_proba.call_count == 1
+        assert mock_models_loaded['classifier'].predict.call_count == 0
+        assert all(p['is_high_risk'] is True for p in data['predictions'])
+        assert all(p['risk_probability'] == 0.75 for p in data['predictions'])
+    
     def test_malformed_batch_empty_locations(self, client, mock_models_loaded):
         """Test malformed batch input: empty locations array"""
         payload = {
@@ -320,10 +366,7 @@ class TestRandomForestPredictAll:
         })
         
         # Update the data_loader mock to return proper historical data
-        accident_app_module.data_loader.connect.return_value = None
-        accident_app_module.data_loader.load_raw_data.return_value = []
-        accident_app_module.data_loader.aggregate_monthly_counts.return_value = mock_historical_data
-        accident_app_module.data_loader.disconnect.return_value = None
+        accident_app_module.data_loader.get_snapshot.return_value = AccidentDataSnapshot(mock_historical_data, [])
         
         response = client.get('/api/accidents/predict/all?year=2024&month=6')
         
@@ -340,6 +383,31 @@ class TestRandomForestPredictAll:
         assert 'year' in data
         assert 'month' in data
     
+    def test_predict_all_high_risk_hours(self, client, mock_models_loaded):
+        """Test high-risk hour windows come from the snapshot's hourly histogram"""
+        mock_historical_data = pd.DataFrame({
+            'municipality': ['MATI (CAPITAL)'],
+            'barangay': ['DAWAN'],
+            'year': [2024],
+            'month': [5],
+            'accident_count': [12]
+        })
+        accidents = (
+            [{'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN', 'timeCommited': '17:30'}] * 5 +
+            [{'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN', 'timeCommited': '18:05'}] * 5 +
+            [{'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN', 'timeCommited': None,
+              'dateCommited': '2024-05-02T08:00:00Z'},
+             {'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN', 'timeCommited': '03:00'}]
+        )
+        accident_app_module.data_loader.get_snapshot.return_value = AccidentDataSnapshot(mock_historical_data, accidents)
+        
+        response = client.get('/api/accidents/predict/all?year=2024&month=6')
+        
+        assert response.status_code == 200
+        prediction = json.loads(response.data)['predictions'][0]
+        assert prediction['predicted_high_risk_hours'] == [17, 18]
+        assert prediction['predicted_high_risk_ranges'] == '5 PM – 6 PM'
+    
     def test_malformed_predict_all_missing_year(self, client, mock_models_loaded):
         """Test malformed input: missing year for predict all"""
         response = client.get('/api/accidents/predict/all?month=6')
@@ -359,6 +427,101 @@ class TestRandomForestPredictAll:
         
         assert data['success'] is False
         assert 'error' in data
+    
+    def test_predict_all_stream(self, client, mock_models_loaded):
+        """Test ?stream=1 yields NDJSON predictions in the same order, then a summary"""
+        mock_historical_data = pd.DataFrame({
+            'municipality': ['MATI (CAPITAL)'] * 3,
+            'barangay': ['DAWAN', 'CENTRAL', 'MATIAO'],
+            'year': [2024] * 3,
+            'month': [5] * 3,
+            'accident_count': [2, 9, 5]
+        })
+        accident_app_module.data_loader.get_snapshot.return_value = AccidentDataSnapshot(mock_historical_data, [])
+        
+        expected = json.loads(client.get('/api/accidents/predict/all?year=2024&month=6').data)
+        response = client.get('/api/accidents/predict/all?year=2024&month=6&stream=1')
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        
+        records, summary = lines[:-1], lines[-1]
+        assert all(record.pop('type') == 'prediction' for record in records)
+        assert records == expected['predictions']
+        assert summary['type'] == 'summary'
+        assert summary['success'] is True
+        assert summary['total_barangays'] == 3
+        assert (summary['year'], summary['month']) == (2024, 6)
+    
+    def test_predict_all_stream_validation_is_plain_json(self, client, mock_models_loaded):
+        """Test parameter errors are still returned as a JSON body in stream mode"""
+        response = client.get('/api/accidents/predict/all?month=6&stream=1')
+        
+        assert response.status_code == 400
+        assert json.loads(response.data)['success'] is False
+
+
+class TestRandomForestPredictHorizon:
+    """Test cases for the recursive multi-month forecast endpoint"""
+    
+    @pytest.fixture
+    def history(self, mock_models_loaded):
+        history = pd.DataFrame({
+            'municipality': ['MATI (CAPITAL)', 'MATI (CAPITAL)'],
+            'barangay': ['DAWAN', 'CENTRAL'],
+            'year': [2024, 2024],
+            'month': [5, 5],
+            'accident_count': [5, 3]
+        })
+        accident_app_module.data_loader.get_snapshot.return_value = AccidentDataSnapshot(history, [])
+        return history
+    
+    def test_horizon_rolls_predictions_forward(self, client, mock_models_loaded, history):
+        """Test each month's blended prediction becomes the next month's lag1"""
+        response = client.get('/api/accidents/predict/horizon?months=2')
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['start'] == {'year': 2024, 'month': 6}
+        assert [(step['year'], step['month']) for step in data['steps']] == [(2024, 6), (2024, 7)]
+        assert data['warmup_months'] == 0
+        assert 'predict' in data['steps'][0]['timing_ms']
+        
+        # One batched model call per month
+        calls = mock_models_loaded['regressor'].predict.call_args_list
+        assert len(calls) == 2
+        first_step = {p['barangay']: p['predicted_count_raw'] for p in data['steps'][0]['predictions']}
+        second_features = calls[1][0][0]
+        assert second_features['accident_count_lag1'].tolist() == pytest.approx(
+            [first_step['DAWAN'], first_step['CENTRAL']], abs=0.01)
+    
+    def test_horizon_warmup_months(self, client, mock_models_loaded, history):
+        """Test months between the data and the requested start are rolled through"""
+        response = client.get('/api/accidents/predict/horizon?year=2024&month=8&months=1')
+        
+        data = json.loads(response.data)
+        assert data['warmup_months'] == 2
+        assert [(step['year'], step['month']) for step in data['steps']] == [(2024, 8)]
+        assert mock_models_loaded['regressor'].predict.call_count == 3
+    
+    def test_horizon_validation(self, client, mock_models_loaded, history):
+        """Test invalid horizon parameters are rejected"""
+        assert client.get('/api/accidents/predict/horizon?months=13').status_code == 400
+        assert client.get('/api/accidents/predict/horizon?months=0').status_code == 400
+        assert client.get('/api/accidents/predict/horizon?year=2024').status_code == 400
+        assert client.get('/api/accidents/predict/horizon?year=2024&month=13').status_code == 400
+    
+    def test_horizon_rejects_start_far_past_data(self, client, mock_models_loaded, history):
+        """Test a start beyond the warm-up limit is rejected before any month is predicted"""
+        # Data ends 2024-05: 2025-05 is the latest allowed start, 2025-06 is one too far
+        assert client.get('/api/accidents/predict/horizon?year=2025&month=6&months=1').status_code == 400
+        assert client.get('/api/accidents/predict/horizon?year=100000&month=1').status_code == 400
+        assert mock_models_loaded['regressor'].predict.call_count == 0
+        
+        response = client.get('/api/accidents/predict/horizon?year=2025&month=5&months=1')
+        assert response.status_code == 200
+        assert json.loads(response.data)['warmup_months'] == 11
 
 
 class TestRandomForestHealthCheck:
@@ -403,6 +566,14 @@ class TestRandomForestHealthCheck:
         assert set(data1.keys()) == set(data2.keys())
         assert data1['status'] == data2['status']
         assert data1['model_loaded'] == data2['model_loaded']
+    
+    def test_health_check_pool_stats(self, client, mock_models_loaded):
+        """Test health check reports MongoDB pool stats"""
+        response = client.get('/api/accidents/health')
+        data = json.loads(response.data)
+        
+        assert data['mongo_pool']['max_pool_size'] > 0
+        assert 'open_connections' in data['mongo_pool']
 
 
 class TestRandomForestModelNotLoaded:
@@ -410,7 +581,7 @@ class TestRandomForestModelNotLoaded:
     
     def test_prediction_model_not_loaded(self, client):
         """Test prediction endpoint when model is not loaded"""
-        with patch.object(accident_app_module, 'model_loaded', False):
+        with patch.object(accident_app_module, 'model_registry', ModelRegistry()):
             response = client.get(
                 '/api/accidents/predict/count?year=2024&month=6&municipality=MATI%20(CAPITAL)&barangay=DAWAN'
             )
@@ -424,7 +595,7 @@ class TestRandomForestModelNotLoaded:
     
     def test_batch_prediction_model_not_loaded(self, client):
         """Test batch prediction endpoint when model is not loaded"""
-        with patch.object(accident_app_module, 'model_loaded', False):
+        with patch.object(accident_app_module, 'model_registry', ModelRegistry()):
             payload = {
                 'year': 2024,
                 'month': 6,
@@ -445,6 +616,948 @@ class TestRandomForestModelNotLoaded:
             assert 'error' in data
 
 
+class TestAccidentDataCache:
+    """Test cases for the in-memory accident snapshot cache"""
+    
+    @pytest.fixture
+    def loader(self):
+        """Data loader backed by a mocked accidents collection"""
+        collection = MagicMock()
+        collection.find.return_value = [
+            {'dateCommited': '2024-05-03T10:00:00Z', 'timeCommited': '10:00',
+             'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+            {'dateCommited': '2024-05-20T18:00:00Z', 'timeCommited': '18:00',
+             'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+        ]
+        collection.count_documents.return_value = 2
+        collection.find_one.return_value = None
+        
+        loader = AccidentDataLoader(mongo_uri='mongodb://localhost:27017', cache_ttl=300)
+        
+        def fake_connect():
+            loader.collection = collection
+            return True
+        
+        with patch.object(loader, 'connect', side_effect=fake_connect), \
+             patch.object(loader, 'disconnect'):
+            yield loader, collection
+    
+    def test_warm_request_does_not_touch_mongo(self, loader):
+        """Test a second request within the TTL is served from memory"""
+        loader, collection = loader
+        first = loader.get_snapshot()
+        second = loader.get_snapshot()
+        
+        assert first is second
+        assert collection.find.call_count == 1
+        assert collection.count_documents.call_count == 1
+        assert first.historical_data['accident_count'].sum() == 2
+    
+    def test_unchanged_probe_keeps_snapshot(self, loader):
+        """Test an expired TTL with an unchanged probe does not reload the data"""
+        loader, collection = loader
+        first = loader.get_snapshot()
+        first.checked_at -= 600
+        second = loader.get_snapshot()
+        
+        assert first is second
+        assert collection.find.call_count == 1
+        assert collection.count_documents.call_count == 2
+    
+    def test_changed_probe_reloads(self, loader):
+        """Test an expired TTL with a changed document count reloads the data"""
+        loader, collection = loader
+        first = loader.get_snapshot()
+        first.checked_at -= 600
+        collection.count_documents.return_value = 3
+        second = loader.get_snapshot()
+        
+        assert first is not second
+        assert collection.find.call_count == 2
+    
+    def test_invalidate_cache(self, loader):
+        """Test invalidation forces the next request to reload"""
+        loader, collection = loader
+        loader.get_snapshot()
+        loader.invalidate_cache()
+        
+        assert loader.get_cache_info()['cached'] is False
+        loader.get_snapshot()
+        assert collection.find.call_count == 2
+
+
+class TestAccidentHistoryIndex:
+    """Test cases for indexed lag/rolling/baseline lookups"""
+    
+    @pytest.fixture
+    def history(self):
+        """Monthly counts for one barangay in two municipalities"""
+        return pd.DataFrame({
+            'year': [2024, 2024, 2024, 2024, 2024, 2024],
+            'month': [1, 2, 3, 5, 5, 6],
+            'municipality': ['LUPON', 'LUPON', 'LUPON', 'LUPON', 'MANAY', 'LUPON'],
+            'barangay': ['POBLACION'] * 6,
+            'accident_count': [2, 4, 6, 1, 9, 3]
+        })
+    
+    def test_lag_and_rolling_features(self, history):
+        """Test lag1 uses the previous calendar month and rolling windows use the latest rows"""
+        index = AccidentHistoryIndex(history)
+        features = index.history_features(2024, 7, ['POBLACION', 'UNKNOWN'])
+        
+        assert features['accident_count_lag1'].tolist() == [3, 0]
+        assert features['accident_count_lag3'].tolist() == [1, 0]
+        assert features['accident_count_rolling_mean_3'][0] == pytest.approx((1 + 9 + 3) / 3)
+        assert features['accident_count_rolling_std_3'][0] == pytest.approx(np.std([1, 9, 3], ddof=1))
+        assert features['accident_count_rolling_mean_12'][0] == pytest.approx(25 / 6)
+    
+    def test_rolling_requires_previous_month(self, history):
+        """Test rolling windows stay at zero when the previous month had no accidents"""
+        index = AccidentHistoryIndex(history)
+        features = index.history_features(2024, 5, ['POBLACION'])
+        
+        assert features['accident_count_lag1'][0] == 0
+        assert features['accident_count_rolling_mean_3'][0] == 0
+        assert features['accident_count_lag3'][0] == 2
+    
+    def test_baseline_counts(self, history):
+        """Test baseline averages only months with accidents for the exact location"""
+        index = AccidentHistoryIndex(history)
+        baselines = index.baseline_counts(2024, 7, [('LUPON', 'POBLACION'), ('MANAY', 'POBLACION'), ('X', 'Y')])
+        
+        assert baselines.tolist() == [2.0, 9.0, 0.0]
+    
+    def test_empty_history(self):
+        """Test an empty history yields zero features"""
+        index = AccidentHistoryIndex(pd.DataFrame())
+        
+        assert index.history_features(2024, 7, ['POBLACION'])['accident_count_lag1'].tolist() == [0]
+        assert index.baseline_counts(2024, 7, [('LUPON', 'POBLACION')]).tolist() == [0.0]
+
+
+class TestHistoryFeatureBuilder:
+    """Test cases for the vectorized training lag/rolling features"""
+
+    def test_matches_groupby_transform(self):
+        """Test prepare_training_data rows and feature columns match the old transform chain"""
+        from benchmark_feature_builder import synthetic_months, legacy_history_features
+
+        df = synthetic_months(3000)
+        # Same barangay name in two municipalities is still one group
+        df.loc[df.index[:40], 'barangay'] = 'BARANGAY 1'
+        expected = legacy_history_features(df.copy())
+
+        loader = AccidentDataLoader(mongo_uri='mongodb://localhost:27017/', db_name='test')
+        result = loader.prepare_training_data(df.copy())
+
+        assert result.index.equals(expected.index)
+        for column in [c for c in expected.columns if '_lag' in c or '_rolling_' in c]:
+            assert np.array_equal(result[column].to_numpy(), expected[column].to_numpy()), column
+        assert 'barangay_encoder' in result.attrs
+
+    def test_single_row_groups(self):
+        """Test a lone row gets zero lags and std with its own count as mean"""
+        from data_loader import build_history_features
+
+        df = pd.DataFrame({'year': [2024], 'month': [3], 'municipality': ['LUPON'],
+                           'barangay': ['POBLACION'], 'accident_count': [5]})
+        result = build_history_features(df)
+
+        assert result['accident_count_lag1'].tolist() == [0.0]
+        assert result['accident_count_rolling_mean_3'].tolist() == [5.0]
+        assert result['accident_count_rolling_std_3'].tolist() == [0.0]
+        assert result['muni_count_rolling_std_3'].tolist() == [0.0]
+
+
+class TestAccidentAggregationPipeline:
+    """Test cases for server-side monthly/hourly aggregation"""
+    
+    @pytest.fixture
+    def collection(self):
+        """In-memory accidents collection with date, string-date and dirty records"""
+        mongomock = pytest.importorskip('mongomock')
+        from datetime import datetime
+        collection = mongomock.MongoClient().db.accidents
+        collection.insert_many([
+            {'dateCommited': datetime(2024, 5, 3, 10), 'timeCommited': '17:30',
+             'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+            {'dateCommited': datetime(2024, 5, 9, 8), 'timeCommited': '17:45',
+             'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+            {'dateCommited': datetime(2024, 5, 20, 8), 'timeCommited': '99:00',
+             'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+            {'dateCommited': datetime(2024, 6, 1, 21), 'municipality': 'LUPON ', 'barangay': ' POBLACION'},
+            {'dateCommited': datetime(2024, 6, 2, 21), 'timeCommited': '06:15',
+             'municipality': 'Unknown', 'barangay': 'POBLACION'},
+            {'dateCommited': datetime(2024, 6, 3, 5), 'timeCommited': '05:00', 'barangay': 'POBLACION'},
+            {'dateCommited': '2024-06-20T14:00:00Z', 'timeCommited': '14:00',
+             'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+            {'timeCommited': '12:00', 'municipality': 'MATI (CAPITAL)', 'barangay': 'DAWAN'},
+        ])
+        return collection
+    
+    def make_loader(self, collection, mode):
+        loader = AccidentDataLoader(mongo_uri='mongodb://localhost:27017', aggregation_mode=mode)
+        loader.collection = collection
+        return loader
+    
+    def test_pipeline_matches_python_aggregation(self, collection):
+        """Test both modes produce the same monthly counts, histograms and record count"""
+        python_monthly, python_hourly, python_count = self.make_loader(collection, 'python').load_aggregates()
+        pipeline_monthly, pipeline_hourly, pipeline_count = self.make_loader(collection, 'pipeline').load_aggregates()
+        
+        pd.testing.assert_frame_equal(pipeline_monthly, python_monthly)
+        assert pipeline_count == python_count == 8
+        for location in [('MATI (CAPITAL)', 'DAWAN'), ('LUPON ', ' POBLACION'), ('Unknown', 'POBLACION')]:
+            assert pipeline_hourly.get(*location).tolist() == python_hourly.get(*location).tolist()
+        assert pipeline_hourly.get('MATI (CAPITAL)', 'DAWAN')[17] == 2
+    
+    def test_pipeline_monthly_counts(self, collection):
+        """Test the pipeline groups by year/month and strips names"""
+        monthly = self.make_loader(collection, 'pipeline').aggregate_monthly_counts_pipeline()
+        
+        assert monthly[['year', 'month', 'municipality', 'barangay', 'accident_count']].values.tolist() == [
+            [2024, 5, 'MATI (CAPITAL)', 'DAWAN', 3],
+            [2024, 6, 'LUPON', 'POBLACION', 1],
+            [2024, 6, 'MATI (CAPITAL)', 'DAWAN', 1],
+        ]
+    
+    def test_invalid_mode(self):
+        """Test an unknown aggregation mode is rejected"""
+        with pytest.raises(ValueError):
+            AccidentDataLoader(mongo_uri='mongodb://localhost:27017', aggregation_mode='spark')
+
+
+class TestAccidentIncrementalRefresh:
+    """Test cases for watermark-based incremental snapshot refreshes"""
+    
+    @pytest.fixture
+    def collection(self):
+        mongomock = pytest.importorskip('mongomock')
+        collection = mongomock.MongoClient().db.accidents
+        collection.insert_many([self.accident(5, 3, '17:30'), self.accident(5, 9, '08:00'),
+                                self.accident(6, 1, '17:10', barangay='CENTRAL')])
+        return collection
+    
+    @staticmethod
+    def accident(month, day, time_committed, barangay='DAWAN'):
+        from datetime import datetime
+        created = datetime(2024, month, day, 12)
+        return {'dateCommited': created, 'timeCommited': time_committed,
+                'municipality': 'MATI (CAPITAL)', 'barangay': barangay,
+                'createdAt': created, 'updatedAt': created}
+    
+    @pytest.fixture
+    def loader(self, collection):
+        loader = AccidentDataLoader(mongo_uri='mongodb://localhost:27017', cache_ttl=300)
+        
+        def fake_connect():
+            loader.collection = collection
+            return True
+        
+        with patch.object(loader, 'connect', side_effect=fake_connect):
+            loader.get_snapshot()
+            yield loader
+    
+    def refresh(self, loader):
+        loader._snapshot.checked_at -= 600
+        return loader.get_snapshot()
+    
+    def assert_matches_full_build(self, loader, snapshot):
+        monthly, hourly, record_count = loader.load_aggregates()
+        pd.testing.assert_frame_equal(snapshot.historical_data, monthly)
+        assert snapshot.record_count == record_count
+        for location in hourly.location_codes:
+            assert snapshot.hourly_index.get(*location).tolist() == hourly.get(*location).tolist()
+    
+    def test_new_records_are_merged(self, loader, collection):
+        """Test inserts are merged without a full reload and match a full rebuild"""
+        collection.insert_many([self.accident(6, 20, '17:45'), self.accident(7, 2, '09:00', barangay='NEW')])
+        
+        with patch.object(loader, 'load_aggregates', wraps=loader.load_aggregates) as full_load:
+            snapshot = self.refresh(loader)
+            assert full_load.call_count == 0
+        
+        assert snapshot.refresh_kind == 'incremental'
+        assert snapshot.hourly_index.get('MATI (CAPITAL)', 'DAWAN')[17] == 2
+        self.assert_matches_full_build(loader, snapshot)
+    
+    def test_deletion_triggers_full_rebuild(self, loader, collection):
+        """Test a hard delete falls back to a full rebuild"""
+        collection.delete_one({'barangay': 'CENTRAL'})
+        collection.insert_one(self.accident(7, 2, '09:00'))
+        snapshot = self.refresh(loader)
+        
+        assert snapshot.refresh_kind == 'full'
+        self.assert_matches_full_build(loader, snapshot)
+    
+    def test_edit_triggers_full_rebuild(self, loader, collection):
+        """Test an edited existing record falls back to a full rebuild"""
+        from datetime import datetime
+        collection.update_one({'barangay': 'CENTRAL'},
+                              {'$set': {'barangay': 'DAWAN', 'updatedAt': datetime(2024, 8, 1)}})
+        snapshot = self.refresh(loader)
+        
+        assert snapshot.refresh_kind == 'full'
+        assert snapshot.historical_data['barangay'].tolist() == ['DAWAN', 'DAWAN']
+    
+    def test_resync_interval_forces_full_rebuild(self, loader, collection):
+        """Test incremental refreshes stop once the full-resync interval has passed"""
+        loader._snapshot.synced_at -= loader.full_resync_interval + 1
+        collection.insert_one(self.accident(7, 2, '09:00'))
+        snapshot = self.refresh(loader)
+        
+        assert snapshot.refresh_kind == 'full'
+        assert loader.get_cache_info()['refreshes'] == {'full': 2, 'incremental': 0}
+
+
+class TestMongoPool:
+    """Test cases for the process-wide pooled MongoDB client"""
+    
+    @pytest.fixture(autouse=True)
+    def fresh_pool(self):
+        mongo_pool.close_all()
+        with patch.object(mongo_pool, 'MongoClient') as client_class:
+            client_class.side_effect = lambda *args, **kwargs: MagicMock()
+            yield client_class
+        mongo_pool.close_all()
+    
+    def test_client_is_shared(self, fresh_pool):
+        """Test repeated lookups reuse one lazily connected client"""
+        first = mongo_pool.get_client('mongodb://localhost:27017')
+        second = mongo_pool.get_client('mongodb://localhost:27017')
+        
+        assert first is second
+        assert fresh_pool.call_count == 1
+        assert fresh_pool.call_args.kwargs['connect'] is False
+        assert fresh_pool.call_args.kwargs['maxPoolSize'] == mongo_pool.MAX_POOL_SIZE
+    
+    def test_client_rebuilt_in_forked_child(self, fresh_pool):
+        """Test a client inherited from another process is not reused"""
+        parent = mongo_pool.get_client('mongodb://localhost:27017')
+        mongo_pool._owner_pid = -1
+        child = mongo_pool.get_client('mongodb://localhost:27017')
+        
+        assert child is not parent
+        assert not parent.close.called
+    
+    def test_loader_connect_reuses_pool(self, fresh_pool):
+        """Test connect/disconnect per request neither reopens nor closes the client"""
+        loader = AccidentDataLoader(mongo_uri='mongodb://localhost:27017')
+        for _ in range(3):
+            loader.connect()
+            client = loader.client
+            loader.disconnect()
+        
+        assert fresh_pool.call_count == 1
+        assert client.admin.command.call_count == 1
+        assert not client.close.called
+
+
+class TestPredictionCache:
+    """Test cases for the versioned prediction result cache"""
+    
+    @pytest.fixture
+    def cache(self):
+        cache = PredictionCache(max_entries=2, ttl=60)
+        with patch.object(accident_app_module, 'prediction_cache', cache):
+            yield cache
+    
+    @pytest.fixture
+    def snapshot(self, mock_models_loaded):
+        history = pd.DataFrame({
+            'municipality': ['MATI (CAPITAL)', 'MATI (CAPITAL)'],
+            'barangay': ['DAWAN', 'CENTRAL'],
+            'year': [2024, 2024],
+            'month': [5, 5],
+            'accident_count': [5, 3]
+        })
+        snapshot = AccidentDataSnapshot(history, [], fingerprint={'count': 8, 'max_id': 'a', 'max_updated_at': None})
+        accident_app_module.data_loader.get_snapshot.return_value = snapshot
+        return snapshot
+    
+    def test_repeated_predict_all_is_served_from_cache(self, client, mock_models_loaded, cache, snapshot):
+        """Test the second identical request does not run the models"""
+        first = json.loads(client.get('/api/accidents/predict/all?year=2024&month=6').data)
+        second = json.loads(client.get('/api/accidents/predict/all?year=2024&month=6').data)
+        
+        assert first['predictions'] == second['predictions']
+        assert mock_models_loaded['regressor'].predict.call_count == 1
+        assert cache.stats()['hits'] == 1
+    
+    def test_cached_horizon_reports_its_own_timing(self, client, mock_models_loaded, cache, snapshot):
+        """Test a cached horizon forecast does not replay the first request's timings"""
+        url = '/api/accidents/predict/horizon?months=2'
+        first = json.loads(client.get(url).data)
+        with patch.object(accident_app_module.time, 'perf_counter', return_value=0.0):
+            second = json.loads(client.get(url).data)
+        
+        assert cache.stats()['hits'] == 1
+        assert 'predict' in first['steps'][0]['timing_ms']
+        assert all('timing_ms' not in step for step in second['steps'])
+        assert second['timing_ms'] == {'snapshot': 0.0, 'total': 0.0}
+        assert [step['predictions'] for step in second['steps']] == [step['predictions'] for step in first['steps']]
+    
+    def test_data_change_invalidates(self, client, mock_models_loaded, cache, snapshot):
+        """Test a new data fingerprint recomputes predictions"""
+        url = '/api/accidents/predict/count?year=2024&month=6&municipality=MATI%20(CAPITAL)&barangay=DAWAN'
+        client.get(url)
+        snapshot.fingerprint = dict(snapshot.fingerprint, count=9)
+        client.get(url)
+        
+        assert mock_models_loaded['regressor'].predict.call_count == 2
+        assert cache.stats()['invalidations'] == 1
+    
+    def test_model_reload_invalidates(self, client, mock_models_loaded, cache, snapshot):
+        """Test a model (re)load bumps the version and clears cached results"""
+        url = '/api/accidents/predict/count?year=2024&month=6&municipality=MATI%20(CAPITAL)&barangay=DAWAN'
+        client.get(url)
+        registry = mock_models_loaded['registry']
+        registry.publish(ModelBundle(registry.current.regressor, registry.current.feature_columns,
+                                     classifier=registry.current.classifier, metadata=registry.current.metadata))
+        client.get(url)
+        
+        assert mock_models_loaded['regressor'].predict.call_count == 2
+    
+    def test_lru_eviction_and_ttl(self):
+        """Test least recently used entries are evicted and expired entries are misses"""
+        cache = PredictionCache(max_entries=2, ttl=60)
+        cache.put('v1', 'a', 1)
+        cache.put('v1', 'b', 2)
+        cache.get('v1', 'a')
+        cache.put('v1', 'c', 3)
+        
+        assert cache.get('v1', 'b') is None
+        assert cache.get('v1', 'a') == 1
+        assert cache.stats()['evictions'] == 1
+        
+        cache._entries['a'] = (cache._entries['a'][0] - 61, 1)
+        assert cache.get('v1', 'a') is None
+        assert cache.stats()['expirations'] == 1
+    
+    def test_health_reports_counters(self, client, mock_models_loaded, cache):
+        """Test cache counters are exposed on the health endpoint"""
+        data = json.loads(client.get('/api/accidents/health').data)
+        
+        assert data['prediction_cache']['max_entries'] == 2
+        assert {'hits', 'misses', 'evictions'} <= set(data['prediction_cache'])
+
+
+class TestModelRegistry:
+    """Test cases for atomic model bundle publishing, rollback and validation"""
+
+    def test_request_uses_one_bundle_during_reload(self, client, mock_models_loaded):
+        """Test a bundle published mid-request does not mix into that request"""
+        registry = mock_models_loaded['registry']
+        new_classifier = MagicMock()
+        new_classifier.classes_ = np.array([0, 1])
+        new_classifier.predict_proba.side_effect = lambda X: np.tile([0.9, 0.1], (len(X), 1))
+
+        def predict_and_reload(X):
+            registry.publish(ModelBundle(MagicMock(), registry.current.feature_columns, classifier=new_classifier))
+            return np.full(len(X), 3.5)
+        mock_models_loaded['regressor'].predict.side_effect = predict_and_reload
+
+        data = json.loads(client.get(
+            '/api/accidents/predict/count?year=2024&month=6&municipality=MATI%20(CAPITAL)&barangay=DAWAN'
+        ).data)
+
+        assert data['prediction']['risk_probability'] == 0.75
+        assert not new_classifier.predict_proba.called
+        assert registry.current.classifier is new_classifier
+
+    def test_rollback_swaps_bundles(self, client, mock_models_loaded):
+        """Test rollback serves the previous bundle and can be undone"""
+        registry = mock_models_loaded['registry']
+        first = registry.current
+        second = registry.publish(ModelBundle(MagicMock(), first.feature_columns))
+
+        response = client.post('/api/accidents/rollback-model')
+        assert response.status_code == 200
+        assert registry.current is first
+        assert json.loads(response.data)['model_bundle']['generation'] == first.generation
+
+        client.post('/api/accidents/rollback-model')
+        assert registry.current is second
+
+    def test_rollback_refused_with_several_workers(self, client, mock_models_loaded):
+        """Test rollback is refused when other worker processes would keep the newer bundle"""
+        registry = mock_models_loaded['registry']
+        first = registry.current
+        registry.publish(ModelBundle(first.regressor, first.feature_columns))
+        current = registry.current
+        with patch.object(accident_app_module, 'SERVING_WORKERS', 2):
+            assert client.post('/api/accidents/rollback-model').status_code == 409
+        
+        assert registry.current is current
+    
+    def test_rollback_without_previous(self, client):
+        """Test rollback is refused when only one bundle was ever loaded"""
+        with patch.object(accident_app_module, 'model_registry', ModelRegistry()):
+            assert client.post('/api/accidents/rollback-model').status_code == 409
+
+    def test_failed_reload_keeps_serving_current_bundle(self, mock_models_loaded):
+        """Test a reload that cannot load the new files leaves the current bundle in place"""
+        registry = mock_models_loaded['registry']
+        current = registry.current
+        with patch.object(ModelBundle, 'load', side_effect=ModelLoadError('Feature columns not found')):
+            assert accident_app_module.initialize_model() is False
+
+        assert registry.current is current
+
+    def test_validate_rejects_mismatched_features(self):
+        """Test a forest trained on another feature set is not published"""
+        regressor = MagicMock(n_features_in_=3)
+        with pytest.raises(ModelLoadError):
+            ModelBundle(regressor, ['year', 'month']).validate()
+        ModelBundle(regressor, ['year', 'month', 'month_sin']).validate()
+
+
+class TestCompiledForest:
+    """Test cases for the array-backed forest inference path"""
+    
+    @pytest.fixture
+    def data(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(300, 6)) * 3
+        X[rng.random(X.shape) < 0.05] = np.nan
+        y = np.nan_to_num(X[:, 0]) + rng.normal(size=300)
+        return X, y
+    
+    def test_regressor_matches_sklearn(self, data):
+        """Test compiled regressor predictions match sklearn"""
+        from sklearn.ensemble import RandomForestRegressor
+        X, y = data
+        model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+        compiled = CompiledForest.from_sklearn(model)
+        
+        np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=1e-9)
+        np.testing.assert_allclose(compiled.predict(X[:1]), model.predict(X[:1]), rtol=1e-9)
+    
+    def test_classifier_matches_sklearn(self, data):
+        """Test compiled classifier probabilities and classes match sklearn"""
+        from sklearn.ensemble import RandomForestClassifier
+        X, y = data
+        labels = np.digitize(y, [-1, 1])
+        model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, labels)
+        compiled = CompiledForest.from_sklearn(model)
+        
+        np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), atol=1e-12)
+        assert (compiled.predict(X) == model.predict(X)).all()
+    
+    def test_save_load_and_stale_export(self, data, tmp_path):
+        """Test exports round-trip and a mismatching export is recompiled"""
+        from sklearn.ensemble import RandomForestRegressor
+        X, y = data
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+        other = RandomForestRegressor(n_estimators=7, random_state=0).fit(X, y)
+        path = str(tmp_path / 'forest.joblib')
+        CompiledForest.from_sklearn(other).save(path)
+        
+        loaded = CompiledForest.load(path)
+        assert loaded.matches(other)
+        # Node arrays are mapped from the file, not copied into the process
+        assert isinstance(loaded.child, np.memmap) and not loaded.child.flags.writeable
+        np.testing.assert_allclose(loaded.predict(X), other.predict(X), rtol=1e-9)
+        compiled = accident_app_module.load_compiled_forest(model, path)
+        assert compiled.matches(model)
+        np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=1e-9)
+    
+    def test_large_batches_use_sklearn(self):
+        """Test batches above the row limit go to the sklearn model"""
+        model, compiled = MagicMock(), MagicMock()
+        limit = accident_app_module.COMPILED_FOREST_MAX_ROWS
+        
+        assert accident_app_module.select_forest(model, compiled, limit) is compiled
+        assert accident_app_module.select_forest(model, compiled, limit + 1) is model
+        assert accident_app_module.select_forest(model, None, 1) is model
+
+
+class TestTrainingJobs:
+    """Test cases for the SQLite training job queue and the training worker"""
+    
+    @pytest.fixture
+    def store(self, tmp_path):
+        store = TrainingJobStore(str(tmp_path / 'jobs.db'), str(tmp_path / 'logs'))
+        with patch.object(accident_app_module, 'job_store', store), \
+             patch.object(accident_app_module, 'spawn_worker') as spawn:
+            store.spawn = spawn
+            yield store
+    
+    def worker(self, store, tmp_path, command):
+        progress = accident_app_module.ProgressTracker(str(tmp_path / 'progress.json'))
+        return training_worker.TrainingWorker(store, command=command, progress_tracker=progress,
+                                              poll_interval=0.05, kill_grace=2)
+    
+    def test_retrain_queues_one_job(self, client, store):
+        """Test retrain returns a job ID, starts a worker and rejects a second job"""
+        response = client.post('/api/accidents/retrain', json={})
+        assert response.status_code == 202
+        job_id = json.loads(response.data)['job_id']
+        assert store.get(job_id)['status'] == 'queued'
+        assert store.spawn.call_count == 1
+        
+        conflict = client.post('/api/accidents/retrain', json={})
+        assert conflict.status_code == 409
+        assert json.loads(conflict.data)['job_id'] == job_id
+        
+        status = json.loads(client.get(f'/api/accidents/training-jobs/{job_id}').data)
+        assert status['job']['status'] == 'queued'
+        assert client.get('/api/accidents/training-jobs/missing').status_code == 404
+    
+    def test_retrain_passes_search_options(self, client, store):
+        """Test search_mode/time_budget become training script arguments and are validated"""
+        assert client.post('/api/accidents/retrain', json={'search_mode': 'grid'}).status_code == 400
+        assert client.post('/api/accidents/retrain', json={'time_budget': -5}).status_code == 400
+        
+        response = client.post('/api/accidents/retrain', json={'search_mode': 'halving', 'time_budget': 600})
+        assert response.status_code == 202
+        job = store.get(json.loads(response.data)['job_id'])
+        assert job['params']['args'] == ['--search-mode', 'halving', '--time-budget', '600']
+        store.request_cancel(job['id'])
+        
+        response = client.post('/api/accidents/retrain', json={'execution': 'concurrent'})
+        job = store.get(json.loads(response.data)['job_id'])
+        assert job['params']['args'] == ['--search-mode', 'random', '--execution', 'concurrent']
+        assert client.post('/api/accidents/retrain', json={'execution': 'parallel'}).status_code == 400
+    
+    def test_retrain_passes_refresh_options(self, client, store):
+        """Test refresh/refresh_tolerance become training script arguments and are validated"""
+        assert client.post('/api/accidents/retrain', json={'refresh': True, 'refresh_tolerance': 'x'}).status_code == 400
+        
+        response = client.post('/api/accidents/retrain', json={'refresh': True, 'refresh_tolerance': 0.05})
+        assert response.status_code == 202
+        job = store.get(json.loads(response.data)['job_id'])
+        assert job['params']['args'] == ['--search-mode', 'random', '--refresh', '--refresh-tolerance', '0.05']
+    
+    def test_retrain_spawns_worker_while_one_looks_alive(self, client, store):
+        """Test a worker is spawned even if the last heartbeat is fresh (the worker may be exiting)"""
+        store.heartbeat(os.getpid())
+        response = client.post('/api/accidents/retrain', json={})
+        
+        assert response.status_code == 202
+        assert json.loads(response.data)['worker_alive'] is True
+        assert store.spawn.call_count == 1
+    
+    def test_once_worker_runs_job_submitted_while_exiting(self, store, tmp_path):
+        """Test a job submitted after the worker's last empty poll is still run"""
+        worker = self.worker(store, tmp_path, [sys.executable, '-c', 'pass'])
+        claim_next = store.claim_next
+        submitted = []
+        
+        def claim_then_submit():
+            job = claim_next()
+            if job is None and not submitted:
+                # The API sees the worker alive and its spawned worker loses the lock
+                submitted.append(store.submit())
+            return job
+        
+        with patch.object(store, 'claim_next', side_effect=claim_then_submit):
+            ran = worker.run(once=True)
+        
+        assert ran == 1
+        assert store.get(submitted[0]['id'])['status'] == 'succeeded'
+        assert store.worker_status()['alive'] is False
+    
+    def test_failed_load_is_retried_after_training(self, store):
+        """Test a job whose model could not be loaded is not recorded as loaded"""
+        job = store.submit()
+        store.claim_next()
+        store.finish(job['id'], training_worker.SUCCEEDED, returncode=0)
+        
+        with patch.object(accident_app_module, 'loaded_training_job_id', None), \
+             patch.object(ModelBundle, 'load', side_effect=ModelLoadError('Feature columns not found')):
+            assert accident_app_module.initialize_model() is False
+            assert accident_app_module.loaded_training_job_id is None
+    
+    def test_job_store_error_does_not_block_model_load(self, store, mock_models_loaded):
+        """Test the model still loads when the job database cannot be read"""
+        registry = mock_models_loaded['registry']
+        bundle = ModelBundle(registry.current.regressor, registry.current.feature_columns)
+        with patch.object(store, 'latest_succeeded', side_effect=sqlite3.OperationalError('database is locked')), \
+             patch.object(ModelBundle, 'load', return_value=bundle) as load:
+            assert accident_app_module.initialize_model() is True
+        
+        assert load.call_args[0][2] is None
+        assert registry.current is bundle
+    
+    def test_recovery_leaves_reused_pid_alone(self, store, tmp_path):
+        """Test a stored pid that now belongs to another process is not signalled"""
+        job = store.submit()
+        store.claim_next()
+        unrelated = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'], start_new_session=True)
+        try:
+            store.set_pid(job['id'], unrelated.pid)
+            self.worker(store, tmp_path, [sys.executable, '-c', 'pass']).recover_interrupted()
+            
+            assert unrelated.poll() is None
+            assert store.get(job['id'])['status'] == 'queued'
+        finally:
+            unrelated.kill()
+            unrelated.wait()
+    
+    @pytest.mark.skipif(not os.path.exists('/proc/self/environ'), reason='needs /proc')
+    def test_recovery_stops_orphaned_training_process(self, store, tmp_path):
+        """Test a training process that outlived its worker is stopped before the job is requeued"""
+        job = store.submit()
+        store.claim_next()
+        orphan = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'], start_new_session=True,
+                                  env=dict(os.environ, TRAINING_JOB_ID=job['id']))
+        try:
+            store.set_pid(job['id'], orphan.pid)
+            self.worker(store, tmp_path, [sys.executable, '-c', 'pass']).recover_interrupted()
+            
+            assert orphan.wait(timeout=10) is not None
+            assert store.get(job['id'])['status'] == 'queued'
+        finally:
+            if orphan.poll() is None:
+                orphan.kill()
+                orphan.wait()
+    
+    def test_cancel_queued_job(self, client, store):
+        """Test a queued job is cancelled without a worker and frees the queue"""
+        job = store.submit()
+        response = client.post(f"/api/accidents/training-jobs/{job['id']}/cancel")
+        
+        assert json.loads(response.data)['job']['status'] == 'cancelled'
+        assert store.active() is None
+        assert store.submit()['status'] == 'queued'
+    
+    def test_worker_runs_job_and_streams_log(self, client, store, tmp_path):
+        """Test the worker runs a job to success and its output lands in the job log"""
+        job = store.submit()
+        ran = self.worker(store, tmp_path, [sys.executable, '-c', 'print("training output")']).run(once=True)
+        
+        assert ran == 1
+        assert store.get(job['id'])['status'] == 'succeeded'
+        log = client.get(f"/api/accidents/training-jobs/{job['id']}/log")
+        assert 'training output' in log.data.decode('utf-8')
+        assert store.worker_status()['alive'] is False
+    
+    def test_cancel_stops_running_process(self, store, tmp_path):
+        """Test cancelling a running job stops its training process"""
+        job = store.submit()
+        worker = self.worker(store, tmp_path, [sys.executable, '-c', 'import time; time.sleep(60)'])
+        thread = threading.Thread(target=worker.run, kwargs={'once': True})
+        thread.start()
+        
+        deadline = time.monotonic() + 10
+        while not (store.get(job['id'])['pid']) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        pid = store.get(job['id'])['pid']
+        store.request_cancel(job['id'])
+        thread.join(timeout=10)
+        
+        assert not thread.is_alive()
+        assert store.get(job['id'])['status'] == 'cancelled'
+        assert not training_worker.process_alive(pid)
+    
+    def test_interrupted_job_is_requeued(self, store, tmp_path):
+        """Test a job left running by a dead worker is requeued on worker start"""
+        job = store.submit()
+        store.claim_next()
+        self.worker(store, tmp_path, [sys.executable, '-c', 'pass']).recover_interrupted()
+        
+        assert store.get(job['id'])['status'] == 'queued'
+
+
+class TestCandidateSearch:
+    """Test cases for the candidate-level hyperparameter search"""
+    
+    @pytest.fixture
+    def data(self):
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.normal(size=(200, 4)), columns=['a', 'b', 'c', 'd'])
+        y = X['a'] * 2 + rng.normal(size=200)
+        return X, y
+    
+    def search(self, search_class=CandidateSearch, **kwargs):
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.model_selection import KFold
+        params = dict(
+            estimator=RandomForestRegressor(random_state=42, n_jobs=-1),
+            param_distributions={'n_estimators': [5, 10], 'max_depth': [3, None], 'min_samples_leaf': [1, 4]},
+            n_iter=4, cv=KFold(n_splits=3, shuffle=True, random_state=42),
+            scoring='neg_mean_absolute_error', random_state=42, n_jobs=2, poll_interval=0.1
+        )
+        params.update(kwargs)
+        return search_class(**params)
+    
+    def test_matches_randomized_search(self, data):
+        """Test candidates, scores and the refit best model match RandomizedSearchCV"""
+        from sklearn.model_selection import RandomizedSearchCV
+        X, y = data
+        search = self.search()
+        reference = RandomizedSearchCV(search.estimator, search.param_distributions, n_iter=4, cv=search.cv,
+                                       scoring=search.scoring, random_state=42).fit(X, y)
+        progress = []
+        search.progress_callback = lambda s: progress.append(s.fraction_complete)
+        search.fit(X, y)
+        
+        assert search.best_params_ == reference.best_params_
+        assert np.allclose(search.cv_results_['mean_test_score'], reference.cv_results_['mean_test_score'])
+        assert list(search.cv_results_['rank_test_score']) == list(reference.cv_results_['rank_test_score'])
+        assert np.allclose(search.best_estimator_.predict(X), reference.best_estimator_.predict(X))
+        assert len(progress) == 12 and progress[-1] == 1.0
+    
+    def test_cancel_keeps_partial_results(self, data, tmp_path):
+        """Test a cancel stops the running fits and saves the candidates finished so far"""
+        X, y = data
+        results_path = tmp_path / 'cv_results.json'
+        search = self.search(
+            param_distributions={'n_estimators': [5, 5000]}, n_iter=2,
+            should_cancel=lambda: search.completed_candidates >= 1,
+            results_path=str(results_path)
+        )
+        start = time.monotonic()
+        with pytest.raises(SearchCancelled):
+            search.fit(X, y)
+        
+        assert time.monotonic() - start < 30
+        saved = json.loads(results_path.read_text())
+        assert saved['status'] == 'cancelled'
+        assert saved['completed_candidates'] == 1
+        assert saved['candidates'][0]['params']['n_estimators'] == 5
+    
+    def test_halving_drops_weak_candidates(self, data, tmp_path):
+        """Test successive halving scores fewer candidates per round and refits the last round's best"""
+        X, y = data
+        results_path = tmp_path / 'cv_results.json'
+        search = self.search(
+            HalvingCandidateSearch, factor=3, n_iter=9, results_path=str(results_path),
+            param_distributions={'n_estimators': [5, 10, 20], 'max_depth': [1, 3, None]}
+        )
+        search.fit(X, y)
+        
+        assert search.candidates_per_round_ == [9, 3, 1]
+        assert search.resources_[-1] == min(len(train) for train, _ in search.splits_)
+        assert search.resources_[0] < search.resources_[-1]
+        assert search.completed_tasks_ == search.total_tasks_ == 13 * 3
+        assert list(search.cv_results_['iter']) == [0] * 9 + [1] * 3 + [2]
+        assert search.cv_results_['rank_test_score'][search.best_index_] == 1
+        assert search.best_params_['max_depth'] != 1
+        assert search.best_estimator_.get_params()['max_depth'] == search.best_params_['max_depth']
+        
+        summary = json.loads(results_path.read_text())
+        assert summary['mode'] == 'halving' and summary['status'] == 'completed'
+        assert [point['iter'] for point in summary['trajectory']] == [0, 1, 2]
+        assert summary['trajectory'][-1]['best_score'] == pytest.approx(search.best_score_)
+    
+    def test_concurrent_searches_match_separate_fits(self, data):
+        """Test two searches sharing one pool and precomputed folds give the same results as separate fits"""
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import KFold
+        X, y = data
+        y_class = (y > y.median()).astype(int)
+        splits = list(KFold(n_splits=3, shuffle=True, random_state=42).split(X))
+        
+        def pair():
+            return (self.search(cv=splits, name='regressor'),
+                    self.search(cv=splits, name='classifier', scoring='accuracy',
+                                estimator=RandomForestClassifier(random_state=42, n_jobs=-1)))
+        
+        separate = pair()
+        separate[0].fit(X, y)
+        separate[1].fit(X, y_class)
+        shared = pair()
+        fit_searches([(shared[0], X, y), (shared[1], X, y_class)], n_jobs=2)
+        
+        for one, other in zip(separate, shared):
+            assert one.best_params_ == other.best_params_
+            assert np.allclose(one.cv_results_['mean_test_score'], other.cv_results_['mean_test_score'])
+            assert other.status_ == 'completed' and other.summary()['fit_seconds'] > 0
+    
+    def test_time_budget_uses_best_so_far(self, data):
+        """Test an exhausted time budget stops the running fits and keeps the finished candidate"""
+        X, y = data
+        search = self.search(param_distributions={'n_estimators': [5, 5000]}, n_iter=2, time_budget=0.5)
+        start = time.monotonic()
+        search.fit(X, y)
+        
+        assert time.monotonic() - start < 30
+        assert search.status_ == 'budget_exhausted'
+        assert search.best_params_ == {'n_estimators': 5}
+        summary = search.summary()
+        assert summary['completed_candidates'] == 1
+        assert summary['trajectory'][-1]['best_score'] == pytest.approx(search.best_score_)
+    
+    def test_progress_update_keeps_cancellation(self, tmp_path):
+        """Test progress updates cannot overwrite a pending cancel"""
+        tracker = accident_app_module.ProgressTracker(str(tmp_path / 'progress.json'))
+        tracker.update(5, "Training Regressor", 40)
+        tracker.cancel()
+        tracker.update(5, "Training Regressor", 45)
+        
+        assert tracker.is_cancelled()
+    
+    def test_import_does_not_load_sklearn(self, tmp_path):
+        """Test the API can import SEARCH_MODES without pulling in sklearn"""
+        import subprocess
+        code = "import sys, hyperparameter_search; print('sklearn' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path), capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=accident_prediction_dir))
+        
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == 'False'
+
+
+class TestRefreshRetraining:
+    """Test cases for refresh retraining with the previous best hyperparameters"""
+    
+    FEATURES = ['a', 'b']
+    
+    @pytest.fixture
+    def trainer(self, tmp_path):
+        metadata = {
+            'feature_columns': self.FEATURES,
+            'regressor_metrics': {'test_r2': 0.60, 'best_params': {'n_estimators': 5, 'max_depth': 3}},
+            'classifier_metrics': {'test_accuracy': 0.90}
+        }
+        (tmp_path / 'accident_rf_regression_metadata.json').write_text(json.dumps(metadata))
+        trainer = AccidentRFTrainer(model_dir=str(tmp_path), refresh=True, refresh_tolerance=0.02)
+        trainer.feature_columns = self.FEATURES
+        return trainer
+    
+    @pytest.fixture
+    def data(self):
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.normal(size=(60, 2)), columns=self.FEATURES)
+        return X, X['a'] * 2
+    
+    def test_refit_with_previous_params(self, trainer, data):
+        """Test a model is refit once with the previous best_params when its metric holds"""
+        from sklearn.ensemble import RandomForestRegressor
+        X, y = data
+        trainer.refresh_plan = trainer._plan_refresh()
+        metrics = trainer._refresh_model('regressor', RandomForestRegressor(random_state=0), X, y,
+                                         lambda: {'test_r2': 0.59})
+        
+        assert metrics['best_params'] == {'n_estimators': 5, 'max_depth': 3}
+        assert len(trainer.regressor_model.estimators_) == 5
+        assert trainer.refresh_decisions['regressor']['action'] == 'refit'
+        # No previous best_params: the classifier is searched
+        assert 'classifier' not in trainer.refresh_plan
+        assert trainer.refresh_decisions['classifier']['action'] == 'search'
+    
+    def test_degraded_metric_falls_back_to_search(self, trainer, data):
+        """Test a metric drop beyond the tolerance requests a full search"""
+        from sklearn.ensemble import RandomForestRegressor
+        X, y = data
+        trainer.refresh_plan = trainer._plan_refresh()
+        metrics = trainer._refresh_model('regressor', RandomForestRegressor(random_state=0), X, y,
+                                         lambda: {'test_r2': 0.50})
+        
+        assert metrics is None
+        assert trainer.refresh_decisions['regressor']['action'] == 'search'
+        assert 'dropped' in trainer.refresh_decisions['regressor']['reason']
+    
+    def test_feature_change_falls_back_to_search(self, trainer):
+        """Test a changed feature set disables the refresh"""
+        trainer.feature_columns = self.FEATURES + ['c']
+        
+        assert trainer._plan_refresh() == {}
+        assert trainer.refresh_decisions['regressor']['reason'] == 'feature set changed'
+
+
 class TestRandomForestModelMetadata:
     """Test cases for model metadata"""
     
@@ -214,6 +214,104 @@ class TestSARIMAPredictions:
             assert 'error' in data
 
 
+class TestSARIMABarangayStreaming:
+    """Test cases for ?stream=1 on the barangay registration endpoint"""
+    
+    @pytest.fixture
+    def barangay_predictor(self, mock_model_initialized):
+        mock_model_initialized.predict.return_value = {
+            'daily_predictions': [
+                {'date': '2025-08-03', 'predicted_count': 10},
+                {'date': '2025-08-04', 'predicted_count': 6},
+                {'date': '2025-08-10', 'predicted_count': 20}
+            ]
+        }
+        predictor = sarima_app_module.BarangayPredictor('unused.csv')
+        proportions = {'LUPON': {'POBLACION': 0.75, 'CALAPAGAN': 0.25}}
+        with patch.object(predictor, 'calculate_barangay_proportions', return_value=proportions), \
+             patch.object(sarima_app_module, 'municipality_models', {'LUPON': mock_model_initialized}), \
+             patch.object(sarima_app_module, 'barangay_predictor', predictor):
+            yield predictor
+    
+    def test_stream_matches_json_response(self, client, barangay_predictor):
+        """Test streamed records equal the buffered response and end with a summary"""
+        expected = json.loads(client.get('/api/predict/registrations/barangay?weeks=2&municipality=LUPON').data)['data']
+        response = client.get('/api/predict/registrations/barangay?weeks=2&municipality=LUPON&stream=1')
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        
+        records, summary = lines[:-1], lines[-1]
+        assert all(record.pop('type') == 'prediction' for record in records)
+        assert records == expected['barangay_predictions']
+        assert summary['type'] == 'summary'
+        assert summary['total_records'] == 4
+        assert summary['prediction_dates'] == expected['prediction_dates']
+        assert summary['municipality_summary']['LUPON']['POBLACION']['total_predicted'] == 12 + 15
+    
+    def test_stream_validation_is_plain_json(self, client, barangay_predictor):
+        """Test parameter errors are still returned as a JSON body in stream mode"""
+        response = client.get('/api/predict/registrations/barangay?weeks=0&stream=1')
+        
+        assert response.status_code == 400
+        assert json.loads(response.data)['success'] is False
+
+
+class TestBarangayProportions:
+    """Test cases for the cached barangay proportions and their distribution"""
+    
+    @pytest.fixture
+    def csv_path(self, tmp_path):
+        pd.DataFrame({
+            'dateOfRenewal': ['03/03/2025', '03/04/2025', '03/05/2025', '03/05/2025'],
+            'address_municipality': ['LUPON', 'LUPON', 'LUPON', 'MANAY'],
+            'address_barangay': ['POBLACION', 'POBLACION', 'CALAPAGAN', 'TAOCANGA']
+        }).to_csv(tmp_path / 'DAVOR_data.csv', index=False)
+        return str(tmp_path / 'DAVOR_data.csv')
+    
+    def test_counts_sum_to_municipality_total(self):
+        """Test largest-remainder rounding keeps every week's total"""
+        from barangay_predictor import largest_remainder_counts
+        
+        counts = largest_remainder_counts([10, 7, 0], [1 / 3, 1 / 3, 1 / 3])
+        
+        assert counts.tolist() == [[4, 3, 3], [3, 2, 2], [0, 0, 0]]
+        assert largest_remainder_counts([16], [0.5, 0.3, 0.2]).tolist() == [[8, 5, 3]]
+    
+    def test_proportions_cached_until_csv_changes(self, csv_path):
+        """Test proportions are computed once for all municipalities and again after a CSV changes"""
+        predictor = sarima_app_module.BarangayPredictor(csv_path)
+        
+        with patch.object(predictor, 'load_barangay_data', wraps=predictor.load_barangay_data) as load:
+            assert predictor.calculate_barangay_proportions('LUPON') == {
+                'LUPON': {'CALAPAGAN': 1 / 3, 'POBLACION': 2 / 3}
+            }
+            assert predictor.calculate_barangay_proportions('MANAY') == {'MANAY': {'TAOCANGA': 1.0}}
+            assert load.call_count == 1
+            
+            pd.DataFrame({
+                'dateOfRenewal': ['03/06/2025'],
+                'address_municipality': ['LUPON'],
+                'address_barangay': ['CALAPAGAN']
+            }).to_csv(os.path.join(os.path.dirname(csv_path), 'added.csv'), index=False)
+            assert predictor.calculate_barangay_proportions('LUPON') == {
+                'LUPON': {'CALAPAGAN': 0.5, 'POBLACION': 0.5}
+            }
+            assert load.call_count == 2
+    
+    def test_distributed_counts_sum_to_total(self, csv_path):
+        """Test barangay predictions add up to each week's municipality prediction"""
+        predictor = sarima_app_module.BarangayPredictor(csv_path)
+        
+        predictions = predictor.predict_barangay_registrations({'LUPON': {'2025-08-03': 10, '2025-08-10': 11}}, 'LUPON')
+        
+        assert [(p['date'], p['barangay'], p['predicted_count']) for p in predictions] == [
+            ('2025-08-03', 'CALAPAGAN', 3), ('2025-08-03', 'POBLACION', 7),
+            ('2025-08-10', 'CALAPAGAN', 4), ('2025-08-10', 'POBLACION', 7)
+        ]
+
+
 class TestSARIMAModelMetadata:
     """Test cases for SARIMA model metadata endpoints"""
     
@@ -264,6 +362,26 @@ class TestSARIMAModelMetadata:
         assert accuracy_data['model_type'] == 'optimized_sarima_daily'
 
 
+class TestSARIMAModelFiles:
+    """Test cases for saving model files that serving processes memory-map"""
+    
+    def test_save_replaces_mapped_model_file(self, tmp_path):
+        """Test a retrain swaps in new files instead of rewriting the mapped one in place"""
+        import joblib
+        import numpy as np
+        model = sarima_app_module.OptimizedSARIMAModel(str(tmp_path))
+        model.fitted_model = {'params': np.arange(100000.0)}
+        model.save_model()
+        serving = joblib.load(model.model_file, mmap_mode='c')
+        
+        model.fitted_model = {'params': np.zeros(10)}
+        model.save_model()
+        
+        assert serving['params'][-1] == 99999.0
+        assert len(joblib.load(model.model_file)['params']) == 10
+        assert sorted(os.listdir(tmp_path)) == ['optimized_sarima_metadata.json', 'optimized_sarima_model.pkl']
+
+
 class TestSARIMAHealthCheck:
     """Test cases for SARIMA health check endpoint"""
     
@@ -351,6 +469,16 @@ class TestSARIMARetrain:
             assert data['success'] is False
             assert 'force' in data.get('error', '').lower() or 'already exists' in data.get('error', '').lower()
     
+    def test_retrain_refused_with_several_workers(self, client, mock_model_initialized):
+        """Test retraining is refused when other workers would keep serving the old models"""
+        with patch.object(sarima_app_module, 'SERVING_WORKERS', 2), \
+             patch.object(sarima_app_module, 'export_mongo_to_csv') as export:
+            response = client.post('/api/model/retrain', json={'force': True})
+        
+        assert response.status_code == 409
+        assert json.loads(response.data)['success'] is False
+        assert not export.called
+    
     def test_retrain_with_force(self, client, mock_model_initialized):
         """Test retrain endpoint with force parameter"""
         with patch('app.preprocessor') as mock_preprocessor, \
@@ -375,6 +503,261 @@ class TestSARIMARetrain:
                 assert data['success'] is True
 
 
+class TestSARIMADailySeries:
+    """Test cases for loading the daily series of all municipalities in one pass"""
+    
+    @pytest.fixture
+    def preprocessor(self, tmp_path):
+        from data_preprocessor_daily import DailyDataPreprocessor
+        
+        rows = [
+            ('F1', '03/03/2025', 'Lupon', 'LD1234'),
+            ('F2', '03/03/2025', 'CITY OF MATI', 'AB5678'),
+            ('F3', '03/05/2025', 'lupon ', 'CD9012'),
+            ('F4', '03/09/2025', 'CITY OF MATI', 'EF3456'),
+            ('F5', '03/04/2025', 'DAVAO CITY', 'GH7890'),
+            ('F6', 'not a date', 'LUPON', 'IJ1234')
+        ]
+        columns = ['fileNo', 'dateOfRenewal', 'address_municipality', 'plateNo']
+        pd.DataFrame(rows[:3], columns=columns).to_csv(tmp_path / 'DAVOR_data.csv', index=False)
+        # Second export repeating F1 (dropped as a duplicate)
+        pd.DataFrame(rows[:1] + rows[3:], columns=columns).to_csv(tmp_path / 'older.csv', index=False)
+        return DailyDataPreprocessor(str(tmp_path / 'DAVOR_data.csv'))
+    
+    def test_matches_per_municipality_loading(self, preprocessor):
+        """Test every series equals the one load_and_process_daily_data() returns"""
+        aggregated, municipality_series = preprocessor.load_all_daily_series(fill_method='zero')
+        
+        assert sorted(municipality_series) == ['CITY OF MATI', 'LUPON']
+        expected = [(aggregated, preprocessor.load_and_process_daily_data(fill_method='zero'))] + [
+            (series, preprocessor.load_and_process_daily_data(fill_method='zero', municipality=name))
+            for name, series in municipality_series.items()
+        ]
+        for (daily_data, exogenous_vars, processing_info), (daily, exog, info) in expected:
+            pd.testing.assert_frame_equal(daily_data, daily)
+            pd.testing.assert_frame_equal(exogenous_vars, exog)
+            assert processing_info == info
+        assert aggregated[0]['count'].tolist() == [2, 0, 1, 0, 0, 0, 1]
+        assert municipality_series['LUPON'][2]['total_registrations'] == 2
+        assert aggregated[2]['duplicates_removed'] == 1
+    
+    def test_reads_each_csv_once(self, preprocessor):
+        """Test the CSV files are read once for all municipalities"""
+        with patch('data_preprocessor_daily.pd.read_csv', wraps=pd.read_csv) as read_csv:
+            preprocessor.load_all_daily_series(fill_method='zero')
+        
+        assert read_csv.call_count == 2
+
+
+class TestRegistrationSnapshot:
+    """Test cases for the columnar snapshot the registration loaders read"""
+    
+    @pytest.fixture
+    def csv_dir(self, tmp_path):
+        pd.DataFrame({
+            'plateNo': ['LD1234', 'AB5678'],
+            'fileNo': ['F1', 'F2'],
+            'dateOfRenewal': ['03/03/2025', 'bad date'],
+            'ownerRepresentativeName': ['DELA CRUZ, JUAN', 'SANTOS, MARIA'],
+            'address_barangay': ['BAGUMBAYAN', 'DAHICAN'],
+            'address_municipality': ['LUPON', 'CITY OF MATI'],
+            'birthDate': ['01/20/2006', '05/14/1990']
+        }).to_csv(tmp_path / 'DAVOR_data.csv', index=False)
+        return str(tmp_path)
+    
+    def test_reads_snapshot_until_csv_changes(self, csv_dir):
+        """Test the CSVs are read once, then again only after a file is added"""
+        pytest.importorskip('pyarrow')
+        from registration_snapshot import load_registrations
+        
+        with patch('registration_snapshot.pd.read_csv', wraps=pd.read_csv) as read_csv:
+            df, file_rows = load_registrations(csv_dir)
+            cached, cached_rows = load_registrations(csv_dir)
+            assert read_csv.call_count == 1
+            
+            pd.DataFrame({'fileNo': ['F3'], 'dateOfRenewal': ['03/04/2025'], 'address_municipality': ['MANAY']}) \
+                .to_csv(os.path.join(csv_dir, 'added.csv'), index=False)
+            refreshed, refreshed_rows = load_registrations(csv_dir)
+            assert read_csv.call_count == 3
+        
+        pd.testing.assert_frame_equal(cached, df)
+        assert cached_rows == file_rows == {'DAVOR_data.csv': 2}
+        assert refreshed_rows == {'DAVOR_data.csv': 2, 'added.csv': 1}
+        assert len(refreshed) == 3
+    
+    def test_keeps_only_used_columns(self, csv_dir):
+        """Test personal columns are not loaded and dates arrive parsed"""
+        from registration_snapshot import load_registrations
+        
+        df, _ = load_registrations(csv_dir)
+        
+        assert sorted(df.columns) == sorted(['plateNo', 'fileNo', 'dateOfRenewal', 'address_barangay',
+                                             'address_municipality', 'dateOfRenewal_parsed'])
+        assert df['address_municipality'].dtype == 'category'
+        assert df['dateOfRenewal_parsed'].iloc[0] == pd.Timestamp('2025-03-03')
+        assert pd.isna(df['dateOfRenewal_parsed'].iloc[1])
+
+
+class TestSARIMAForecastTable:
+    """Test cases for the precomputed forecast served by OptimizedSARIMAModel.predict()"""
+    
+    @pytest.fixture
+    def model(self, tmp_path):
+        import numpy as np
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+        from sarima_model_optimized import OptimizedSARIMAModel
+        
+        dates = pd.date_range('2025-03-01', periods=150, freq='D')
+        exog = pd.DataFrame({'is_weekend_or_holiday': (dates.dayofweek >= 5).astype(int)}, index=dates)
+        counts = 20 - 12 * exog['is_weekend_or_holiday'] + np.random.default_rng(0).poisson(3, len(dates))
+        model = OptimizedSARIMAModel(str(tmp_path))
+        model.fitted_model = SARIMAX(counts.astype(float), exog=exog, order=(1, 0, 0),
+                                     seasonal_order=(1, 0, 0, 7)).fit(disp=False)
+        model.actual_last_date = pd.Timestamp('2025-07-31')
+        return model
+    
+    @pytest.fixture
+    def exog(self):
+        dates = pd.date_range('2025-08-01', periods=364, freq='D')
+        return pd.DataFrame({'is_weekend_or_holiday': (dates.dayofweek >= 5).astype(int)}, index=dates)
+    
+    def test_precomputed_forecast_matches_live_forecast(self, model, exog):
+        """Test every horizon sliced from the 364-day forecast equals a fresh forecast"""
+        live = {days: model.predict(days=days, exogenous=exog.iloc[:days]) for days in (1, 5, 7, 28, 91, 364)}
+        
+        model.precompute_forecast(exog)
+        with patch.object(model.fitted_model, 'get_forecast', side_effect=AssertionError('not precomputed')):
+            for days, expected in live.items():
+                assert model.predict(days=days, exogenous=exog.iloc[:days]) == expected
+    
+    def test_other_exogenous_values_are_forecast_live(self, model, exog):
+        """Test a request with different exogenous values does not use the precomputed forecast"""
+        model.precompute_forecast(exog)
+        holidays = exog.iloc[:28].copy()
+        holidays.iloc[3] = 1
+        
+        result = model.predict(days=28, exogenous=holidays)
+        model.forecast_table = None
+        
+        assert result == model.predict(days=28, exogenous=holidays)
+        assert result['forecast'] != model.predict(days=28, exogenous=exog.iloc[:28])['forecast']
+
+
+class TestSARIMARegionalForecast:
+    """Test cases for the concurrent municipality forecasts behind regional predictions"""
+    
+    @pytest.fixture(autouse=True)
+    def fresh_pool(self):
+        # A pool sized by the patched REGIONAL_FORECAST_WORKERS of each test
+        with patch.object(sarima_app_module, '_forecast_executor', None), \
+             patch.object(sarima_app_module, '_stalled_forecasts', {}):
+            yield
+    
+    @pytest.fixture
+    def models(self):
+        import threading
+        release = threading.Event()
+        
+        def municipality_model(total):
+            model = MagicMock()
+            model.predict.return_value = {'monthly_aggregation': {'total_predicted': total}}
+            return model
+        
+        failing = MagicMock()
+        failing.predict.side_effect = ValueError('no exogenous data')
+        stalled = MagicMock()
+        stalled.predict.side_effect = lambda **kwargs: release.wait(5)
+        stalled.release = release
+        
+        yield {
+            'LUPON': municipality_model(10),
+            'BAGANGA': failing,
+            'MATI': stalled,
+            'CATEEL': municipality_model(30)
+        }
+        release.set()
+    
+    @pytest.mark.parametrize('workers', [1, 4])
+    def test_failed_model_is_left_out(self, models, workers):
+        """Test a municipality model that raises is skipped and the rest keep their order"""
+        models.pop('MATI')
+        with patch.object(sarima_app_module, 'REGIONAL_FORECAST_WORKERS', workers):
+            results = sarima_app_module.predict_municipalities(models, 28, None)
+        
+        assert [name for name, _ in results] == ['LUPON', 'CATEEL']
+        assert [r['monthly_aggregation']['total_predicted'] for _, r in results] == [10, 30]
+        for model in models.values():
+            model.predict.assert_called_once_with(days=28, exogenous=None)
+    
+    def test_stalled_model_times_out(self, models):
+        """Test a municipality model without a result by the deadline is left out of the region"""
+        with patch.object(sarima_app_module, 'REGIONAL_FORECAST_WORKERS', 4), \
+             patch.object(sarima_app_module, 'REGIONAL_FORECAST_TIMEOUT_SECONDS', 0.2):
+            results = sarima_app_module.predict_municipalities(models, 28, None)
+        
+        assert [name for name, _ in results] == ['LUPON', 'CATEEL']
+    
+    def test_single_worker_does_not_hang_on_stalled_model(self, models):
+        """Test one pool thread still times out a stalled model (and skips models queued behind it)"""
+        import time
+        start = time.perf_counter()
+        with patch.object(sarima_app_module, 'REGIONAL_FORECAST_WORKERS', 1), \
+             patch.object(sarima_app_module, 'REGIONAL_FORECAST_TIMEOUT_SECONDS', 0.2):
+            results = sarima_app_module.predict_municipalities(models, 28, None)
+        
+        assert [name for name, _ in results] == ['LUPON']
+        assert time.perf_counter() - start < 2
+    
+    def test_each_model_has_its_own_deadline(self):
+        """Test models that together outlast the timeout are all kept when each finishes in time"""
+        import time
+        
+        def slow_model(total):
+            model = MagicMock()
+            model.predict.side_effect = lambda **kwargs: time.sleep(0.2) or {'total': total}
+            return model
+        
+        models = {'LUPON': slow_model(10), 'CATEEL': slow_model(30)}
+        with patch.object(sarima_app_module, 'REGIONAL_FORECAST_WORKERS', 1), \
+             patch.object(sarima_app_module, 'REGIONAL_FORECAST_TIMEOUT_SECONDS', 0.3):
+            results = sarima_app_module.predict_municipalities(models, 28, None)
+        
+        assert [name for name, _ in results] == ['LUPON', 'CATEEL']
+    
+    def test_stalled_model_is_skipped_until_it_returns(self, models):
+        """Test a timed-out forecast still running keeps its model out of later requests"""
+        stalled = models['MATI']
+        with patch.object(sarima_app_module, 'REGIONAL_FORECAST_WORKERS', 4), \
+             patch.object(sarima_app_module, 'REGIONAL_FORECAST_TIMEOUT_SECONDS', 0.2):
+            sarima_app_module.predict_municipalities(models, 28, None)
+            results = sarima_app_module.predict_municipalities(models, 28, None)
+            assert [name for name, _ in results] == ['LUPON', 'CATEEL']
+            assert stalled.predict.call_count == 1
+            assert models['LUPON'].predict.call_count == 2
+            
+            stalled.release.set()
+            sarima_app_module._stalled_forecasts[stalled].result(timeout=5)
+            results = sarima_app_module.predict_municipalities(models, 28, None)
+        
+        assert [name for name, _ in results] == ['LUPON', 'MATI', 'CATEEL']
+        assert stalled not in sarima_app_module._stalled_forecasts
+
+
+class TestSARIMAStartupImports:
+    """Test the prediction API starts without the training-only libraries"""
+    
+    def test_app_import_skips_training_libraries(self, tmp_path):
+        """Test importing app does not load pmdarima, sklearn or statsmodels"""
+        import subprocess
+        code = ("import sys, app; "
+                "print(sorted(name for name in ('pmdarima', 'sklearn', 'statsmodels') if name in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path), capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=mv_registration_dir))
+        
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip().splitlines()[-1] == '[]'
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
 